@@ -124,6 +124,39 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Rendered payment receipts (HTML and PDF) are cached here
+RECEIPT_CACHE_DIR = BASE_DIR / 'receipt_cache'
+
+# List page statistics are cached here (see home/stats.py). Use a shared
+# backend such as Redis or Memcached when running more than one process, so
+# every process sees the same invalidations and hit/miss counts.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'unihive-stats',
+    }
+}
+
+# Periodic background jobs, queued by the scheduler in manage.py run_worker
+# (see home/jobs.py). 'cron' is a five-field cron expression in TIME_ZONE.
+JOB_SCHEDULE = [
+    # Bill the new month's rent five minutes after midnight on the 1st
+    {'cron': '5 0 1 * *', 'job': 'payments.generate_charges'},
+    # Nightly, roll next due dates past newly paid periods
+    {'cron': '30 0 * * *', 'job': 'tenants.roll_due_dates'},
+    # Rent reminders in the morning, after due dates have rolled
+    {'cron': '0 8 * * *', 'job': 'tenants.send_reminders'},
+]
+
+# Rent reminders (see tenants/reminders.py for every option and its default).
+# The console, file and SMTP backends are stand-ins for a real SMS/email gateway.
+REMINDERS = {
+    'BACKEND': 'tenants.reminders.FileBackend',
+    'FILE_PATH': BASE_DIR / 'reminders.log',
+    'DAYS_BEFORE': [7, 1],
+    'DAYS_AFTER': [1, 7, 14],
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
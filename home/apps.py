@@ -1,6 +1,29 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+from django.utils.module_loading import autodiscover_modules
+
+
+def repair_search_index(using, **kwargs):
+    """Table rebuilds during migrate drop the search index triggers; put them back"""
+    from django.db import connections
+    from django.db.migrations.recorder import MigrationRecorder
+    from .search import ensure_search_index
+
+    connection = connections[using]
+    # Only once the index migration has been applied
+    if MigrationRecorder(connection).migration_qs.filter(app='home', name='0002_search_index').exists():
+        ensure_search_index(connection)
 
 
 class HomeConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'home'
+
+    def ready(self):
+        post_migrate.connect(repair_search_index, sender=self)
+
+        from .stats import connect_signals
+        connect_signals()
+
+        # Job functions register themselves in each app's jobs module
+        autodiscover_modules('jobs')
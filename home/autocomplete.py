@@ -0,0 +1,104 @@
+"""
+Typeahead lookups for the tenant, rental and property pickers of the forms.
+
+A query matches the objects that have a field starting with it, ignoring
+case. Every field is searched as a range of an index: LOWER(name) >= 'ann'
+AND LOWER(name) < 'ano' reads only the matching entries of an index on
+LOWER(name), already in order, where LIKE 'ann%' or icontains would scan
+the table. Free-text fields have such an expression index; codes (rental
+numbers, property IDs) are stored upper-case, so the range is taken on
+their unique index with the query upper-cased.
+
+SQLite's LOWER() only folds ASCII letters, so the query is folded the same
+way and other letters match only in the case they are stored in: "Émile" is
+found by "ÉMI" but not by "émi".
+
+At most limit rows are read per field. Matches are ranked exact match
+first, then by field (a tenant's name before their email, ...), then
+alphabetically.
+"""
+import string
+from django.db.models import F
+from django.db.models.functions import Lower
+from properties.models import Property
+from rentals.models import RENTAL_TYPES, Rental
+from tenants.models import Tenant
+
+AUTOCOMPLETE_LIMIT = 10
+MAX_AUTOCOMPLETE_LIMIT = 50
+
+RENTAL_TYPE_LABELS = dict(RENTAL_TYPES)
+
+# Case folding as SQLite's LOWER() and UPPER() do it, ASCII letters only
+ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+ASCII_UPPER = str.maketrans(string.ascii_lowercase, string.ascii_uppercase)
+
+# entity: (model, [(field, case) in rank order], values read, (text, detail) of a values row)
+AUTOCOMPLETE_SOURCES = {
+    'tenant': (
+        Tenant,
+        [('name', 'lower'), ('email', 'lower'), ('nin_number', 'lower')],
+        ['id', 'name', 'email', 'rental__rental_number'],
+        lambda row: (row['name'], f"{row['rental__rental_number']} · {row['email']}"),
+    ),
+    'rental': (
+        Rental,
+        [('rental_number', 'upper')],
+        ['id', 'rental_number', 'rental_type', 'monthly_rent_amount', 'property__property_name'],
+        lambda row: (
+            f"{row['rental_number']} - {RENTAL_TYPE_LABELS.get(row['rental_type'], row['rental_type'])}",
+            row['property__property_name'],
+        ),
+    ),
+    'property': (
+        Property,
+        [('property_name', 'lower'), ('property_id', 'upper')],
+        ['id', 'property_id', 'property_name'],
+        lambda row: (row['property_name'], row['property_id']),
+    ),
+}
+
+
+def prefix_range(prefix):
+    """The half-open range [low, high) of the strings that start with prefix"""
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def prefix_matches(model, field, case, prefix):
+    """
+    A queryset of model ordered by and filtered to field starting with prefix,
+    the name of the key it ranges over, and prefix in the key's case
+    """
+    if case == 'lower':
+        queryset = model.objects.annotate(match=Lower(field))
+        prefix = prefix.translate(ASCII_LOWER)
+        key = 'match'
+    else:
+        queryset = model.objects.all()
+        prefix = prefix.translate(ASCII_UPPER)
+        key = field
+    low, high = prefix_range(prefix)
+    return queryset.filter(**{f'{key}__gte': low, f'{key}__lt': high}).order_by(key), key, prefix
+
+
+def autocomplete(entity, query, limit=AUTOCOMPLETE_LIMIT):
+    """The best matches of entity for query, as dictionaries ready for JSON"""
+    query = query.strip()
+    if not query:
+        return []
+    limit = max(1, min(limit, MAX_AUTOCOMPLETE_LIMIT))
+    model, keys, values, describe = AUTOCOMPLETE_SOURCES[entity]
+
+    ranked = {}
+    for field_rank, (field, case) in enumerate(keys):
+        queryset, key, prefix = prefix_matches(model, field, case, query)
+        for row in queryset.values(*values, matched=F(key))[:limit]:
+            rank = (row['matched'] != prefix, field_rank, row['matched'], row['id'])
+            if row['id'] not in ranked or rank < ranked[row['id']][0]:
+                ranked[row['id']] = (rank, row)
+
+    results = []
+    for rank, row in sorted(ranked.values(), key=lambda item: item[0])[:limit]:
+        text, detail = describe(row)
+        results.append({'id': row['id'], 'text': text, 'detail': detail})
+    return results
@@ -0,0 +1,31 @@
+"""
+Conditional GET for JSON endpoints.
+
+The ETag is a digest of the response body, so it changes whenever any value
+in it does. Last-Modified is only sent when the view knows when the data last
+changed; without it clients fall back to If-None-Match. Responses are marked
+Cache-Control: no-cache so browsers revalidate every time and get a 304 when
+nothing has changed.
+"""
+import hashlib
+import json
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+
+def conditional_json_response(request, data, last_modified=None):
+    """JsonResponse for data, or 304 Not Modified if the client's copy is current"""
+    body = json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True)
+    etag = quote_etag(hashlib.sha1(body.encode('utf-8')).hexdigest())
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is None:
+        response = JsonResponse(data)
+    response['ETag'] = etag
+    if timestamp is not None:
+        response['Last-Modified'] = http_date(timestamp)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
@@ -0,0 +1,309 @@
+"""
+A small background job queue kept in the project's own database.
+
+Jobs are functions registered by name with @register, in a jobs.py module of
+any installed app (they are all imported when Django starts), and queued
+with enqueue(). Keyword arguments are stored as JSON. manage.py run_worker
+works the queue with a pool of threads or processes.
+
+Workers claim jobs by compare-and-swap: they read the next few queued jobs
+in priority order and take each with an UPDATE ... WHERE status = 'QUEUED',
+so when two workers race for a job exactly one of them changes the row.
+That needs no row locks, which SQLite does not have. A job that raises is
+retried after an exponential backoff until it has had max_attempts. While
+a job runs, a heartbeat thread refreshes its lock every HEARTBEAT_INTERVAL,
+so only a job whose worker died has a lock older than LOCK_TIMEOUT, and it
+is queued again.
+
+Periodic jobs are listed in settings.JOB_SCHEDULE as cron expressions. The
+scheduler queues one job per matching minute; the unique (name,
+scheduled_for) constraint keeps several schedulers from queueing the same
+minute twice.
+"""
+import logging
+import os
+import socket
+import threading
+import traceback
+from datetime import timedelta
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, connections
+from django.db.models import F
+from django.utils import timezone
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ATTEMPTS = 5
+# Retry delays double from BACKOFF_BASE up to BACKOFF_MAX seconds
+BACKOFF_BASE = 30
+BACKOFF_MAX = 60 * 60
+# A running job whose lock is older than this is taken to have lost its worker
+LOCK_TIMEOUT = timedelta(minutes=30)
+# How often a running job's lock is refreshed; well within LOCK_TIMEOUT so a missed beat does no harm
+HEARTBEAT_INTERVAL = timedelta(minutes=1)
+# Queued jobs read per claiming round
+CLAIM_CANDIDATES = 10
+
+JOBS = {}
+
+
+def register(name, priority=0, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """Register a function as a job under name, with default priority and max_attempts"""
+    def decorator(function):
+        JOBS[name] = (function, priority, max_attempts)
+        return function
+    return decorator
+
+
+def enqueue(name, priority=None, run_at=None, max_attempts=None, **kwargs):
+    """
+    Queue the job registered under name, to be called with kwargs (which must be
+    JSON-serialisable). Returns the Job.
+    """
+    if name not in JOBS:
+        raise ValueError(f'Unknown job "{name}"')
+    function, default_priority, default_max_attempts = JOBS[name]
+    return Job.objects.create(
+        name=name,
+        kwargs=kwargs,
+        priority=default_priority if priority is None else priority,
+        run_at=run_at or timezone.now(),
+        max_attempts=default_max_attempts if max_attempts is None else max_attempts,
+    )
+
+
+def backoff(attempts):
+    """Seconds to wait before retrying a job that has failed attempts times"""
+    return min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+
+
+def claim(worker, limit=1):
+    """Claim up to limit due jobs for worker, most urgent first, and return them"""
+    claimed = []
+    while len(claimed) < limit:
+        now = timezone.now()
+        candidates = list(Job.objects.filter(status='QUEUED', run_at__lte=now).order_by(
+            '-priority', 'run_at', 'id'
+        ).values_list('id', flat=True)[:max(CLAIM_CANDIDATES, limit)])
+        if not candidates:
+            break
+        for job_id in candidates:
+            # Only one worker's UPDATE can still see the job as QUEUED
+            if Job.objects.filter(pk=job_id, status='QUEUED').update(
+                status='RUNNING', locked_by=worker, locked_at=now, attempts=F('attempts') + 1
+            ):
+                claimed.append(job_id)
+                if len(claimed) == limit:
+                    break
+        # Candidates taken by other workers are gone next time round, so this ends
+    return list(Job.objects.filter(pk__in=claimed).order_by('-priority', 'run_at', 'id'))
+
+
+class Heartbeat:
+    """
+    Refreshes the lock of a running job from a background thread until the
+    with block ends, so release_stale() leaves a long job alone
+    """
+    def __init__(self, job, worker, interval=HEARTBEAT_INTERVAL):
+        self.job_id = job.pk
+        self.worker = worker
+        self.interval = interval.total_seconds()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name=f'job-heartbeat-{job.pk}', daemon=True)
+
+    def beat(self):
+        """Refresh the lock; returns False if the job is no longer held by this worker"""
+        return bool(Job.objects.filter(pk=self.job_id, status='RUNNING', locked_by=self.worker).update(
+            locked_at=timezone.now()
+        ))
+
+    def run(self):
+        try:
+            while not self.stopped.wait(self.interval):
+                try:
+                    if not self.beat():
+                        break
+                except DatabaseError as e:
+                    # SQLite may be busy with the job's own writes; the next beat will do
+                    logger.warning('Could not refresh the lock of job #%s: %s', self.job_id, e)
+        finally:
+            # The thread's own connection
+            connections.close_all()
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
+
+
+def run_job(job, worker):
+    """Run a claimed job and record the outcome; returns True if it succeeded"""
+    try:
+        function = JOBS[job.name][0]
+    except KeyError:
+        function = None
+
+    try:
+        if function is None:
+            raise LookupError(f'Unknown job "{job.name}"')
+        with Heartbeat(job, worker):
+            function(**job.kwargs)
+    except Exception:
+        logger.exception('Job %s #%s failed (attempt %s of %s)', job.name, job.pk, job.attempts, job.max_attempts)
+        error = traceback.format_exc()
+        if job.attempts >= job.max_attempts or function is None:
+            changes = {'status': 'FAILED', 'finished_at': timezone.now()}
+        else:
+            changes = {'status': 'QUEUED', 'run_at': timezone.now() + timedelta(seconds=backoff(job.attempts))}
+        Job.objects.filter(pk=job.pk, locked_by=worker).update(
+            last_error=error[-10000:], locked_by='', locked_at=None, **changes
+        )
+        return False
+
+    Job.objects.filter(pk=job.pk, locked_by=worker).update(
+        status='DONE', finished_at=timezone.now(), locked_by='', locked_at=None
+    )
+    return True
+
+
+def release_stale(timeout=LOCK_TIMEOUT):
+    """Queue again, or fail, running jobs whose worker has not finished them within timeout"""
+    stale = Job.objects.filter(status='RUNNING', locked_at__lt=timezone.now() - timeout)
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status='FAILED', finished_at=timezone.now(), locked_by='', locked_at=None,
+        last_error='The worker running this job stopped before it finished'
+    )
+    requeued = stale.update(status='QUEUED', run_at=timezone.now(), locked_by='', locked_at=None)
+    return requeued + failed
+
+
+def _cron_field(text, low, high):
+    """The set of values a cron field (*, */n, a-b, a-b/n, a,b,...) allows"""
+    values = set()
+    for part in text.split(','):
+        step = 1
+        if '/' in part:
+            part, step = part.split('/')
+            step = int(step)
+        if part == '*':
+            start, end = low, high
+        elif '-' in part:
+            start, end = (int(value) for value in part.split('-'))
+        else:
+            start = end = int(part)
+            if step != 1:
+                end = high
+        if start < low or end > high or start > end or step < 1:
+            raise ValueError(f'Cron field "{text}" is out of range {low}-{high}')
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronSchedule:
+    """
+    A standard five-field cron expression: minute, hour, day of month, month and
+    day of week (0-7, Sunday is 0 or 7). As in cron, when both the day of month
+    and the day of week are restricted a day matching either one is due.
+    """
+    def __init__(self, expression):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f'Cron expression "{expression}" needs five fields')
+        self.expression = expression
+        self.minutes = _cron_field(fields[0], 0, 59)
+        self.hours = _cron_field(fields[1], 0, 23)
+        self.days = _cron_field(fields[2], 1, 31)
+        self.months = _cron_field(fields[3], 1, 12)
+        self.weekdays = {day % 7 for day in _cron_field(fields[4], 0, 7)}
+        self.any_day = fields[2] == '*'
+        self.any_weekday = fields[4] == '*'
+
+    def matches(self, moment):
+        if moment.minute not in self.minutes or moment.hour not in self.hours or moment.month not in self.months:
+            return False
+        day_matches = moment.day in self.days
+        # Python counts Monday as 0, cron counts Sunday as 0
+        weekday_matches = (moment.weekday() + 1) % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return day_matches and weekday_matches
+        return day_matches or weekday_matches
+
+
+def get_schedule():
+    """(CronSchedule, job name, kwargs) for every entry of settings.JOB_SCHEDULE"""
+    return [
+        (CronSchedule(entry['cron']), entry['job'], entry.get('kwargs', {}))
+        for entry in getattr(settings, 'JOB_SCHEDULE', [])
+    ]
+
+
+def schedule_due(now=None, schedule=None):
+    """Queue the periodic jobs due in the minute of now (local time); returns how many matched"""
+    minute = timezone.localtime(now or timezone.now()).replace(second=0, microsecond=0)
+    entries = schedule if schedule is not None else get_schedule()
+    for cron, name, kwargs in entries:
+        if name not in JOBS:
+            logger.warning('JOB_SCHEDULE names unknown job "%s"', name)
+    due = [
+        Job(
+            name=name, kwargs=kwargs, priority=JOBS[name][1], max_attempts=JOBS[name][2],
+            run_at=minute, scheduled_for=minute,
+        )
+        for cron, name, kwargs in entries
+        if cron.matches(minute) and name in JOBS
+    ]
+    # Another scheduler may have queued the same minute already
+    Job.objects.bulk_create(due, ignore_conflicts=True)
+    return len(due)
+
+
+def worker_name(index):
+    return f'{socket.gethostname()}:{os.getpid()}:{index}'
+
+
+def work(index, stop, poll_interval=1.0, burst=False):
+    """
+    Claim and run jobs one at a time until stop is set, sleeping poll_interval
+    seconds whenever the queue is empty. With burst, return once it is empty.
+    Module level so it can run in a pool thread or process.
+    """
+    worker = worker_name(index)
+    processed = 0
+    while not stop.is_set():
+        close_old_connections()
+        jobs = claim(worker)
+        if not jobs:
+            if burst:
+                break
+            stop.wait(poll_interval)
+            continue
+        run_job(jobs[0], worker)
+        processed += 1
+    close_old_connections()
+    return processed
+
+
+def run_scheduler(stop):
+    """Queue periodic jobs at the start of every minute and release stale jobs, until stop is set"""
+    schedule = get_schedule()
+    last_minute = None
+    while not stop.is_set():
+        now = timezone.now()
+        minute = now.replace(second=0, microsecond=0)
+        if minute != last_minute:
+            close_old_connections()
+            schedule_due(now, schedule)
+            release_stale()
+            last_minute = minute
+        stop.wait(60 - now.second - now.microsecond / 1e6)
+    close_old_connections()
+
+
+def start_scheduler(stop):
+    thread = threading.Thread(target=run_scheduler, args=(stop,), name='job-scheduler', daemon=True)
+    thread.start()
+    return thread
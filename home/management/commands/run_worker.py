@@ -0,0 +1,93 @@
+import multiprocessing
+import signal
+import threading
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Count, Q
+from home.jobs import get_schedule, release_stale, schedule_due, start_scheduler, work
+from home.models import Job
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs with a pool of threads or processes, and queue periodic jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=2, help='Jobs run at the same time')
+        parser.add_argument('--pool', choices=['thread', 'process'], default='thread',
+                            help='Run jobs in threads of this process or in worker processes')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds to wait before looking again when the queue is empty')
+        parser.add_argument('--burst', action='store_true',
+                            help='Run the jobs that are due and exit once the queue is empty')
+        parser.add_argument('--no-scheduler', action='store_true',
+                            help='Do not queue the periodic jobs of JOB_SCHEDULE from this worker')
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1:
+            raise CommandError('--concurrency must be at least 1')
+        try:
+            schedule = get_schedule()
+        except (KeyError, ValueError) as e:
+            raise CommandError(f'Invalid JOB_SCHEDULE: {e}')
+
+        burst = options['burst']
+        process_pool = options['pool'] == 'process'
+        stop = multiprocessing.Event() if process_pool else threading.Event()
+
+        if burst:
+            # One pass of the scheduler's work before draining the queue
+            if not options['no_scheduler']:
+                schedule_due(schedule=schedule)
+            release_stale()
+
+        def request_stop(signum, frame):
+            self.stdout.write('Stopping once the running jobs finish...')
+            stop.set()
+
+        previous_handlers = {
+            signum: signal.signal(signum, request_stop) for signum in (signal.SIGTERM, signal.SIGINT)
+        }
+        self.stdout.write(
+            f'Running jobs with {options["concurrency"]} {"processes" if process_pool else "threads"}'
+            f'{" until the queue is empty" if burst else ""} ({len(schedule)} periodic jobs)'
+        )
+        try:
+            self.run_pool(
+                options['concurrency'], process_pool, stop, options['poll_interval'], burst,
+                scheduler=not burst and not options['no_scheduler'],
+            )
+        finally:
+            for signum, handler in previous_handlers.items():
+                signal.signal(signum, handler)
+
+        counts = Job.objects.aggregate(
+            queued=Count('id', filter=Q(status='QUEUED')), failed=Count('id', filter=Q(status='FAILED'))
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Worker stopped ({counts["queued"]} jobs queued, {counts["failed"]} failed)'
+        ))
+
+    def run_pool(self, concurrency, process_pool, stop, poll_interval, burst, scheduler):
+        if not process_pool and concurrency == 1:
+            # A single thread may as well be this one
+            if scheduler:
+                start_scheduler(stop)
+            work(0, stop, poll_interval, burst)
+            return
+
+        if process_pool:
+            # Close our connections so forked workers open their own instead of sharing them
+            connections.close_all()
+            runner_class = multiprocessing.Process
+        else:
+            runner_class = threading.Thread
+        runners = [
+            runner_class(target=work, args=(index, stop, poll_interval, burst)) for index in range(concurrency)
+        ]
+        for runner in runners:
+            runner.start()
+        # Started after forking, so worker processes do not inherit the scheduler's thread
+        if scheduler:
+            start_scheduler(stop)
+        for runner in runners:
+            runner.join()
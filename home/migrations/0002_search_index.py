@@ -0,0 +1,78 @@
+from django.db import DatabaseError, migrations
+
+# The index as it stood when this migration was written, kept here rather than
+# imported from home.search so that later changes there cannot alter it.
+# ensure_search_index() brings it up to date after migrate.
+
+SEARCH_TABLE = 'home_search_index'
+
+# (source table, entity number, indexed values, columns whose updates are reindexed)
+SEARCH_SOURCES = [
+    ('payments_payment', 0, "{p}payment_id, '', {p}payment_method", 'payment_id, payment_method'),
+    ('tenants_tenant', 1, "{p}nin_number, {p}name, {p}email || ' ' || {p}phone_number",
+     'email, name, nin_number, phone_number'),
+    ('rentals_rental', 2, "{p}rental_number, '', {p}rental_type", 'rental_number, rental_type'),
+    ('properties_property', 3, '{p}property_id, {p}property_name, {p}address', 'address, property_id, property_name'),
+]
+
+
+def create_index(apps, schema_editor):
+    # Databases without FTS5 keep using icontains searches
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        try:
+            cursor.execute("CREATE VIRTUAL TABLE temp.search_probe USING fts5(text, tokenize='trigram')")
+            cursor.execute('DROP TABLE temp.search_probe')
+        except DatabaseError:
+            return
+
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(code, name, detail, tokenize='trigram')"
+    )
+    for table, number, values, watched in SEARCH_SOURCES:
+        insert = (
+            f"INSERT INTO {SEARCH_TABLE} (rowid, code, name, detail) "
+            f"VALUES (new.id * 4 + {number}, {values.format(p='new.')});"
+        )
+        delete = f'DELETE FROM {SEARCH_TABLE} WHERE rowid = old.id * 4 + {number};'
+        schema_editor.execute(
+            f'CREATE TRIGGER IF NOT EXISTS {table}_search_insert AFTER INSERT ON {table} BEGIN {insert} END'
+        )
+        schema_editor.execute(
+            f'CREATE TRIGGER IF NOT EXISTS {table}_search_update AFTER UPDATE OF {watched} ON {table} '
+            f'BEGIN {delete} {insert} END'
+        )
+        schema_editor.execute(
+            f'CREATE TRIGGER IF NOT EXISTS {table}_search_delete AFTER DELETE ON {table} BEGIN {delete} END'
+        )
+
+    schema_editor.execute(f'DELETE FROM {SEARCH_TABLE}')
+    for table, number, values, watched in SEARCH_SOURCES:
+        schema_editor.execute(
+            f"INSERT INTO {SEARCH_TABLE} (rowid, code, name, detail) "
+            f"SELECT id * 4 + {number}, {values.format(p='')} FROM {table}"
+        )
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for table, number, values, watched in SEARCH_SOURCES:
+            for action in ('insert', 'update', 'delete'):
+                schema_editor.execute(f'DROP TRIGGER IF EXISTS {table}_search_{action}')
+        schema_editor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0001_sequence'),
+        ('payments', '0005_payment_date_index'),
+        ('properties', '0002_alter_property_property_id'),
+        ('rentals', '0004_remove_rental_tenant'),
+        ('tenants', '0003_move_in_date_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
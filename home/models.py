@@ -1,3 +1,58 @@
 from django.db import models
+from django.db.models import Q
+from django.utils import timezone
 
 # Create your models here.
+class Sequence(models.Model):
+    """
+    A named counter used to hand out human-readable business IDs
+    (PAY-0001, PROP001, SUNRIS001, ...). See home.sequences.
+    """
+    namespace = models.CharField(max_length=50, unique=True)
+    last_value = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.namespace}: {self.last_value}"
+
+
+JOB_STATUSES = [
+        ("QUEUED", "Queued"),
+        ("RUNNING", "Running"),
+        ("DONE", "Done"),
+        ("FAILED", "Failed"),
+    ]
+
+
+class Job(models.Model):
+    """
+    A unit of background work, run by manage.py run_worker. See home.jobs.
+    """
+    name = models.CharField(max_length=100, help_text="Name the job function is registered under")
+    kwargs = models.JSONField(default=dict, blank=True)
+    priority = models.SmallIntegerField(default=0, help_text="Higher runs first")
+    status = models.CharField(max_length=10, choices=JOB_STATUSES, default='QUEUED')
+    run_at = models.DateTimeField(default=timezone.now, help_text="Not run before this time")
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    # Set on periodic jobs: the schedule tick that queued them
+    scheduled_for = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'scheduled_for'], condition=Q(scheduled_for__isnull=False), name='unique_scheduled_job'
+            ),
+        ]
+        indexes = [
+            # The queue in claiming order; only queued jobs are in it
+            models.Index(fields=['-priority', 'run_at', 'id'], condition=Q(status='QUEUED'), name='job_queue_idx'),
+            models.Index(fields=['status', 'locked_at'], name='job_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.get_status_display()})"
@@ -0,0 +1,158 @@
+"""
+Keyset (cursor) pagination for the list views.
+
+Django's Paginator counts every matching row and then skips to the page with
+OFFSET, so each page further into the list is slower than the one before.
+KeysetPaginator instead remembers the ordering key of the first and last row
+on the page and asks for the rows just before or after it, which an index on
+the ordering fields answers directly however deep the page is. The total is
+counted only up to a limit and reported as an estimate beyond that, unless
+the view already knows the exact number.
+
+Pages are requested with ?after=<cursor> or ?before=<cursor>.
+"""
+import base64
+import json
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+DEFAULT_COUNT_LIMIT = 1000
+
+
+def encode_cursor(values):
+    data = json.dumps(values, cls=DjangoJSONEncoder, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(data).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, size):
+    """Return the key values stored in a cursor, or None if it is not valid"""
+    try:
+        data = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(data)
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(values, list) or len(values) != size:
+        return None
+    return values
+
+
+class KeysetPage:
+    """One page of results; iterates like a list of objects"""
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.has_next = has_next
+        self.has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    @property
+    def next_cursor(self):
+        if self.has_next and self.object_list:
+            return self.paginator.cursor_for(self.object_list[-1])
+        return None
+
+    @property
+    def previous_cursor(self):
+        if self.has_previous and self.object_list:
+            return self.paginator.cursor_for(self.object_list[0])
+        return None
+
+
+class KeysetPaginator:
+    """
+    Paginate a queryset by its ordering key.
+
+    ordering is a list of model field names, each optionally prefixed with '-',
+    ending in a unique field (normally 'id' or '-id') so every row has a
+    distinct key. Pass count when the view has already counted the rows;
+    otherwise the rows are counted up to count_limit.
+    """
+    def __init__(self, queryset, per_page, ordering, count=None, count_limit=DEFAULT_COUNT_LIMIT):
+        self.queryset = queryset.order_by(*ordering)
+        self.per_page = per_page
+        self.ordering = list(ordering)
+        self.fields = [field.lstrip('-') for field in self.ordering]
+        self._count = count
+        self.count_limit = count_limit
+        self.count_is_estimate = False
+
+    @property
+    def count(self):
+        """Number of rows, or count_limit when there are more (see count_is_estimate)"""
+        if self._count is None:
+            # COUNT(*) over a LIMITed subquery, so large tables stop counting at the limit
+            counted = self.queryset.order_by()[:self.count_limit + 1].count()
+            self.count_is_estimate = counted > self.count_limit
+            self._count = min(counted, self.count_limit)
+        return self._count
+
+    def cursor_for(self, obj):
+        return encode_cursor([getattr(obj, field) for field in self.fields])
+
+    def _decode(self, cursor):
+        values = decode_cursor(cursor, len(self.fields)) if cursor else None
+        if values is None:
+            return None
+        try:
+            return [
+                self.queryset.model._meta.get_field(field).to_python(value)
+                for field, value in zip(self.fields, values)
+            ]
+        except ValidationError:
+            return None
+
+    def _seek(self, values, forwards):
+        """
+        Q object for rows after (forwards) or before the row with the given key:
+        (a > x) OR (a = x AND b > y) OR ..., with the comparison flipped for
+        descending fields and for paging backwards.
+        """
+        condition = Q()
+        for position, field in enumerate(self.ordering):
+            name = field.lstrip('-')
+            ascending = not field.startswith('-')
+            lookup = 'gt' if ascending == forwards else 'lt'
+            term = Q(**{f'{name}__{lookup}': values[position]})
+            for earlier, value in zip(self.fields[:position], values):
+                term &= Q(**{earlier: value})
+            condition |= term
+        return condition
+
+    def get_page(self, after=None, before=None):
+        """Return the page after or before a cursor, or the first page"""
+        after = self._decode(after)
+        before = self._decode(before)
+
+        if before is not None:
+            reversed_ordering = [field[1:] if field.startswith('-') else f'-{field}' for field in self.ordering]
+            rows = list(self.queryset.filter(self._seek(before, forwards=False)).order_by(
+                *reversed_ordering
+            )[:self.per_page + 1])
+            has_previous = len(rows) > self.per_page
+            return KeysetPage(rows[:self.per_page][::-1], self, has_next=True, has_previous=has_previous)
+
+        queryset = self.queryset
+        if after is not None:
+            queryset = queryset.filter(self._seek(after, forwards=True))
+        rows = list(queryset[:self.per_page + 1])
+        has_next = len(rows) > self.per_page
+        return KeysetPage(rows[:self.per_page], self, has_next=has_next, has_previous=after is not None)
+
+    def get_page_from_request(self, request):
+        return self.get_page(request.GET.get('after'), request.GET.get('before'))
@@ -0,0 +1,77 @@
+"""
+A minimal PDF writer for plain-text documents such as receipts.
+
+Each page is a list of text lines set in Courier. Pages grow to fit their
+lines, which suits thermal-printer style receipts, and any number of pages
+can be written into a single file.
+"""
+import textwrap
+
+FONT_SIZE = 9
+LINE_HEIGHT = 11
+MARGIN = 14
+PAGE_WIDTH = 227  # 80mm thermal roll
+CHARS_PER_LINE = int((PAGE_WIDTH - 2 * MARGIN) / (FONT_SIZE * 0.6))
+
+
+def _escape(text):
+    text = text.encode('latin-1', 'replace').decode('latin-1')
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def _wrap(lines):
+    wrapped = []
+    for line in lines:
+        line = line.rstrip()
+        if len(line) <= CHARS_PER_LINE:
+            wrapped.append(line)
+        else:
+            wrapped.extend(textwrap.wrap(line, CHARS_PER_LINE))
+    return wrapped
+
+
+def build_pdf(pages):
+    """Return the bytes of a PDF with one page per list of text lines in pages"""
+    objects = []
+
+    def add(body):
+        objects.append(body)
+        return len(objects)
+
+    catalog_id = add(None)
+    pages_id = add(None)
+    font_id = add(b'<< /Type /Font /Subtype /Type1 /BaseFont /Courier /Encoding /WinAnsiEncoding >>')
+
+    page_ids = []
+    for lines in pages:
+        lines = _wrap(lines)
+        height = 2 * MARGIN + LINE_HEIGHT * max(len(lines), 1)
+        commands = [f'BT /F1 {FONT_SIZE} Tf {LINE_HEIGHT} TL {MARGIN} {height - MARGIN - FONT_SIZE} Td']
+        for line in lines:
+            commands.append(f'({_escape(line)}) Tj T*')
+        commands.append('ET')
+        stream = '\n'.join(commands).encode('latin-1')
+        content_id = add(b'<< /Length %d >>\nstream\n' % len(stream) + stream + b'\nendstream')
+        page_ids.append(add((
+            f'<< /Type /Page /Parent {pages_id} 0 R /MediaBox [0 0 {PAGE_WIDTH} {height}] '
+            f'/Resources << /Font << /F1 {font_id} 0 R >> >> /Contents {content_id} 0 R >>'
+        ).encode('latin-1')))
+
+    kids = ' '.join(f'{page_id} 0 R' for page_id in page_ids)
+    objects[pages_id - 1] = f'<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>'.encode('latin-1')
+    objects[catalog_id - 1] = f'<< /Type /Catalog /Pages {pages_id} 0 R >>'.encode('latin-1')
+
+    output = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += b'%d 0 obj\n' % number + body + b'\nendobj\n'
+
+    xref_offset = len(output)
+    output += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    for offset in offsets:
+        output += b'%010d 00000 n \n' % offset
+    output += b'trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (
+        len(objects) + 1, catalog_id, xref_offset
+    )
+    return bytes(output)
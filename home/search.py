@@ -0,0 +1,279 @@
+"""
+Full-text search across payments, tenants, rentals and properties.
+
+Searchable text lives in one SQLite FTS5 table, home_search_index, using the
+trigram tokenizer so a query matches anywhere inside a word, the same as the
+icontains lookups it replaces. Every row has three columns:
+
+    code    payment ID, NIN number, rental number or property ID
+    name    tenant or property name
+    detail  payment method, email and phone, rental type or address
+
+Rows are keyed by rowid = object id * 4 + entity number, and triggers on the
+four source tables keep the index in step with every insert, update and
+delete, including bulk_create() and bulk_update() which skip model signals.
+SQLite drops a table's triggers when a migration rebuilds the table, so
+ensure_search_index() runs after every migrate (see HomeConfig) and rebuilds
+the index if any trigger has gone.
+
+The index is used when the database supports it and the query is at least
+three characters long (the shortest string a trigram can match); otherwise
+the search forms fall back to icontains.
+"""
+from urllib.parse import urlencode
+from django.db import DatabaseError, connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.urls import reverse
+from payments.models import Payment
+from properties.models import Property
+from rentals.models import Rental
+from tenants.models import Tenant
+
+SEARCH_TABLE = 'home_search_index'
+MIN_QUERY_LENGTH = 3
+SEARCH_RESULT_LIMIT = 100
+
+# bm25() weights for the code, name and detail columns: ID and name matches outrank the rest
+SEARCH_COLUMN_WEIGHTS = (10.0, 5.0, 1.0)
+
+# entity: (entity number, source table, indexed column -> source expression)
+SEARCH_SOURCES = {
+    'payment': (0, 'payments_payment', {
+        'code': 'payment_id',
+        'name': "''",
+        'detail': 'payment_method',
+    }),
+    'tenant': (1, 'tenants_tenant', {
+        'code': 'nin_number',
+        'name': 'name',
+        'detail': "email || ' ' || phone_number",
+    }),
+    'rental': (2, 'rentals_rental', {
+        'code': 'rental_number',
+        'name': "''",
+        'detail': 'rental_type',
+    }),
+    'property': (3, 'properties_property', {
+        'code': 'property_id',
+        'name': 'property_name',
+        'detail': 'address',
+    }),
+}
+
+_index_available = {}
+
+_ENTITIES_BY_NUMBER = {number: entity for entity, (number, table, columns) in SEARCH_SOURCES.items()}
+
+
+def _source_columns(source, prefix=''):
+    """Indexed columns and their source expressions, optionally qualified with new./old."""
+    columns = []
+    expressions = []
+    for column, expression in source.items():
+        columns.append(column)
+        if prefix and not expression.startswith("'"):
+            expression = ' '.join(
+                f'{prefix}{part}' if part.isidentifier() else part for part in expression.split(' ')
+            )
+        expressions.append(expression)
+    return columns, expressions
+
+
+def search_index_sql():
+    """Statements that create the index table and the triggers that maintain it"""
+    statements = [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(code, name, detail, tokenize='trigram')"
+    ]
+    for entity, (number, table, source) in SEARCH_SOURCES.items():
+        columns, new_values = _source_columns(source, 'new.')
+        column_list = ', '.join(columns)
+        watched = ', '.join(sorted({
+            part for expression in source.values() for part in expression.split(' ') if part.isidentifier()
+        }))
+        statements += [
+            f"CREATE TRIGGER IF NOT EXISTS {table}_search_insert AFTER INSERT ON {table} BEGIN "
+            f"INSERT INTO {SEARCH_TABLE} (rowid, {column_list}) VALUES (new.id * 4 + {number}, {', '.join(new_values)}); "
+            f"END",
+            f"CREATE TRIGGER IF NOT EXISTS {table}_search_update AFTER UPDATE OF {watched} ON {table} BEGIN "
+            f"DELETE FROM {SEARCH_TABLE} WHERE rowid = old.id * 4 + {number}; "
+            f"INSERT INTO {SEARCH_TABLE} (rowid, {column_list}) VALUES (new.id * 4 + {number}, {', '.join(new_values)}); "
+            f"END",
+            f"CREATE TRIGGER IF NOT EXISTS {table}_search_delete AFTER DELETE ON {table} BEGIN "
+            f"DELETE FROM {SEARCH_TABLE} WHERE rowid = old.id * 4 + {number}; "
+            f"END",
+        ]
+    return statements
+
+
+def drop_search_index_sql():
+    statements = []
+    for entity, (number, table, source) in SEARCH_SOURCES.items():
+        statements += [f'DROP TRIGGER IF EXISTS {table}_search_{action}' for action in ('insert', 'update', 'delete')]
+    statements.append(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+    return statements
+
+
+def populate_search_index_sql():
+    """Statements that (re)fill the index from the source tables"""
+    statements = [f'DELETE FROM {SEARCH_TABLE}']
+    for entity, (number, table, source) in SEARCH_SOURCES.items():
+        columns, expressions = _source_columns(source)
+        statements.append(
+            f"INSERT INTO {SEARCH_TABLE} (rowid, {', '.join(columns)}) "
+            f"SELECT id * 4 + {number}, {', '.join(expressions)} FROM {table}"
+        )
+    return statements
+
+
+def _trigger_names():
+    return {
+        f'{table}_search_{action}'
+        for number, table, source in SEARCH_SOURCES.values()
+        for action in ('insert', 'update', 'delete')
+    }
+
+
+def ensure_search_index(schema_connection):
+    """
+    Create and fill the index, or repair it if triggers are missing. Returns
+    False, leaving the database unchanged, when it is not SQLite or its SQLite
+    was built without FTS5 or the trigram tokenizer.
+    """
+    if schema_connection.vendor != 'sqlite':
+        return False
+    with schema_connection.cursor() as cursor:
+        try:
+            cursor.execute("CREATE VIRTUAL TABLE temp.search_probe USING fts5(text, tokenize='trigram')")
+            cursor.execute('DROP TABLE temp.search_probe')
+        except DatabaseError:
+            return False
+        cursor.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')")
+        existing = {name for (name,) in cursor.fetchall()}
+        if SEARCH_TABLE in existing and _trigger_names() <= existing:
+            return True
+        for statement in search_index_sql() + populate_search_index_sql():
+            cursor.execute(statement)
+    _index_available.clear()
+    return True
+
+
+def search_index_available():
+    """Whether home_search_index exists on the default database (checked once per process)"""
+    key = (connection.alias, str(connection.settings_dict['NAME']))
+    if key not in _index_available:
+        _index_available[key] = (
+            connection.vendor == 'sqlite' and SEARCH_TABLE in connection.introspection.table_names()
+        )
+    return _index_available[key]
+
+
+def use_search_index(query):
+    return len(query) >= MIN_QUERY_LENGTH and search_index_available()
+
+
+def match_expression(query, columns=None):
+    """FTS5 MATCH string for query as a literal substring, limited to some columns"""
+    phrase = '"' + query.replace('"', '""') + '"'
+    if columns:
+        return '{' + ' '.join(columns) + '} : ' + phrase
+    return phrase
+
+
+def matching_ids(entity, query, columns=None):
+    """
+    Subquery of the ids of entity rows whose indexed text contains query,
+    for use as Q(id__in=matching_ids(...)).
+    """
+    number = SEARCH_SOURCES[entity][0]
+    return RawSQL(
+        f'SELECT rowid >> 2 FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s AND (rowid & 3) = %s',
+        (match_expression(query, columns), number)
+    )
+
+
+def _describe(entity, obj):
+    if entity == 'payment':
+        return (
+            f'{obj.payment_id} - {obj.tenant.name}',
+            f'UGX {obj.amount:,.0f} on {obj.payment_date:%d/%m/%Y} ({obj.get_payment_method_display()})',
+            reverse('payments:payment_list'), obj.payment_id,
+        )
+    if entity == 'tenant':
+        return obj.name, f'{obj.email} {obj.phone_number}', reverse('tenants:tenant_list'), obj.name
+    if entity == 'rental':
+        return (
+            obj.rental_number, f'{obj.get_rental_type_display()} at {obj.property.property_name}',
+            reverse('rentals:rental_list'), obj.rental_number,
+        )
+    return obj.property_name, obj.address, reverse('properties:property_list'), obj.property_id
+
+
+_QUERYSETS = {
+    'payment': lambda: Payment.objects.select_related('tenant'),
+    'tenant': lambda: Tenant.objects.all(),
+    'rental': lambda: Rental.objects.select_related('property'),
+    'property': lambda: Property.objects.all(),
+}
+
+_FALLBACK_FIELDS = {
+    'payment': ['payment_id', 'payment_method'],
+    'tenant': ['nin_number', 'name', 'email', 'phone_number'],
+    'rental': ['rental_number', 'rental_type'],
+    'property': ['property_id', 'property_name', 'address'],
+}
+
+
+def _ranked_hits(query, limit):
+    """(entity, id, score) for the best matches; lower scores are better"""
+    if use_search_index(query):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid & 3, rowid >> 2, bm25({SEARCH_TABLE}, %s, %s, %s) AS score FROM {SEARCH_TABLE} '
+                f'WHERE {SEARCH_TABLE} MATCH %s ORDER BY score LIMIT %s',
+                [*SEARCH_COLUMN_WEIGHTS, match_expression(query), limit]
+            )
+            return [(_ENTITIES_BY_NUMBER[number], object_id, score) for number, object_id, score in cursor.fetchall()]
+
+    # Short queries, or no index: substring match per entity, exact codes first
+    hits = []
+    for entity, fields in _FALLBACK_FIELDS.items():
+        condition = Q()
+        for field in fields:
+            condition |= Q(**{f'{field}__icontains': query})
+        for object_id, code in _QUERYSETS[entity]().filter(condition).values_list('id', fields[0])[:limit]:
+            hits.append((entity, object_id, 0.0 if code.lower() == query.lower() else 1.0))
+    hits.sort(key=lambda hit: hit[2])
+    return hits[:limit]
+
+
+def global_search(query, limit=20):
+    """Ranked matches across all four entity types, as dictionaries ready for JSON"""
+    query = query.strip()
+    if not query:
+        return []
+    limit = max(1, min(limit, SEARCH_RESULT_LIMIT))
+    hits = _ranked_hits(query, limit)
+
+    ids_by_entity = {}
+    for entity, object_id, score in hits:
+        ids_by_entity.setdefault(entity, []).append(object_id)
+    objects = {
+        entity: _QUERYSETS[entity]().in_bulk(ids) for entity, ids in ids_by_entity.items()
+    }
+
+    results = []
+    for entity, object_id, score in hits:
+        obj = objects[entity].get(object_id)
+        if obj is None:
+            continue
+        label, detail, list_url, search_text = _describe(entity, obj)
+        results.append({
+            'type': entity,
+            'id': object_id,
+            'label': label,
+            'detail': detail,
+            'url': f"{list_url}?{urlencode({'search': search_text})}",
+            'score': round(score, 4),
+        })
+    return results
@@ -0,0 +1,49 @@
+"""
+Atomic allocation of business IDs from per-namespace counters.
+
+Each namespace (for example 'payment', 'property' or 'rental:SUNRIS') has one
+row in the Sequence table. Allocation increments that row with a single
+UPDATE inside a transaction, so concurrent saves can never receive the same
+number and no scan of the business table is needed once the counter exists.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from .models import Sequence
+
+
+def reserve_block(namespace, count=1, seed=None):
+    """
+    Reserve count consecutive values in namespace and return them as a range.
+
+    seed is an optional callable returning the highest value already in use.
+    It is only called the first time a namespace is seen, so counters can pick
+    up from IDs that were generated before the counter existed.
+    """
+    if count < 1:
+        raise ValueError('count must be at least 1')
+
+    with transaction.atomic():
+        # Increment first: the UPDATE takes the write lock before we read the new value
+        updated = Sequence.objects.filter(namespace=namespace).update(
+            last_value=F('last_value') + count
+        )
+        if not updated:
+            start = (seed() or 0) if seed else 0
+            try:
+                with transaction.atomic():
+                    Sequence.objects.create(namespace=namespace, last_value=start + count)
+            except IntegrityError:
+                # Another writer created the counter first, so take the next block from it
+                Sequence.objects.filter(namespace=namespace).update(
+                    last_value=F('last_value') + count
+                )
+        last_value = Sequence.objects.filter(namespace=namespace).values_list(
+            'last_value', flat=True
+        ).get()
+
+    return range(last_value - count + 1, last_value + 1)
+
+
+def next_value(namespace, seed=None):
+    """Allocate a single value in namespace"""
+    return reserve_block(namespace, 1, seed)[0]
@@ -0,0 +1,131 @@
+"""
+Caching for the headline statistics on the list pages.
+
+Each cached result is stored under a key built from the current version of
+every model it depends on. Saving or deleting a Payment, Charge, Tenant,
+Rental or Property bumps that model's version (see connect_signals), so the
+next request computes fresh figures under a new key and the old entry simply
+expires. Versions are bumped once the change commits. Bulk operations that
+skip model signals (bulk_create, update) call bump_stats_version() themselves.
+
+Versions start from the current time in milliseconds, so a version evicted
+from the cache never comes back as a number that was used before.
+"""
+import hashlib
+import time
+from django.apps import apps
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+STATS_CACHE_TIMEOUT = 60 * 60
+STATS_MODELS = [
+    'payments.Payment',
+    'payments.Charge',
+    'tenants.Tenant',
+    'rentals.Rental',
+    'properties.Property',
+]
+PAGING_PARAMS = ('after', 'before')
+# The statistics cached by the list views and the forecast, reported by the stats_cache view
+STATS_CACHE_NAMES = ['payment_list', 'tenant_list', 'rental_list', 'portfolio_forecast']
+
+
+def _label(model):
+    return model if isinstance(model, str) else model._meta.label
+
+
+def _version_key(model):
+    return f'stats:version:{_label(model)}'
+
+
+def _fresh_version():
+    return int(time.time() * 1000)
+
+
+def get_stats_versions(models):
+    keys = [_version_key(model) for model in models]
+    versions = cache.get_many(keys)
+    missing = {key: _fresh_version() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def _bump(models):
+    for model in models:
+        key = _version_key(model)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _fresh_version(), None)
+
+
+def bump_stats_version(*models):
+    """
+    Invalidate every cached statistic that depends on any of models, once the
+    current transaction commits (at once outside of one). Bumping earlier would
+    let a concurrent request cache the old rows under the new version.
+    """
+    transaction.on_commit(lambda: _bump(models))
+
+
+def _count(name, outcome):
+    key = f'stats:{outcome}:{name}'
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, None)
+        cache.incr(key)
+
+
+def cached_stats(name, models, params, compute):
+    """
+    Return compute() from the cache, keyed by name, the versions of models and
+    params (anything with a stable repr, such as the search text and the date).
+    """
+    versions = get_stats_versions(models)
+    digest = hashlib.sha1(repr((versions, params)).encode('utf-8')).hexdigest()[:20]
+    key = f'stats:{name}:{digest}'
+
+    stats = cache.get(key)
+    if stats is not None:
+        _count(name, 'hits')
+        return stats
+
+    _count(name, 'misses')
+    stats = compute()
+    cache.set(key, stats, STATS_CACHE_TIMEOUT)
+    return stats
+
+
+def stats_cache_counters(names):
+    """Hit and miss counts per statistics name, since the cache was last cleared"""
+    keys = [f'stats:{outcome}:{name}' for name in names for outcome in ('hits', 'misses')]
+    counts = cache.get_many(keys)
+    return {
+        name: {
+            'hits': counts.get(f'stats:hits:{name}', 0),
+            'misses': counts.get(f'stats:misses:{name}', 0),
+        }
+        for name in names
+    }
+
+
+def request_params(request):
+    """The query string of a list page without its paging cursors, for use in params"""
+    return tuple(sorted(
+        (key, value) for key, values in request.GET.lists() if key not in PAGING_PARAMS for value in values
+    ))
+
+
+def _invalidate(sender, **kwargs):
+    bump_stats_version(sender)
+
+
+def connect_signals():
+    for label in STATS_MODELS:
+        model = apps.get_model(label)
+        post_save.connect(_invalidate, sender=model, dispatch_uid=f'stats-save-{label}')
+        post_delete.connect(_invalidate, sender=model, dispatch_uid=f'stats-delete-{label}')
@@ -1,3 +1,424 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.urls import reverse
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+import gzip
+import os
+import tempfile
+import zipfile
+from unittest import skipUnless
+from unittest.mock import patch
+from properties.models import Property
+from rentals.models import Rental
+from tenants.models import Tenant
+from payments.forms import PaymentForm
+from payments.models import Payment
+from .exports import iter_export
+from . import jobs
+from .autocomplete import AUTOCOMPLETE_SOURCES, prefix_matches
+from .jobs import CronSchedule, claim, enqueue, register, release_stale, run_job, schedule_due
+from .models import Job, Sequence
+from .pagination import KeysetPaginator
+from .search import SEARCH_TABLE, ensure_search_index
+from .sequences import next_value, reserve_block
+from .stats import bump_stats_version, cached_stats
 
 # Create your tests here.
+
+class SequenceTest(TestCase):
+    def test_values_are_consecutive_per_namespace(self):
+        self.assertEqual(next_value('payment'), 1)
+        self.assertEqual(next_value('payment'), 2)
+        self.assertEqual(next_value('property'), 1)
+        self.assertEqual(Sequence.objects.get(namespace='payment').last_value, 2)
+
+    def test_reserve_block(self):
+        next_value('payment')
+        self.assertEqual(list(reserve_block('payment', 3)), [2, 3, 4])
+        self.assertEqual(next_value('payment'), 5)
+
+    def test_seed_only_used_for_new_namespace(self):
+        calls = []
+
+        def seed():
+            calls.append(True)
+            return 41
+
+        self.assertEqual(next_value('rental:SUNRIS', seed), 42)
+        self.assertEqual(next_value('rental:SUNRIS', seed), 43)
+        self.assertEqual(len(calls), 1)
+
+    def test_invalid_count(self):
+        with self.assertRaises(ValueError):
+            reserve_block('payment', 0)
+
+
+class ExportWriterTest(TestCase):
+    header = ['Name', 'Amount', 'Date']
+    rows = [('Bob <B&B>', Decimal('200000.00'), date(2025, 10, 18)), ('Alpha', 5, None)]
+
+    def test_csv(self):
+        content = b''.join(iter_export(self.header, iter(self.rows), 'csv'))
+        self.assertEqual(content.decode().splitlines(), [
+            'Name,Amount,Date', 'Bob <B&B>,200000.00,2025-10-18', 'Alpha,5,'
+        ])
+
+    def test_gzip_csv(self):
+        content = b''.join(iter_export(self.header, iter(self.rows), 'csv', compress=True))
+        self.assertTrue(gzip.decompress(content).startswith(b'Name,Amount,Date'))
+
+    def test_xlsx(self):
+        content = b''.join(iter_export(self.header, iter(self.rows), 'xlsx'))
+        with zipfile.ZipFile(BytesIO(content)) as archive:
+            self.assertIn('xl/workbook.xml', archive.namelist())
+            sheet = archive.read('xl/worksheets/sheet1.xml').decode()
+        self.assertEqual(sheet.count('<row>'), 3)
+        self.assertIn('Bob &lt;B&amp;B&gt;', sheet)
+        self.assertIn('<c><v>200000.00</v></c>', sheet)
+
+    def test_rows_are_consumed_lazily(self):
+        consumed = []
+
+        def rows():
+            for number in range(2000):
+                consumed.append(number)
+                yield (number,)
+
+        chunks = iter_export(['Number'], rows(), 'csv')
+        next(chunks)
+        self.assertLess(len(consumed), 2000)
+
+    def test_export_data_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'rentals.csv.gz')
+            call_command('export_data', 'rentals', output=path, gzip=True, stderr=StringIO())
+            with gzip.open(path, 'rt') as handle:
+                self.assertEqual(handle.readline().strip(), 'Rental Number,Rental Type,Property,Address,Monthly Rent (UGX)')
+
+
+class KeysetPaginatorTest(TestCase):
+    def setUp(self):
+        # Repeated names so the id tie-breaker decides the order within a name
+        for number in range(7):
+            Property.objects.create(property_name=f'Estate {number % 3}', address=f'Plot {number}')
+        self.ordering = ('-property_name', 'id')
+        self.expected = list(Property.objects.order_by(*self.ordering))
+
+    def test_walk_forwards_and_backwards(self):
+        paginator = KeysetPaginator(Property.objects.all(), 3, self.ordering)
+        pages = [paginator.get_page()]
+        while pages[-1].has_next:
+            pages.append(paginator.get_page(after=pages[-1].next_cursor))
+
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertEqual([obj for page in pages for obj in page], self.expected)
+        self.assertFalse(pages[0].has_previous)
+
+        previous = paginator.get_page(before=pages[2].previous_cursor)
+        self.assertEqual(list(previous), list(pages[1]))
+        self.assertTrue(previous.has_previous)
+        self.assertEqual(list(paginator.get_page(before=previous.previous_cursor)), list(pages[0]))
+
+    def test_count_is_capped(self):
+        paginator = KeysetPaginator(Property.objects.all(), 3, self.ordering, count_limit=5)
+        self.assertEqual(paginator.count, 5)
+        self.assertTrue(paginator.count_is_estimate)
+
+        paginator = KeysetPaginator(Property.objects.all(), 3, self.ordering)
+        self.assertEqual(paginator.count, 7)
+        self.assertFalse(paginator.count_is_estimate)
+
+    def test_invalid_cursor_returns_first_page(self):
+        paginator = KeysetPaginator(Property.objects.all(), 3, self.ordering)
+        self.assertEqual(list(paginator.get_page(after='not-a-cursor')), self.expected[:3])
+
+
+class GlobalSearchTest(TestCase):
+    def setUp(self):
+        self.sunrise = Property.objects.create(property_name='Sunrise Estates', address='Plot 1, Kampala Road')
+        self.kampala = Property.objects.create(property_name='Kampala Heights', address='Plot 9, Entebbe Road')
+        self.rental = Rental.objects.create(
+            rental_type='SHOP', property=self.sunrise, monthly_rent_amount=Decimal('500000.00')
+        )
+
+    def test_ranked_results_across_entities(self):
+        response = self.client.get(reverse('home:search'), {'q': 'kampala'})
+        results = response.json()['results']
+        self.assertEqual(
+            {(result['type'], result['id']) for result in results},
+            {('property', self.sunrise.pk), ('property', self.kampala.pk)}
+        )
+        # The name match ranks above the address match
+        self.assertEqual(results[0]['label'], 'Kampala Heights')
+
+        results = self.client.get(reverse('home:search'), {'q': 'SUNRIS'}).json()['results']
+        self.assertEqual({result['type'] for result in results}, {'property', 'rental'})
+        self.assertIn('search=SUNRIS001', [result for result in results if result['type'] == 'rental'][0]['url'])
+
+    def test_short_query_falls_back(self):
+        results = self.client.get(reverse('home:search'), {'q': 'Ka'}).json()['results']
+        self.assertEqual({result['id'] for result in results}, {self.sunrise.pk, self.kampala.pk})
+
+    def test_missing_triggers_are_rebuilt(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER properties_property_search_insert')
+        Property.objects.create(property_name='Lakeside', address='Plot 3, Port Bell Road')
+        self.assertTrue(ensure_search_index(connection))
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT count(*) FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH 'lakeside'")
+            self.assertEqual(cursor.fetchone()[0], 1)
+        Property.objects.create(property_name='Lakeside Two', address='Plot 4, Port Bell Road')
+        results = self.client.get(reverse('home:search'), {'q': 'lakeside'}).json()['results']
+        self.assertEqual(len(results), 2)
+
+
+class AutocompleteTest(TestCase):
+    def setUp(self):
+        self.sunrise = Property.objects.create(property_name='Sunrise Estates', address='Plot 1, Kampala Road')
+        self.annex = Property.objects.create(property_name='sunrise annex', address='Plot 2, Kampala Road')
+        self.rental = Rental.objects.create(
+            rental_type='SHOP', property=self.sunrise, monthly_rent_amount=Decimal('500000.00')
+        )
+        self.tenants = {
+            name: Tenant.objects.create(
+                name=name, email=email, phone_number='0700000000', nin_number=f'NIN-{name}',
+                emergency_contact_name='Contact', emergency_contact_phone='0700000001', rental=self.rental,
+                tenant_property=self.sunrise, move_in_date=date(2025, 1, 1), rent_amount=Decimal('500000.00')
+            )
+            for name, email in [('Annet', 'annet@example.com'), ('Ann', 'a.n@example.com'),
+                                ('Bob', 'ann.bob@example.com'), ('Anna', 'anna@example.com')]
+        }
+
+    def autocomplete(self, entity, **params):
+        response = self.client.get(reverse('home:autocomplete', args=[entity]), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results']
+
+    def test_non_ascii_letters_match_as_stored(self):
+        self.tenants['Ann'].name = 'Émile'
+        self.tenants['Ann'].save()
+        self.assertEqual([result['text'] for result in self.autocomplete('tenant', q='ÉMI')], ['Émile'])
+        # SQLite's LOWER() leaves É alone, so é cannot match it
+        self.assertEqual(self.autocomplete('tenant', q='émi'), [])
+
+    def test_matches_are_ranked(self):
+        # Exact match first, then name matches before email matches, alphabetically
+        self.assertEqual(
+            [result['text'] for result in self.autocomplete('tenant', q='ANN')],
+            ['Ann', 'Anna', 'Annet', 'Bob']
+        )
+        self.assertEqual([result['text'] for result in self.autocomplete('tenant', q='ann', limit=2)], ['Ann', 'Anna'])
+        self.assertEqual(self.autocomplete('tenant', q='nin-bo')[0]['id'], self.tenants['Bob'].pk)
+        self.assertEqual(
+            [result['id'] for result in self.autocomplete('property', q='Sunrise')], [self.annex.pk, self.sunrise.pk]
+        )
+        self.assertEqual(
+            self.autocomplete('rental', q='sunris0'),
+            [{'id': self.rental.pk, 'text': 'SUNRIS001 - Shop', 'detail': 'Sunrise Estates'}]
+        )
+        self.assertEqual(self.autocomplete('property', q=''), [])
+
+        self.assertEqual(self.client.get(reverse('home:autocomplete', args=['payment']), {'q': 'a'}).status_code, 404)
+        self.assertEqual(self.client.get(reverse('home:autocomplete', args=['tenant']), {'limit': 'x'}).status_code, 400)
+
+    @skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN is SQLite syntax')
+    def test_prefix_lookups_use_indexes(self):
+        for entity, (model, keys, values, describe) in AUTOCOMPLETE_SOURCES.items():
+            for field, case in keys:
+                queryset, key, prefix = prefix_matches(model, field, case, 'su')
+                with connection.cursor() as cursor:
+                    sql, params = queryset.values(*values)[:10].query.sql_with_params()
+                    cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+                    plan = ' '.join(str(row[-1]) for row in cursor.fetchall())
+                with self.subTest(entity=entity, field=field):
+                    self.assertRegex(plan, rf'SEARCH {model._meta.db_table} USING INDEX \S+ \(<expr>>\? AND <expr><\?\)'
+                                     if case == 'lower' else rf'SEARCH {model._meta.db_table} USING INDEX \S+ \({field}>\? AND {field}<\?\)')
+                    self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_forms_render_only_the_selected_choice(self):
+        Tenant.objects.bulk_create([
+            Tenant(
+                name=f'Tenant {number}', email=f'tenant{number}@example.com', phone_number='0700000000',
+                nin_number=f'NIN-{number}', emergency_contact_name='Contact', emergency_contact_phone='0700000001',
+                rental=self.rental, tenant_property=self.sunrise, move_in_date=date(2025, 1, 1), rent_amount=Decimal('1.00')
+            )
+            for number in range(200)
+        ])
+        html = str(PaymentForm()['tenant'])
+        self.assertEqual(html.count('<option'), 1)
+        self.assertIn(reverse('home:autocomplete', args=['tenant']), html)
+
+        payment = Payment.objects.create(
+            tenant=self.tenants['Bob'], rental=self.rental, amount=Decimal('100000.00'),
+            amount_due=Decimal('500000.00'), payment_date=date(2025, 1, 5), payment_method='CASH'
+        )
+        form = PaymentForm(instance=payment)
+        # One query per picker, with the tenant's rental joined in for its label
+        with self.assertNumQueries(2):
+            html = str(form['tenant']) + str(form['rental'])
+        self.assertEqual(html.count('<option'), 4)
+        self.assertIn(f'<option value="{self.tenants["Bob"].pk}" selected>', html)
+
+        # A submitted value that is not an id renders no choice and fails validation
+        form = PaymentForm(data={'tenant': 'abc', 'rental': self.rental.pk})
+        self.assertEqual(str(form['tenant']).count('<option'), 1)
+        self.assertIn('tenant', form.errors)
+
+
+class StatsCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.property = Property.objects.create(property_name='Sunrise Estates', address='Plot 1, Kampala Road')
+
+    def add_rental(self, rent):
+        # Versions are bumped when the test's transaction would commit
+        with self.captureOnCommitCallbacks(execute=True):
+            return Rental.objects.create(
+                rental_type='SHOP', property=self.property, monthly_rent_amount=Decimal(rent)
+            )
+
+    def test_cached_until_a_dependency_changes(self):
+        calls = []
+
+        def compute():
+            calls.append(True)
+            return {'rentals': Rental.objects.count()}
+
+        self.assertEqual(cached_stats('rentals', [Rental], (), compute), {'rentals': 0})
+        self.assertEqual(cached_stats('rentals', [Rental], (), compute), {'rentals': 0})
+        self.assertEqual(len(calls), 1)
+
+        self.add_rental('500000.00')
+        self.assertEqual(cached_stats('rentals', [Rental], (), compute), {'rentals': 1})
+        # Saving a related model that is not a dependency keeps the entry
+        with self.captureOnCommitCallbacks(execute=True):
+            Property.objects.create(property_name='Hilltop Homes', address='Plot 2, Jinja Road')
+        cached_stats('rentals', [Rental], (), compute)
+        self.assertEqual(len(calls), 2)
+
+        # Until the change commits, other requests still see the old rows under the old version
+        with self.captureOnCommitCallbacks(execute=True):
+            bump_stats_version(Rental)
+            cached_stats('rentals', [Rental], (), compute)
+            self.assertEqual(len(calls), 2)
+        cached_stats('rentals', [Rental], (), compute)
+        self.assertEqual(len(calls), 3)
+
+    def test_rental_list_counters(self):
+        rental = self.add_rental('500000.00')
+        self.client.get(reverse('rentals:rental_list'))
+        response = self.client.get(reverse('rentals:rental_list'))
+        self.assertEqual(response.context['total_monthly_revenue'], Decimal('500000.00'))
+
+        rental.monthly_rent_amount = Decimal('600000.00')
+        with self.captureOnCommitCallbacks(execute=True):
+            rental.save()
+        response = self.client.get(reverse('rentals:rental_list'))
+        self.assertEqual(response.context['total_monthly_revenue'], Decimal('600000.00'))
+
+        counts = self.client.get(reverse('home:stats_cache')).json()
+        self.assertEqual(counts['pages']['rental_list'], {'hits': 1, 'misses': 2})
+        self.assertEqual((counts['hits'], counts['misses']), (1, 2))
+
+
+calls = []
+
+
+@register('tests.record', priority=1)
+def record_call(value):
+    calls.append(value)
+
+
+@register('tests.flaky', max_attempts=2)
+def flaky():
+    raise RuntimeError('Temporarily unavailable')
+
+
+# Tests run inside a transaction, which closing connections between jobs would break
+@patch('home.jobs.close_old_connections')
+class JobQueueTest(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_jobs_run_in_priority_order(self, close_old_connections):
+        enqueue('tests.record', value='default')
+        enqueue('tests.record', value='urgent', priority=5)
+        enqueue('tests.record', value='later', run_at=timezone.now() + timedelta(hours=1))
+        with self.assertRaises(ValueError):
+            enqueue('tests.unknown')
+
+        output = StringIO()
+        call_command('run_worker', burst=True, concurrency=1, no_scheduler=True, stdout=output)
+        self.assertEqual(calls, ['urgent', 'default'])
+        self.assertIn('1 jobs queued, 0 failed', output.getvalue())
+        self.assertEqual(Job.objects.filter(status='DONE').count(), 2)
+
+    def test_claimed_job_cannot_be_claimed_again(self, close_old_connections):
+        enqueue('tests.record', value=1)
+        first = claim('worker-a')
+        self.assertEqual(len(first), 1)
+        self.assertEqual(claim('worker-b'), [])
+        self.assertEqual((first[0].status, first[0].attempts, first[0].locked_by), ('RUNNING', 1, 'worker-a'))
+
+        # A worker that died leaves its job locked until the lock times out
+        Job.objects.update(locked_at=timezone.now() - jobs.LOCK_TIMEOUT - timedelta(seconds=1))
+        self.assertEqual(release_stale(), 1)
+        self.assertEqual(len(claim('worker-b')), 1)
+
+    def test_heartbeat_keeps_long_jobs_locked(self, close_old_connections):
+        enqueue('tests.record', value=1)
+        job = claim('worker-a')[0]
+        # Past the timeout, but the worker is still beating
+        Job.objects.update(locked_at=timezone.now() - jobs.LOCK_TIMEOUT - timedelta(seconds=1))
+        self.assertTrue(jobs.Heartbeat(job, 'worker-a').beat())
+        self.assertEqual(release_stale(), 0)
+        self.assertFalse(jobs.Heartbeat(job, 'worker-b').beat())
+
+        self.assertTrue(run_job(job, 'worker-a'))
+        self.assertEqual(Job.objects.get().status, 'DONE')
+        self.assertFalse(jobs.Heartbeat(job, 'worker-a').beat())
+
+    def test_failures_are_retried_with_backoff(self, close_old_connections):
+        job = enqueue('tests.flaky')
+        with self.assertLogs('home.jobs', 'ERROR'):
+            self.assertFalse(run_job(claim('worker')[0], 'worker'))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('QUEUED', 1))
+        self.assertIn('Temporarily unavailable', job.last_error)
+        self.assertAlmostEqual((job.run_at - timezone.now()).total_seconds(), jobs.BACKOFF_BASE, delta=5)
+        self.assertEqual(claim('worker'), [])
+
+        Job.objects.update(run_at=timezone.now())
+        with self.assertLogs('home.jobs', 'ERROR'):
+            self.assertFalse(run_job(claim('worker')[0], 'worker'))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('FAILED', 2))
+        self.assertEqual([jobs.backoff(attempt) for attempt in (1, 2, 3, 10)], [30, 60, 120, 3600])
+
+    def test_cron_schedule(self, close_old_connections):
+        monthly = CronSchedule('5 0 1 * *')
+        self.assertTrue(monthly.matches(datetime(2025, 11, 1, 0, 5)))
+        self.assertFalse(monthly.matches(datetime(2025, 11, 2, 0, 5)))
+        weekdays = CronSchedule('*/15 8-17 * * 1-5')
+        self.assertTrue(weekdays.matches(datetime(2025, 10, 17, 9, 45)))   # a Friday
+        self.assertFalse(weekdays.matches(datetime(2025, 10, 19, 9, 45)))  # a Sunday
+        # Day of month and day of week both restricted: either one will do
+        self.assertTrue(CronSchedule('0 0 13 * 5').matches(datetime(2025, 10, 17)))
+        with self.assertRaises(ValueError):
+            CronSchedule('61 * * * *')
+
+    @override_settings(JOB_SCHEDULE=[{'cron': '0 6 * * *', 'job': 'tests.record', 'kwargs': {'value': 'daily'}}])
+    def test_scheduled_jobs_are_queued_once_per_tick(self, close_old_connections):
+        six = timezone.make_aware(datetime(2025, 10, 17, 6, 0, 30))
+        self.assertEqual(schedule_due(six), 1)
+        # A second scheduler, or the same one again, in the same minute
+        schedule_due(six + timedelta(seconds=20))
+        schedule_due(six + timedelta(minutes=1))
+        job = Job.objects.get()
+        self.assertEqual((job.kwargs, job.priority, job.scheduled_for), ({'value': 'daily'}, 1, six.replace(second=0)))
@@ -5,4 +5,7 @@ app_name = 'home'
 
 urlpatterns = [
     path('', views.index, name='index'),
+    path('search/', views.search, name='search'),
+    path('autocomplete/<str:entity>/', views.autocomplete, name='autocomplete'),
+    path('stats/cache/', views.stats_cache, name='stats_cache'),
 ]
\ No newline at end of file
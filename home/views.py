@@ -1,4 +1,8 @@
+from django.http import JsonResponse
 from django.shortcuts import render
+from .autocomplete import AUTOCOMPLETE_LIMIT, AUTOCOMPLETE_SOURCES, autocomplete as autocomplete_matches
+from .search import global_search
+from .stats import STATS_CACHE_NAMES, stats_cache_counters
 
 # Create your views here.
 
@@ -7,3 +11,50 @@ def index(request):
     Home page view
     """
     return render(request, 'index.html')
+
+
+def search(request):
+    """
+    Ranked search across payments, tenants, rentals and properties.
+    GET /search/?q=<text>&limit=<n> returns JSON results, best match first.
+    """
+    query = request.GET.get('q', '').strip()
+    try:
+        limit = int(request.GET.get('limit', 20))
+    except ValueError:
+        return JsonResponse({'error': 'limit must be a number'}, status=400)
+
+    return JsonResponse({'query': query, 'results': global_search(query, limit)})
+
+
+def autocomplete(request, entity):
+    """
+    Typeahead matches for the tenant, rental and property pickers.
+    GET /autocomplete/<tenant|rental|property>/?q=<prefix>&limit=<n> returns
+    JSON results, best match first.
+    """
+    if entity not in AUTOCOMPLETE_SOURCES:
+        return JsonResponse({'error': f'Unknown type "{entity}"'}, status=404)
+    query = request.GET.get('q', '').strip()
+    try:
+        limit = int(request.GET.get('limit', AUTOCOMPLETE_LIMIT))
+    except ValueError:
+        return JsonResponse({'error': 'limit must be a number'}, status=400)
+
+    return JsonResponse({'query': query, 'results': autocomplete_matches(entity, query, limit)})
+
+
+def stats_cache(request):
+    """
+    Hit and miss counts of the cached list page statistics.
+    GET /stats/cache/ returns JSON counts per list page and in total.
+    """
+    pages = stats_cache_counters(STATS_CACHE_NAMES)
+    hits = sum(counts['hits'] for counts in pages.values())
+    misses = sum(counts['misses'] for counts in pages.values())
+    return JsonResponse({
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / (hits + misses), 3) if hits + misses else None,
+        'pages': pages,
+    })
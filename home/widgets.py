@@ -0,0 +1,60 @@
+from django import forms
+from django.core.exceptions import ValidationError
+from django.forms.models import ModelChoiceIterator
+from django.urls import reverse
+from .autocomplete import AUTOCOMPLETE_LIMIT
+
+
+class AutocompleteSelect(forms.Select):
+    """
+    A select for a ModelChoiceField that renders only the empty choice and the
+    selected object instead of the whole table. A search box above it fills the
+    select with matches from the autocomplete endpoint of entity (tenant, rental
+    or property; see home.autocomplete) as the user types.
+
+    The element keeps its id, name and change events, so page scripts reading
+    select.value work unchanged.
+    """
+    template_name = 'widgets/autocomplete_select.html'
+
+    def __init__(self, entity, attrs=None, placeholder='Type to search...', limit=AUTOCOMPLETE_LIMIT):
+        super().__init__(attrs)
+        self.entity = entity
+        self.placeholder = placeholder
+        self.limit = limit
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context['widget'].update({
+            'autocomplete_url': reverse('home:autocomplete', args=[self.entity]),
+            'placeholder': self.placeholder,
+            'limit': self.limit,
+            'search_class': self.attrs.get('class', ''),
+        })
+        return context
+
+    def selected_choices(self, value):
+        """(value, label) of the empty choice and of the objects in value"""
+        if not isinstance(self.choices, ModelChoiceIterator):
+            return [choice for choice in self.choices if choice[0] in ('', None) or str(choice[0]) in value]
+
+        field = self.choices.field
+        choices = [('', field.empty_label)] if field.empty_label is not None else []
+        selected = [item for item in value if item not in ('', None)]
+        if selected:
+            try:
+                objects = list(self.choices.queryset.filter(pk__in=selected))
+            except (ValueError, TypeError, ValidationError):
+                # A submitted value that is not a primary key; the field reports it
+                objects = []
+            choices.extend(self.choices.choice(obj) for obj in objects)
+        return choices
+
+    def optgroups(self, name, value, attrs=None):
+        groups = []
+        for index, (option_value, option_label) in enumerate(self.selected_choices(value)):
+            if option_value is None:
+                option_value = ''
+            selected = str(option_value) in value
+            groups.append((None, [self.create_option(name, option_value, option_label, selected, index, attrs=attrs)], index))
+        return groups
@@ -0,0 +1,150 @@
+"""
+Arrears aging and the collections queue.
+
+Every unpaid balance of a tenant+rental+period is loaded in one query as
+columns (tenant, period, amount owed): periods that have been billed come
+from Charge minus the period ledger, and periods with payments but no charge
+from the ledger's own total_due. NumPy then ages every balance from the first
+day of its period and sums them per tenant and per aging bucket, and
+heapq.nlargest picks the worst debtors for the collections queue without
+sorting the whole portfolio.
+
+Amounts are handled as integer cents so the totals are exact.
+"""
+import heapq
+from dataclasses import dataclass
+from datetime import date
+from decimal import Decimal
+import numpy as np
+from django.db.models import DecimalField, Exists, ExpressionWrapper, F, OuterRef
+from django.utils import timezone
+from tenants.models import Tenant
+from .models import PERIOD_PATTERN, Charge, PaymentPeriodBalance
+
+AGING_BUCKETS = ['0-30', '31-60', '61-90', '90+']
+# First day (of arrears) of every bucket after the first
+AGING_BUCKET_EDGES = [31, 61, 91]
+
+COLLECTIONS_QUEUE_SIZE = 20
+
+ARREARS_EXPORT_HEADER = [
+    'Tenant', 'Phone Number', 'Rental', *(f'{bucket} days (UGX)' for bucket in AGING_BUCKETS),
+    'Total Arrears (UGX)', 'Oldest Arrears (days)',
+]
+
+
+def _cents_to_decimal(cents):
+    return Decimal(int(cents)) / 100
+
+
+def outstanding_balances():
+    """
+    (tenant_id, rental_period, amount owed) for every period with money owed,
+    as a single UNION query.
+    """
+    money = DecimalField(max_digits=12, decimal_places=2)
+
+    billed = Charge.annotate_balances(
+        Charge.objects.filter(rental_period__regex=PERIOD_PATTERN)
+    ).filter(balance__gt=0).values_list('tenant_id', 'rental_period', 'balance')
+
+    unbilled = PaymentPeriodBalance.objects.filter(
+        rental_period__regex=PERIOD_PATTERN, total_paid__lt=F('total_due')
+    ).exclude(Exists(Charge.objects.filter(
+        tenant_id=OuterRef('tenant_id'),
+        rental_id=OuterRef('rental_id'),
+        rental_period=OuterRef('rental_period')
+    ))).annotate(
+        owed=ExpressionWrapper(F('total_due') - F('total_paid'), output_field=money)
+    ).values_list('tenant_id', 'rental_period', 'owed')
+
+    return billed.union(unbilled, all=True)
+
+
+@dataclass
+class AgingReport:
+    as_of: date
+    tenant_ids: np.ndarray      # one entry per tenant in arrears
+    bucket_cents: np.ndarray    # (tenants, buckets) amounts owed
+    oldest_days: np.ndarray     # age of each tenant's oldest unpaid period
+
+    @property
+    def total_cents(self):
+        return self.bucket_cents.sum(axis=1)
+
+    @property
+    def buckets(self):
+        """Portfolio totals per bucket: label, amount and number of tenants with arrears in it"""
+        amounts = self.bucket_cents.sum(axis=0)
+        counts = (self.bucket_cents > 0).sum(axis=0)
+        return [
+            {'label': label, 'amount': _cents_to_decimal(amount), 'tenant_count': int(count)}
+            for label, amount, count in zip(AGING_BUCKETS, amounts, counts)
+        ]
+
+    @property
+    def total_arrears(self):
+        return _cents_to_decimal(self.bucket_cents.sum())
+
+    def ranked(self, limit=None):
+        """
+        Tenants by arrears, largest first (ties go to the older debt), with their
+        details loaded in one query. limit=None ranks every tenant in arrears.
+        """
+        entries = zip(self.total_cents.tolist(), self.oldest_days.tolist(), range(len(self.tenant_ids)))
+        if limit is None:
+            top = sorted(entries, reverse=True)
+        else:
+            top = heapq.nlargest(limit, entries)
+
+        tenants = Tenant.objects.select_related('rental').in_bulk(
+            [int(self.tenant_ids[index]) for total, oldest, index in top]
+        )
+        queue = []
+        for total, oldest, index in top:
+            tenant = tenants.get(int(self.tenant_ids[index]))
+            if tenant is None:
+                continue
+            queue.append({
+                'tenant': tenant,
+                'buckets': [_cents_to_decimal(cents) for cents in self.bucket_cents[index]],
+                'total': _cents_to_decimal(total),
+                'oldest_days': oldest,
+            })
+        return queue
+
+    def collections_queue(self, size=COLLECTIONS_QUEUE_SIZE):
+        return self.ranked(limit=size)
+
+    def export_rows(self):
+        for entry in self.ranked():
+            tenant = entry['tenant']
+            yield [
+                tenant.name, tenant.phone_number, tenant.rental.rental_number,
+                *entry['buckets'], entry['total'], entry['oldest_days'],
+            ]
+
+
+def build_aging_report(as_of=None):
+    """Age every outstanding balance as of a date (default today) and total it per tenant and bucket"""
+    as_of = as_of or timezone.localdate()
+    rows = list(outstanding_balances())
+
+    tenant_column = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    period_column = np.array([row[1] for row in rows], dtype='datetime64[M]')
+    cents_column = np.fromiter((int(row[2] * 100) for row in rows), dtype=np.int64, count=len(rows))
+
+    # Rent falls due on the first day of its period; later periods are not in arrears yet
+    days = (np.datetime64(as_of, 'D') - period_column.astype('datetime64[D]')).astype(np.int64)
+    due = days >= 0
+    tenant_column, days, cents_column = tenant_column[due], days[due], cents_column[due]
+
+    tenant_ids, tenant_index = np.unique(tenant_column, return_inverse=True)
+    bucket_index = np.digitize(days, AGING_BUCKET_EDGES)
+
+    bucket_cents = np.zeros((len(tenant_ids), len(AGING_BUCKETS)), dtype=np.int64)
+    np.add.at(bucket_cents, (tenant_index, bucket_index), cents_column)
+    oldest_days = np.zeros(len(tenant_ids), dtype=np.int64)
+    np.maximum.at(oldest_days, tenant_index, days)
+
+    return AgingReport(as_of=as_of, tenant_ids=tenant_ids, bucket_cents=bucket_cents, oldest_days=oldest_days)
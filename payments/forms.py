@@ -1,9 +1,12 @@
 from django import forms
+from django.db.models import Q
 from crispy_forms.helper import FormHelper
 from crispy_forms.layout import Layout, Submit, Div, Field
 from .models import Payment
 from tenants.models import Tenant
 from rentals.models import Rental
+from home.search import matching_ids, use_search_index
+from home.widgets import AutocompleteSelect
 
 class PaymentSearchForm(forms.Form):
     search = forms.CharField(
@@ -28,19 +31,83 @@ class PaymentSearchForm(forms.Form):
             Submit('submit', 'Search', css_class='bg-Unity-Purple hover:bg-Unity-purple2 text-white font-bold py-2 px-6 rounded-lg transition duration-200')
         )
 
+    def filter_queryset(self, payments):
+        """Apply the search query to a Payment queryset (used by the list view and exports)"""
+        if self.is_valid():
+            search_query = self.cleaned_data.get('search')
+            if use_search_index(search_query):
+                payments = payments.filter(
+                    Q(id__in=matching_ids('payment', search_query)) |
+                    Q(tenant_id__in=matching_ids('tenant', search_query, ['name'])) |
+                    Q(rental_id__in=matching_ids('rental', search_query, ['code'])) |
+                    Q(rental__property_id__in=matching_ids('property', search_query, ['name']))
+                )
+            elif search_query:
+                payments = payments.filter(
+                    Q(payment_id__icontains=search_query) |
+                    Q(tenant__name__icontains=search_query) |
+                    Q(rental__rental_number__icontains=search_query) |
+                    Q(rental__property__property_name__icontains=search_query) |
+                    Q(payment_method__icontains=search_query)
+                )
+        return payments
+
+    def filter_archived(self, archived):
+        """
+        Apply the search query to an ArchivedPayment queryset. Archived payments are
+        not in the search index, so their IDs and methods are matched with icontains.
+        """
+        if self.is_valid():
+            search_query = self.cleaned_data.get('search')
+            if use_search_index(search_query):
+                archived = archived.filter(
+                    Q(payment_id__icontains=search_query) |
+                    Q(payment_method__icontains=search_query) |
+                    Q(tenant_id__in=matching_ids('tenant', search_query, ['name'])) |
+                    Q(rental_id__in=matching_ids('rental', search_query, ['code'])) |
+                    Q(rental__property_id__in=matching_ids('property', search_query, ['name']))
+                )
+            elif search_query:
+                archived = archived.filter(
+                    Q(payment_id__icontains=search_query) |
+                    Q(tenant__name__icontains=search_query) |
+                    Q(rental__rental_number__icontains=search_query) |
+                    Q(rental__property__property_name__icontains=search_query) |
+                    Q(payment_method__icontains=search_query)
+                )
+        return archived
+
+    def filter_charges(self, charges):
+        """Apply the search query to a Charge queryset by tenant name, rental number and property name"""
+        if self.is_valid():
+            search_query = self.cleaned_data.get('search')
+            if use_search_index(search_query):
+                charges = charges.filter(
+                    Q(tenant_id__in=matching_ids('tenant', search_query, ['name'])) |
+                    Q(rental_id__in=matching_ids('rental', search_query, ['code'])) |
+                    Q(rental__property_id__in=matching_ids('property', search_query, ['name']))
+                )
+            elif search_query:
+                charges = charges.filter(
+                    Q(tenant__name__icontains=search_query) |
+                    Q(rental__rental_number__icontains=search_query) |
+                    Q(rental__property__property_name__icontains=search_query)
+                )
+        return charges
+
 class PaymentForm(forms.ModelForm):
     class Meta:
         model = Payment
         fields = ['tenant', 'rental', 'amount', 'amount_due', 'payment_date', 'payment_method', 'rental_period']
         widgets = {
-            'tenant': forms.Select(attrs={
+            'tenant': AutocompleteSelect('tenant', attrs={
                 'class': 'w-full pl-10 pr-3 py-3 border border-gray-300 rounded-lg focus:ring-2 focus:ring-Unity-Purple5 focus:border-Unity-Purple5',
                 'onchange': 'updatePaymentInfo()'
-            }),
-            'rental': forms.Select(attrs={
+            }, placeholder='Search tenants by name, email or NIN...'),
+            'rental': AutocompleteSelect('rental', attrs={
                 'class': 'w-full pl-10 pr-3 py-3 border border-gray-300 rounded-lg focus:ring-2 focus:ring-Unity-Purple5 focus:border-Unity-Purple5',
                 'onchange': 'updatePaymentInfo()'
-            }),
+            }, placeholder='Search rentals by number...'),
             'amount': forms.NumberInput(attrs={
                 'step': '0.01',
                 'placeholder': 'Enter payment amount',
@@ -80,7 +147,8 @@ class PaymentForm(forms.ModelForm):
         super().__init__(*args, **kwargs)
         
         # Configure tenant dropdown
-        self.fields['tenant'].queryset = Tenant.objects.all().order_by('name')
+        # The autocomplete widgets only load the selected tenant and rental
+        self.fields['tenant'].queryset = Tenant.objects.select_related('rental').order_by('name')
         self.fields['tenant'].empty_label = "Select a Tenant"
         
         # Configure rental dropdown
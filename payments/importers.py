@@ -0,0 +1,188 @@
+"""
+Bulk import of payments from bank and mobile-money statements.
+
+Rows are streamed from CSV or JSON Lines files, tenants and rentals are
+resolved through in-memory lookup maps, and valid payments are written with
+bulk_create in chunks using payment IDs reserved up front. Balances are
+recomputed once per affected tenant+rental+period at the end of the run.
+"""
+import csv
+import json
+import re
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from .models import Payment, PaymentEvent, PAYMENT_METHODS, PERIOD_PATTERN, period_start_for
+from tenants.models import Tenant
+from rentals.models import Rental
+
+
+class RowError(ValueError):
+    """A statement row that cannot be imported"""
+
+
+def read_rows(path, file_format=None):
+    """
+    Yield (line_number, row) pairs from a CSV or JSON Lines file without loading it into memory.
+    The format is taken from the file extension unless file_format is given.
+    """
+    file_format = file_format or ('jsonl' if str(path).endswith(('.jsonl', '.json')) else 'csv')
+    with open(path, newline='', encoding='utf-8-sig') as handle:
+        if file_format == 'jsonl':
+            for line_number, line in enumerate(handle, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield line_number, {'__error__': f'Invalid JSON: {e}'}
+                    continue
+                if not isinstance(row, dict):
+                    yield line_number, {'__error__': 'Expected a JSON object'}
+                    continue
+                yield line_number, row
+        else:
+            # Line 1 is the header
+            for line_number, row in enumerate(csv.DictReader(handle), start=2):
+                yield line_number, row
+
+
+class PaymentImporter:
+    """
+    Import statement rows as payments.
+
+    Each row needs tenant (email or NIN), amount and payment_date (YYYY-MM-DD).
+    rental (rental number) defaults to the tenant's rental, payment_method accepts
+    a code or label and defaults to MOBILE, and rental_period (YYYY-MM) defaults to
+    the payment date's month.
+    """
+    def __init__(self, chunk_size=1000, dry_run=False, rejects=None, progress=None):
+        self.chunk_size = chunk_size
+        self.dry_run = dry_run
+        self.rejects = rejects
+        self.progress = progress
+        self.processed = 0
+        self.imported = 0
+        self.rejected = 0
+        self.groups = set()
+        self._load_lookups()
+
+    def _load_lookups(self):
+        self.tenants = {}
+        self.tenant_rentals = {}
+        for tenant_id, email, nin_number, rental_id in Tenant.objects.values_list(
+            'id', 'email', 'nin_number', 'rental_id'
+        ).iterator():
+            self.tenants[email.strip().lower()] = tenant_id
+            self.tenants[nin_number.strip().upper()] = tenant_id
+            self.tenant_rentals[tenant_id] = rental_id
+
+        self.rentals = {}
+        self.rental_amounts = {}
+        for rental_id, rental_number, monthly_rent_amount in Rental.objects.values_list(
+            'id', 'rental_number', 'monthly_rent_amount'
+        ).iterator():
+            self.rentals[rental_number.upper()] = rental_id
+            self.rental_amounts[rental_id] = monthly_rent_amount
+
+        self.methods = {}
+        for code, label in PAYMENT_METHODS:
+            self.methods[code.upper()] = code
+            self.methods[label.upper()] = code
+
+    def run(self, rows):
+        """Import (line_number, row) pairs and return the number of payments imported"""
+        with transaction.atomic():
+            chunk = []
+            for line_number, row in rows:
+                self.processed += 1
+                try:
+                    chunk.append(self.build_payment(row))
+                except RowError as e:
+                    self.reject(line_number, row, str(e))
+
+                if len(chunk) >= self.chunk_size:
+                    self.write_chunk(chunk)
+                    chunk = []
+            if chunk:
+                self.write_chunk(chunk)
+
+            if not self.dry_run and self.groups:
+                Payment.recompute_balances(self.groups)
+        return self.imported
+
+    def build_payment(self, row):
+        if '__error__' in row:
+            raise RowError(row['__error__'])
+
+        tenant_key = str(row.get('tenant') or '').strip()
+        tenant_id = self.tenants.get(tenant_key.lower()) or self.tenants.get(tenant_key.upper())
+        if not tenant_id:
+            raise RowError(f'Unknown tenant "{tenant_key}"')
+
+        rental_number = str(row.get('rental') or '').strip().upper()
+        if rental_number:
+            rental_id = self.rentals.get(rental_number)
+            if not rental_id:
+                raise RowError(f'Unknown rental "{rental_number}"')
+        else:
+            rental_id = self.tenant_rentals[tenant_id]
+
+        try:
+            amount = Decimal(str(row.get('amount', '')).replace(',', '').strip())
+        except InvalidOperation:
+            raise RowError(f'Invalid amount "{row.get("amount")}"')
+        if not amount.is_finite() or amount <= 0:
+            raise RowError('Amount must be greater than 0')
+        try:
+            # Digits the column cannot hold would fail the whole chunk in bulk_create
+            Payment._meta.get_field('amount').run_validators(amount)
+        except ValidationError as e:
+            raise RowError(f'Invalid amount "{row.get("amount")}": {" ".join(e.messages)}')
+
+        try:
+            payment_date = datetime.strptime(str(row.get('payment_date', '')).strip(), '%Y-%m-%d').date()
+        except ValueError:
+            raise RowError(f'Invalid payment date "{row.get("payment_date")}", expected YYYY-MM-DD')
+
+        method = str(row.get('payment_method') or 'MOBILE').strip().upper()
+        if method not in self.methods:
+            raise RowError(f'Unknown payment method "{row.get("payment_method")}"')
+
+        rental_period = str(row.get('rental_period') or '').strip() or payment_date.strftime('%Y-%m')
+        if not re.fullmatch(PERIOD_PATTERN, rental_period):
+            raise RowError(f'Invalid rental period "{rental_period}", expected YYYY-MM')
+
+        return Payment(
+            tenant_id=tenant_id,
+            rental_id=rental_id,
+            amount=amount,
+            amount_due=self.rental_amounts[rental_id],  # Recomputed once the import is done
+            payment_date=payment_date,
+            payment_method=self.methods[method],
+            rental_period=rental_period,
+            period_start=period_start_for(rental_period),
+        )
+
+    def write_chunk(self, payments):
+        if not self.dry_run:
+            for payment, payment_id in zip(payments, Payment.reserve_payment_ids(len(payments))):
+                payment.payment_id = payment_id
+            Payment.objects.bulk_create(payments, batch_size=500)
+            PaymentEvent.record([
+                PaymentEvent.for_change(
+                    'CREATED', payment, (payment.tenant_id, payment.rental_id, payment.rental_period), payment.amount, 1
+                )
+                for payment in payments
+            ])
+        for payment in payments:
+            self.groups.add((payment.tenant_id, payment.rental_id, payment.rental_period))
+        self.imported += len(payments)
+        if self.progress:
+            self.progress(self.processed, self.imported, self.rejected)
+
+    def reject(self, line_number, row, error):
+        self.rejected += 1
+        if self.rejects:
+            self.rejects.writerow({'line': line_number, 'error': error, 'row': json.dumps(row, default=str)})
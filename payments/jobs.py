@@ -0,0 +1,34 @@
+"""Background jobs for payments, run by manage.py run_worker (see home.jobs)"""
+from datetime import date
+from django.core.management import call_command
+from home.jobs import register
+from .importers import PaymentImporter, read_rows
+from .models import BalanceSnapshot, Charge, Payment
+
+
+@register('payments.recompute_balances', priority=10)
+def recompute_balances(groups):
+    """Recompute the ledger and running balances of [tenant_id, rental_id, rental_period] groups"""
+    Payment.recompute_balances([tuple(group) for group in groups])
+
+
+@register('payments.generate_charges')
+def generate_charges(period=None):
+    """Bill every active tenancy for period (YYYY-MM, default the current month)"""
+    Charge.generate(period or date.today().strftime('%Y-%m'))
+
+
+@register('payments.import_payments', max_attempts=1)
+def import_payments(path, file_format=None):
+    """Import a statement file; not retried, as a failed import is rolled back and needs a look"""
+    PaymentImporter().run(read_rows(path, file_format))
+
+
+@register('payments.generate_receipts', priority=-10)
+def generate_receipts(period, file_format='pdf', output=None):
+    call_command('generate_receipts', period=period, format=file_format, workers=1, output=output)
+
+
+@register('payments.rebuild_balance_snapshots', priority=-10)
+def rebuild_balance_snapshots():
+    BalanceSnapshot.rebuild()
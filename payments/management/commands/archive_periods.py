@@ -0,0 +1,27 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from payments.models import ArchivedPayment, Payment, period_start_for
+
+
+class Command(BaseCommand):
+    help = 'Move the payments of fully paid rental periods before a given period into the archive table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--before', required=True,
+                            help='Rental period, YYYY-MM: periods before this one are archived')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Payments moved per transaction')
+
+    def handle(self, *args, **options):
+        before = period_start_for(options['before'])
+        if before is None:
+            raise CommandError('--before must be in YYYY-MM format')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        started = time.monotonic()
+        archived = ArchivedPayment.archive_periods(before, batch_size=options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {archived} payments from periods before {options["before"]} '
+            f'in {time.monotonic() - started:.1f}s ({Payment.objects.count()} payments remain)'
+        ))
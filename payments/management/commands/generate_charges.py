@@ -0,0 +1,29 @@
+import re
+import time
+from django.core.management.base import BaseCommand, CommandError
+from payments.models import PERIOD_PATTERN, Charge
+
+
+class Command(BaseCommand):
+    help = 'Create the rent charge of every active tenancy for a rental period (safe to run again)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--period', required=True, help='Rental period, YYYY-MM')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Charges written per bulk insert')
+
+    def handle(self, *args, **options):
+        period = options['period']
+        if not re.fullmatch(PERIOD_PATTERN, period):
+            raise CommandError('--period must be in YYYY-MM format')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        started = time.monotonic()
+        created = Charge.generate(period, batch_size=options['batch_size'])
+        stats = Charge.get_balance_statistics(Charge.objects.filter(rental_period=period))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {created} charges for {period} in {time.monotonic() - started:.1f}s '
+            f'({stats["paid_count"] + stats["partial_count"] + stats["unpaid_count"]} in total, '
+            f'UGX {stats["total_outstanding"]:,.0f} outstanding)'
+        ))
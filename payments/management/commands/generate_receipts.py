@@ -0,0 +1,56 @@
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from payments.models import PERIOD_PATTERN, ArchivedPayment, Payment, period_start_for
+from payments.receipts import merge_receipts, render_receipts
+
+
+class Command(BaseCommand):
+    help = 'Render the receipts of every payment in a rental period into one HTML or PDF file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--period', required=True, help='Rental period, YYYY-MM')
+        parser.add_argument('--format', choices=['pdf', 'html'], default='pdf')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Worker processes (1 renders in this process)')
+        parser.add_argument('--batch-size', type=int, default=50, help='Receipts rendered per worker task')
+        parser.add_argument('-o', '--output', help='Output file (default: receipts-<period>.<format>)')
+
+    def handle(self, *args, **options):
+        period = options['period']
+        if not re.fullmatch(PERIOD_PATTERN, period):
+            raise CommandError('--period must be in YYYY-MM format')
+        if options['workers'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--workers and --batch-size must be at least 1')
+
+        file_format = options['format']
+        output = options['output'] or f'receipts-{period}.{file_format}'
+
+        # Archived payments keep their ids, so both tables can be merged by (payment_date, id)
+        period_start = period_start_for(period)
+        payment_keys = Payment.objects.filter(period_start=period_start).values_list('payment_date', 'id').union(
+            ArchivedPayment.objects.filter(period_start=period_start).values_list('payment_date', 'id'), all=True
+        ).order_by('payment_date', 'id')
+        payment_ids = [payment_id for payment_date, payment_id in payment_keys]
+        if not payment_ids:
+            raise CommandError(f'No payments found for {period}')
+
+        batch_size = options['batch_size']
+        batches = [payment_ids[offset:offset + batch_size] for offset in range(0, len(payment_ids), batch_size)]
+
+        if options['workers'] == 1 or len(batches) == 1:
+            results = [render_receipts(batch, file_format) for batch in batches]
+        else:
+            # Close our connections so forked workers open their own instead of sharing them
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=min(options['workers'], len(batches))) as executor:
+                results = list(executor.map(render_receipts, batches, repeat(file_format)))
+
+        rendered = [receipt for batch in results for receipt in batch]
+        with open(output, 'wb') as handle:
+            handle.write(merge_receipts(rendered, file_format, f'Rental period {period}'))
+
+        self.stdout.write(self.style.SUCCESS(f'Wrote {len(rendered)} receipts for {period} to {output}'))
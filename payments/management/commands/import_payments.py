@@ -0,0 +1,49 @@
+import csv
+from django.core.management.base import BaseCommand, CommandError
+from payments.importers import PaymentImporter, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Import payments from a CSV or JSON Lines statement file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSONL file with tenant, rental, amount, payment_date, '
+                                         'payment_method and rental_period columns')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Input format (default: from file extension)')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Payments written per bulk insert')
+        parser.add_argument('--dry-run', action='store_true', help='Validate every row without saving anything')
+        parser.add_argument('--rejects', help='Write rows that could not be imported to this CSV file')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1')
+
+        rejects_file = open(options['rejects'], 'w', newline='', encoding='utf-8') if options['rejects'] else None
+        try:
+            rejects = None
+            if rejects_file:
+                rejects = csv.DictWriter(rejects_file, fieldnames=['line', 'error', 'row'])
+                rejects.writeheader()
+
+            importer = PaymentImporter(
+                chunk_size=options['chunk_size'],
+                dry_run=options['dry_run'],
+                rejects=rejects,
+                progress=self.report_progress,
+            )
+            try:
+                importer.run(read_rows(options['path'], options['format']))
+            except OSError as e:
+                raise CommandError(f'Could not read {options["path"]}: {e}')
+        finally:
+            if rejects_file:
+                rejects_file.close()
+
+        verb = 'Validated' if options['dry_run'] else 'Imported'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {importer.imported} payments from {importer.processed} rows '
+            f'({importer.rejected} rejected, {len(importer.groups)} rental periods affected)'
+        ))
+
+    def report_progress(self, processed, imported, rejected):
+        self.stdout.write(f'Processed {processed} rows: {imported} imported, {rejected} rejected')
@@ -0,0 +1,16 @@
+import time
+from django.core.management.base import BaseCommand
+from payments.models import BalanceSnapshot, PaymentEvent
+
+
+class Command(BaseCommand):
+    help = 'Drop every balance snapshot and take them again by replaying the whole payment journal'
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        snapshots = BalanceSnapshot.rebuild()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Replayed {PaymentEvent.objects.count()} payment events into {snapshots} snapshots '
+            f'in {time.monotonic() - started:.1f}s'
+        ))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from payments.importers import read_rows
+from payments.reconciliation import DEFAULT_DATE_WINDOW, StatementReconciler
+
+
+class Command(BaseCommand):
+    help = 'Match the lines of a mobile-money or bank statement to recorded payments'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSONL file with reference, amount, date and phone columns')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Input format (default: from file extension)')
+        parser.add_argument('--window', type=int, default=DEFAULT_DATE_WINDOW,
+                            help='Days a statement date may differ from the payment date')
+        parser.add_argument('--dry-run', action='store_true', help='Report the matches without saving them')
+
+    def handle(self, *args, **options):
+        if options['window'] < 0:
+            raise CommandError('--window cannot be negative')
+
+        reconciler = StatementReconciler(date_window=options['window'], dry_run=options['dry_run'])
+        try:
+            reconciliation = reconciler.run(read_rows(options['path'], options['format']), options['path'])
+        except OSError as e:
+            raise CommandError(f'Could not read {options["path"]}: {e}')
+
+        summary = (
+            f'{reconciliation.line_count} lines: {reconciliation.matched_count} matched, '
+            f'{reconciliation.ambiguous_count} ambiguous, {reconciliation.unmatched_count} unmatched, '
+            f'{reconciliation.invalid_count} invalid'
+        )
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'Dry run of {summary}'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Reconciliation {reconciliation.pk} saved with {summary}'))
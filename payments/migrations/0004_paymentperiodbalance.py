@@ -0,0 +1,65 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:50
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_period_balances(apps, schema_editor):
+    Payment = apps.get_model('payments', 'Payment')
+    PaymentPeriodBalance = apps.get_model('payments', 'PaymentPeriodBalance')
+
+    totals = Payment.objects.values(
+        'tenant_id', 'rental_id', 'rental_period', 'rental__monthly_rent_amount'
+    ).annotate(paid=Sum('amount'), count=Count('id')).order_by()
+
+    balances = []
+    for row in totals:
+        total_due = row['rental__monthly_rent_amount']
+        remaining = max(Decimal('0.00'), total_due - row['paid'])
+        if remaining == Decimal('0.00') and row['paid'] > Decimal('0.00'):
+            status = 'PAID'
+        elif row['paid'] > Decimal('0.00'):
+            status = 'PARTIAL'
+        else:
+            status = 'UNPAID'
+        balances.append(PaymentPeriodBalance(
+            tenant_id=row['tenant_id'],
+            rental_id=row['rental_id'],
+            rental_period=row['rental_period'],
+            total_paid=row['paid'],
+            total_due=total_due,
+            payment_count=row['count'],
+            status=status,
+        ))
+    PaymentPeriodBalance.objects.bulk_create(balances, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0003_payment_rental_period'),
+        ('rentals', '0004_remove_rental_tenant'),
+        ('tenants', '0002_remove_tenant_rent_due_date'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentPeriodBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rental_period', models.CharField(blank=True, max_length=20)),
+                ('total_paid', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('total_due', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('payment_count', models.PositiveIntegerField(default=0)),
+                ('status', models.CharField(choices=[('PAID', 'Paid'), ('PARTIAL', 'Partial'), ('UNPAID', 'Unpaid')], default='UNPAID', max_length=10)),
+                ('rental', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='rentals.rental')),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tenants.tenant')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('tenant', 'rental', 'rental_period'), name='unique_payment_period_balance')],
+            },
+        ),
+        migrations.RunPython(backfill_period_balances, migrations.RunPython.noop),
+    ]
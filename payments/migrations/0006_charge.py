@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0005_payment_date_index'),
+        ('rentals', '0004_remove_rental_tenant'),
+        ('tenants', '0003_move_in_date_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Charge',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rental_period', models.CharField(help_text='Format: YYYY-MM (e.g., 2025-10)', max_length=20)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('rental', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='rentals.rental')),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tenants.tenant')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['rental_period'], name='charge_rental_period_idx')],
+                'constraints': [models.UniqueConstraint(fields=('tenant', 'rental', 'rental_period'), name='unique_charge_per_period')],
+            },
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0007_paymentperiodbalance_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Reconciliation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=255)),
+                ('date_window', models.PositiveIntegerField(help_text='Days a statement date may differ from the payment date')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('line_count', models.PositiveIntegerField(default=0)),
+                ('matched_count', models.PositiveIntegerField(default=0)),
+                ('ambiguous_count', models.PositiveIntegerField(default=0)),
+                ('unmatched_count', models.PositiveIntegerField(default=0)),
+                ('invalid_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ReconciliationLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('line_number', models.PositiveIntegerField()),
+                ('reference', models.CharField(blank=True, max_length=100)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10, null=True)),
+                ('transaction_date', models.DateField(null=True)),
+                ('phone_number', models.CharField(blank=True, max_length=15)),
+                ('status', models.CharField(choices=[('MATCHED', 'Matched'), ('AMBIGUOUS', 'Ambiguous'), ('UNMATCHED', 'Unmatched'), ('INVALID', 'Invalid')], max_length=10)),
+                ('candidate_count', models.PositiveIntegerField(default=0)),
+                ('note', models.CharField(blank=True, max_length=255)),
+                ('payment', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reconciliation_lines', to='payments.payment')),
+                ('reconciliation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='payments.reconciliation')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['reconciliation', 'status'], name='reconciliation_line_status_idx')],
+            },
+        ),
+    ]
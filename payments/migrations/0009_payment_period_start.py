@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:15
+
+import re
+from datetime import date
+from django.db import migrations, models
+
+
+def backfill_period_start(apps, schema_editor):
+    """One UPDATE per distinct YYYY-MM period; anything else stays NULL"""
+    Payment = apps.get_model('payments', 'Payment')
+    periods = Payment.objects.order_by().values_list('rental_period', flat=True).distinct()
+    for period in list(periods):
+        if period and re.match(r'^[0-9]{4}-(0[1-9]|1[0-2])$', period):
+            Payment.objects.filter(rental_period=period).update(
+                period_start=date(int(period[:4]), int(period[5:7]), 1)
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0008_reconciliation'),
+        ('rentals', '0004_remove_rental_tenant'),
+        ('tenants', '0003_move_in_date_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='period_start',
+            field=models.DateField(editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_period_start, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['tenant', 'rental', 'rental_period', 'payment_date', 'id'], name='payment_period_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['period_start', 'payment_date', 'id'], name='payment_period_start_idx'),
+        ),
+    ]
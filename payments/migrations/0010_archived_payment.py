@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0009_payment_period_start'),
+        ('rentals', '0004_remove_rental_tenant'),
+        ('tenants', '0003_move_in_date_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedPayment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('payment_id', models.CharField(max_length=20, unique=True)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('amount_due', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('payment_date', models.DateField()),
+                ('payment_method', models.CharField(choices=[('CASH', 'Cash'), ('CARD', 'Card'), ('MOBILE', 'Mobile Money')], max_length=20)),
+                ('rental_period', models.CharField(blank=True, max_length=20)),
+                ('period_start', models.DateField(null=True)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('rental', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_payments', to='rentals.rental')),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_payments', to='tenants.tenant')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='reconciliationline',
+            name='archived_payment',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reconciliation_lines', to='payments.archivedpayment'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedpayment',
+            index=models.Index(fields=['tenant', 'rental', 'rental_period'], name='archived_payment_period_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedpayment',
+            index=models.Index(fields=['period_start', 'payment_date', 'id'], name='archived_period_start_idx'),
+        ),
+    ]
@@ -0,0 +1,97 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:20
+
+import heapq
+import itertools
+import django.db.models.deletion
+import django.utils.timezone
+from datetime import datetime, time
+from django.db import migrations, models
+
+
+def seed_journal(apps, schema_editor):
+    """
+    Start the journal with a CREATED event for every existing payment, archived
+    ones included, recorded at midnight on its payment date, oldest first.
+    Run rebuild_balance_snapshots afterwards to take the snapshots.
+    """
+    PaymentEvent = apps.get_model('payments', 'PaymentEvent')
+    sources = [
+        apps.get_model('payments', model_name).objects.order_by('payment_date', 'payment_id').values(
+            'payment_id', 'tenant_id', 'rental_id', 'rental_period', 'amount', 'payment_date'
+        ).iterator(chunk_size=2000)
+        for model_name in ('Payment', 'ArchivedPayment')
+    ]
+    rows = heapq.merge(*sources, key=lambda row: (row['payment_date'], row['payment_id']))
+
+    timezone = django.utils.timezone.get_default_timezone()
+    while True:
+        batch = list(itertools.islice(rows, 2000))
+        if not batch:
+            break
+        PaymentEvent.objects.bulk_create([
+            PaymentEvent(
+                payment_ref=row['payment_id'], kind='CREATED',
+                tenant_id=row['tenant_id'], rental_id=row['rental_id'], rental_period=row['rental_period'],
+                amount=row['amount'], payment_date=row['payment_date'],
+                amount_delta=row['amount'], count_delta=1,
+                recorded_at=datetime.combine(row['payment_date'], time.min, tzinfo=timezone),
+            )
+            for row in batch
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0010_archived_payment'),
+        ('rentals', '0004_remove_rental_tenant'),
+        ('tenants', '0003_move_in_date_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('payment_ref', models.CharField(help_text='Payment ID of the payment that changed', max_length=20)),
+                ('kind', models.CharField(choices=[('CREATED', 'Created'), ('EDITED', 'Edited'), ('DELETED', 'Deleted')], max_length=10)),
+                ('rental_period', models.CharField(blank=True, max_length=20)),
+                ('amount', models.DecimalField(decimal_places=2, help_text="The payment's amount after the change", max_digits=10)),
+                ('payment_date', models.DateField()),
+                ('amount_delta', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('count_delta', models.SmallIntegerField()),
+                ('recorded_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('rental', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payment_events', to='rentals.rental')),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payment_events', to='tenants.tenant')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='BalanceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recorded_at', models.DateTimeField()),
+                ('total_paid', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('payment_count', models.IntegerField()),
+                ('rental', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_snapshots', to='rentals.rental')),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_snapshots', to='tenants.tenant')),
+                ('last_event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='payments.paymentevent')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='paymentevent',
+            index=models.Index(fields=['tenant', 'rental', 'id'], name='payment_event_pair_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paymentevent',
+            index=models.Index(fields=['payment_ref'], name='payment_event_ref_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='balancesnapshot',
+            index=models.Index(fields=['tenant', 'rental', 'recorded_at'], name='balance_snapshot_time_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='balancesnapshot',
+            constraint=models.UniqueConstraint(fields=('tenant', 'rental', 'last_event'), name='unique_balance_snapshot'),
+        ),
+        migrations.RunPython(seed_journal, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,13 @@
-from django.db import models
-from django.db.models import Sum, Q
+from django.db import models, transaction
+from django.db.models import Sum, Q, Case, When, Value, Count, F, Exists, OuterRef, Subquery, Window
+from django.db.models.functions import Cast, Coalesce, RowNumber, Substr
+from django.utils import timezone
+import calendar
+import re
+from datetime import date
 from decimal import Decimal
+from home.sequences import reserve_block
+from home.stats import bump_stats_version
 
 # Create your models here.
 PAYMENT_METHODS = [
@@ -9,6 +16,293 @@ PAYMENT_METHODS = [
         ("MOBILE", "Mobile Money"),
     ]
 
+PAYMENT_STATUSES = [
+        ("PAID", "Paid"),
+        ("PARTIAL", "Partial"),
+        ("UNPAID", "Unpaid"),
+    ]
+
+
+PERIOD_PATTERN = r'^[0-9]{4}-(0[1-9]|1[0-2])$'
+
+
+def period_start_for(rental_period):
+    """First day of a YYYY-MM rental period, or None if the period is not in that form"""
+    if rental_period and re.match(PERIOD_PATTERN, rental_period):
+        return date(int(rental_period[:4]), int(rental_period[5:7]), 1)
+    return None
+
+
+def compute_payment_status(total_paid, total_due):
+    """
+    Work out the status of a rental period from what has been paid against what is due.
+    """
+    remaining_balance = max(Decimal('0.00'), total_due - total_paid)
+    if remaining_balance == Decimal('0.00') and total_paid > Decimal('0.00'):
+        return 'PAID'
+    elif total_paid > Decimal('0.00'):
+        return 'PARTIAL'
+    return 'UNPAID'
+
+
+class PaymentPeriodBalance(models.Model):
+    """
+    Materialized running totals for one tenant+rental+period combination.
+    Kept up to date incrementally by Payment.save() and Payment.delete() so that
+    payment summaries read a single indexed row instead of aggregating payments.
+    """
+    tenant = models.ForeignKey('tenants.Tenant', on_delete=models.CASCADE)
+    rental = models.ForeignKey('rentals.Rental', on_delete=models.CASCADE)
+    rental_period = models.CharField(max_length=20, blank=True)
+    total_paid = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    total_due = models.DecimalField(max_digits=10, decimal_places=2)
+    payment_count = models.PositiveIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=PAYMENT_STATUSES, default='UNPAID')
+    # Last change to the row, for Last-Modified on the payment info API
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['tenant', 'rental', 'rental_period'],
+                name='unique_payment_period_balance',
+            ),
+        ]
+
+    @property
+    def remaining_balance(self):
+        return max(Decimal('0.00'), self.total_due - self.total_paid)
+
+    @classmethod
+    def apply(cls, tenant_id, rental_id, rental_period, amount, count, total_due):
+        """
+        Add amount and count (both may be negative) to the balance row for this
+        tenant+rental+period. Must be called inside a transaction. A new row is due
+        the period's charge, or total_due if the period has not been billed.
+        Returns the updated row, or None when the period has no payments left.
+        """
+        balance = cls.objects.select_for_update().filter(
+            tenant_id=tenant_id,
+            rental_id=rental_id,
+            rental_period=rental_period
+        ).first()
+
+        if balance is None:
+            if count <= 0:
+                return None
+            charged = Charge.objects.filter(
+                tenant_id=tenant_id, rental_id=rental_id, rental_period=rental_period
+            ).values_list('amount', flat=True).first()
+            balance = cls(
+                tenant_id=tenant_id,
+                rental_id=rental_id,
+                rental_period=rental_period,
+                total_due=total_due if charged is None else charged,
+            )
+
+        balance.total_paid += amount
+        balance.payment_count += count
+
+        if balance.payment_count <= 0:
+            # No payments left for this period, so it reads as UNPAID from the rental amount again
+            if balance.pk:
+                balance.delete()
+            return None
+
+        balance.status = compute_payment_status(balance.total_paid, balance.total_due)
+        balance.save()
+        return balance
+
+    @classmethod
+    def refresh_total_due(cls, rental):
+        """
+        Re-base the balance rows of a rental's unbilled periods on its current
+        monthly rent amount, with the running balances of their payments and
+        their tenants' due dates. Billed periods stay due their charge.
+        """
+        groups = list(cls.objects.filter(rental=rental).exclude(Exists(Charge.objects.filter(
+            tenant_id=OuterRef('tenant_id'), rental_id=OuterRef('rental_id'), rental_period=OuterRef('rental_period')
+        ))).values_list('tenant_id', 'rental_id', 'rental_period'))
+        if groups:
+            # Unbilled periods are due the rent, so recomputing them re-bases them
+            Payment.recompute_balances(groups)
+
+    @classmethod
+    def rebuild(cls):
+        """
+        Recalculate every balance row from the payments and archived payments tables,
+        due the period's charge or, for unbilled periods, the rental's rent.
+        Use after bulk changes that bypass Payment.save() and Payment.delete().
+        """
+        charged = {
+            (tenant_id, rental_id, rental_period): amount
+            for tenant_id, rental_id, rental_period, amount in Charge.objects.values_list(
+                'tenant_id', 'rental_id', 'rental_period', 'amount'
+            ).iterator()
+        }
+        totals = {}
+        for model in (Payment, ArchivedPayment):
+            for row in model.objects.values(
+                'tenant_id', 'rental_id', 'rental_period', 'rental__monthly_rent_amount'
+            ).annotate(
+                paid=Sum('amount'),
+                count=models.Count('id')
+            ).order_by():
+                group = (row['tenant_id'], row['rental_id'], row['rental_period'])
+                paid, count, total_due = totals.get(
+                    group, (Decimal('0.00'), 0, charged.get(group, row['rental__monthly_rent_amount']))
+                )
+                totals[group] = (paid + row['paid'], count + row['count'], total_due)
+
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create([
+                cls(
+                    tenant_id=tenant_id,
+                    rental_id=rental_id,
+                    rental_period=rental_period,
+                    total_paid=paid,
+                    total_due=total_due,
+                    payment_count=count,
+                    status=compute_payment_status(paid, total_due),
+                )
+                for (tenant_id, rental_id, rental_period), (paid, count, total_due) in totals.items()
+            ], batch_size=500)
+        bump_stats_version(Payment)
+
+    def __str__(self):
+        return f"{self.rental_period} balance for tenant {self.tenant_id} on rental {self.rental_id}"
+
+
+class Charge(models.Model):
+    """
+    The rent expected from one tenant for one rental in one rental period.
+    Created in bulk for every active tenancy by Charge.generate() (the
+    generate_charges command), so periods nobody has paid for still show as owed.
+    """
+    tenant = models.ForeignKey('tenants.Tenant', on_delete=models.CASCADE)
+    rental = models.ForeignKey('rentals.Rental', on_delete=models.CASCADE)
+    rental_period = models.CharField(max_length=20, help_text="Format: YYYY-MM (e.g., 2025-10)")
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['tenant', 'rental', 'rental_period'],
+                name='unique_charge_per_period',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['rental_period'], name='charge_rental_period_idx'),
+        ]
+
+    @classmethod
+    def generate(cls, rental_period, batch_size=1000):
+        """
+        Create a charge for every tenancy active in rental_period (moved in on or
+        before the last day of the period), at the rental's monthly rent.
+        Existing charges are left alone, so running it again is harmless.
+        Returns the number of charges actually created.
+        """
+        year, month = (int(part) for part in rental_period.split('-'))
+        period_end = date(year, month, calendar.monthrange(year, month)[1])
+
+        from tenants.models import Tenant
+        # Only tenancies not billed yet, so a re-run reads no rows and inserts nothing
+        tenancies = Tenant.objects.filter(move_in_date__lte=period_end).exclude(Exists(
+            cls.objects.filter(tenant_id=OuterRef('id'), rental_id=OuterRef('rental_id'), rental_period=rental_period)
+        )).values_list('id', 'rental_id', 'rental__monthly_rent_amount').order_by()
+
+        charges = [
+            cls(tenant_id=tenant_id, rental_id=rental_id, rental_period=rental_period, amount=amount)
+            for tenant_id, rental_id, amount in tenancies
+        ]
+        if not charges:
+            return 0
+        with transaction.atomic():
+            # ignore_conflicts covers a concurrent run billing the same tenancies, so
+            # bulk_create cannot say how many rows it inserted: count them instead
+            before = cls.objects.filter(rental_period=rental_period).count()
+            cls.objects.bulk_create(charges, batch_size=batch_size, ignore_conflicts=True)
+            created = cls.objects.filter(rental_period=rental_period).count() - before
+        if created:
+            bump_stats_version(cls)
+        return created
+
+    @classmethod
+    def charged_amounts(cls, groups):
+        """The charge of each billed (tenant_id, rental_id, rental_period) group in groups"""
+        groups = set(groups)
+        charges = cls.objects.filter(
+            tenant_id__in={group[0] for group in groups},
+            rental_id__in={group[1] for group in groups},
+            rental_period__in={group[2] for group in groups},
+        ).values_list('tenant_id', 'rental_id', 'rental_period', 'amount')
+        return {
+            (tenant_id, rental_id, rental_period): amount
+            for tenant_id, rental_id, rental_period, amount in charges
+            if (tenant_id, rental_id, rental_period) in groups
+        }
+
+    @classmethod
+    def annotate_balances(cls, charges):
+        """
+        Annotate charges with total_paid (from the period ledger) and balance
+        (amount still owed), computed in the same SQL statement.
+        """
+        money = models.DecimalField(max_digits=12, decimal_places=2)
+        paid = PaymentPeriodBalance.objects.filter(
+            tenant_id=OuterRef('tenant_id'),
+            rental_id=OuterRef('rental_id'),
+            rental_period=OuterRef('rental_period')
+        ).values('total_paid')[:1]
+
+        return charges.annotate(
+            total_paid=Coalesce(Subquery(paid), Value(Decimal('0.00')), output_field=money),
+        ).annotate(
+            balance=Case(
+                When(total_paid__gte=F('amount'), then=Value(Decimal('0.00'))),
+                default=F('amount') - F('total_paid'),
+                output_field=money
+            )
+        )
+
+    @classmethod
+    def get_balance_statistics(cls, charges):
+        """
+        Totals for a set of charges in one grouped query: total_charged, total_paid,
+        total_outstanding, and how many charges are paid, partial or unpaid.
+        """
+        totals = cls.annotate_balances(charges).aggregate(
+            charged=Sum('amount'),
+            paid=Sum('total_paid'),
+            outstanding=Sum('balance'),
+            charge_count=Count('id'),
+            paid_count=Count('id', filter=Q(balance=0, total_paid__gt=0)),
+            unpaid_count=Count('id', filter=Q(total_paid=0)),
+        )
+        return {
+            'total_charged': totals['charged'] or Decimal('0.00'),
+            'total_paid': totals['paid'] or Decimal('0.00'),
+            'total_outstanding': totals['outstanding'] or Decimal('0.00'),
+            'paid_count': totals['paid_count'],
+            'partial_count': totals['charge_count'] - totals['paid_count'] - totals['unpaid_count'],
+            'unpaid_count': totals['unpaid_count'],
+        }
+
+    @classmethod
+    def without_payments(cls, charges):
+        """Charges for periods in which the tenant has made no payment at all"""
+        return charges.filter(~Exists(PaymentPeriodBalance.objects.filter(
+            tenant_id=OuterRef('tenant_id'),
+            rental_id=OuterRef('rental_id'),
+            rental_period=OuterRef('rental_period')
+        )))
+
+    def __str__(self):
+        return f"{self.rental_period} charge of {self.amount} for tenant {self.tenant_id} on rental {self.rental_id}"
+
 
 class Payment(models.Model):
     payment_id = models.CharField(max_length=20, unique=True)
@@ -19,26 +313,102 @@ class Payment(models.Model):
     payment_date = models.DateField()
     payment_method = models.CharField(max_length=20, choices=PAYMENT_METHODS)
     rental_period = models.CharField(max_length=20, help_text="Format: YYYY-MM (e.g., 2025-10)", blank=True)
+    # First day of rental_period, for date range queries; None for periods not in YYYY-MM form
+    period_start = models.DateField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Ordering key of the payment list (keyset pagination)
+            models.Index(fields=['payment_date', 'id'], name='payment_date_id_idx'),
+            # Summaries and running balances: one tenant+rental+period in payment order
+            models.Index(fields=['tenant', 'rental', 'rental_period', 'payment_date', 'id'], name='payment_period_idx'),
+            # Everything paid for a period (receipts, period reports) in payment order
+            models.Index(fields=['period_start', 'payment_date', 'id'], name='payment_period_start_idx'),
+        ]
+
+    @classmethod
+    def reserve_payment_ids(cls, count):
+        """
+        Reserve count consecutive payment IDs (PAY-0001, PAY-0002, ...) from the shared sequence.
+        Use this to pre-assign IDs when bulk creating payments.
+        """
+        def last_payment_number():
+            return cls.objects.filter(payment_id__regex=r'^PAY-[0-9]+$').aggregate(
+                last=models.Max(Cast(Substr('payment_id', 5), models.IntegerField()))
+            )['last']
+
+        return [f'PAY-{number:04d}' for number in reserve_block('payment', count, last_payment_number)]
 
     def save(self, *args, **kwargs):
         if not self.payment_id:
             # Generate payment ID
-            last_payment = Payment.objects.order_by('-id').first()
-            if last_payment:
-                last_id = int(last_payment.payment_id.replace('PAY-', '')) if last_payment.payment_id.startswith('PAY-') else 0
-                new_id = last_id + 1
-            else:
-                new_id = 1
-            self.payment_id = f'PAY-{new_id:04d}'
+            self.payment_id = Payment.reserve_payment_ids(1)[0]
         
         # Auto-set rental period if not provided
         if not self.rental_period and self.payment_date:
             self.rental_period = self.payment_date.strftime('%Y-%m')
+        self.period_start = period_start_for(self.rental_period)
         
-        super().save(*args, **kwargs)
-        
-        # After saving, update all related payments for this tenant+rental+period
-        self.update_payment_balances()
+        with transaction.atomic():
+            # Remember what this payment contributed before the edit, if anything
+            previous = None
+            if self.pk:
+                previous = Payment.objects.filter(pk=self.pk).values(
+                    'tenant_id', 'rental_id', 'rental_period', 'amount', 'payment_date'
+                ).first()
+
+            super().save(*args, **kwargs)
+
+            # Move this payment's contribution in the period balance ledger
+            amount = Decimal(str(self.amount))
+            total_due = self.rental.monthly_rent_amount
+            group = (self.tenant_id, self.rental_id, self.rental_period)
+            start = (self.payment_date, self.pk)
+            if previous and group == (previous['tenant_id'], previous['rental_id'], previous['rental_period']):
+                balance = PaymentPeriodBalance.apply(*group, amount - previous['amount'], 0, total_due)
+                # Recompute from wherever the payment sits earliest, before or after the edit
+                start = min(start, (previous['payment_date'], self.pk))
+                events = [PaymentEvent.for_change('EDITED', self, group, amount - previous['amount'], 0)]
+            else:
+                events = []
+                if previous:
+                    # The payment moved to another tenant, rental or period
+                    old_group = (previous['tenant_id'], previous['rental_id'], previous['rental_period'])
+                    old_balance = PaymentPeriodBalance.apply(*old_group, -previous['amount'], -1, total_due)
+                    Payment.recompute_running_balances(
+                        *old_group, start=(previous['payment_date'], self.pk), balance=old_balance
+                    )
+                    events.append(PaymentEvent.for_change('EDITED', self, old_group, -previous['amount'], -1))
+                balance = PaymentPeriodBalance.apply(*group, amount, 1, total_due)
+                events.append(PaymentEvent.for_change('EDITED' if previous else 'CREATED', self, group, amount, 1))
+            
+            # After saving, update the related payments for this tenant+rental+period
+            self.update_payment_balances(start=start, balance=balance)
+            PaymentEvent.record(events)
+
+            # Paying a period off, or no longer, moves the tenant's next due date
+            from tenants.due_dates import roll_due_dates
+            roll_due_dates({self.tenant_id, previous['tenant_id'] if previous else self.tenant_id})
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            previous = Payment.objects.filter(pk=self.pk).values(
+                'tenant_id', 'rental_id', 'rental_period', 'amount', 'payment_date'
+            ).first()
+            deleted_pk = self.pk
+            result = super().delete(*args, **kwargs)
+            if previous:
+                group = (previous['tenant_id'], previous['rental_id'], previous['rental_period'])
+                balance = PaymentPeriodBalance.apply(*group, -previous['amount'], -1, Decimal('0.00'))
+                # Payments after the deleted one now carry a larger remaining balance
+                Payment.recompute_running_balances(
+                    *group, start=(previous['payment_date'], deleted_pk), balance=balance
+                )
+
+                from tenants.due_dates import roll_due_dates
+                roll_due_dates([previous['tenant_id']])
+                PaymentEvent.record([PaymentEvent.for_change('DELETED', self, group, -previous['amount'], -1)])
+        return result
 
     @classmethod
     def get_payment_summary_for_tenant_rental(cls, tenant, rental, rental_period=None):
@@ -46,79 +416,335 @@ class Payment(models.Model):
         Get payment summary for a specific tenant and rental combination.
         If rental_period is provided, filter by that period as well.
         Returns total paid, total due, and remaining balance.
+        Reads the PaymentPeriodBalance ledger rather than aggregating payments.
         """
-        payments_filter = Q(tenant=tenant, rental=rental)
+        balances = PaymentPeriodBalance.objects.filter(tenant=tenant, rental=rental)
         if rental_period:
-            payments_filter &= Q(rental_period=rental_period)
-        
-        payments = cls.objects.filter(payments_filter)
+            balance = balances.filter(rental_period=rental_period).first()
+            if balance is not None:
+                return {
+                    'total_paid': balance.total_paid,
+                    'total_due': balance.total_due,
+                    'remaining_balance': balance.remaining_balance,
+                    'payment_count': balance.payment_count,
+                    'status': balance.status
+                }
+            totals = {'paid': None, 'count': None}
+        else:
+            totals = balances.aggregate(
+                paid=Sum('total_paid'),
+                due=Sum('total_due'),
+                count=Sum('payment_count')
+            )
         
-        if not payments.exists():
+        if not totals['count']:
+            # Nothing paid: the period's charge is owed, or the rental amount if it has not been billed
+            total_due = rental.monthly_rent_amount
+            if rental_period:
+                charge = Charge.objects.filter(
+                    tenant=tenant, rental=rental, rental_period=rental_period
+                ).values_list('amount', flat=True).first()
+                if charge is not None:
+                    total_due = charge
             return {
                 'total_paid': Decimal('0.00'),
-                'total_due': rental.monthly_rent_amount,  # Use rental amount as base
-                'remaining_balance': rental.monthly_rent_amount,
+                'total_due': total_due,
+                'remaining_balance': total_due,
                 'payment_count': 0,
                 'status': 'UNPAID'
             }
         
-        # Calculate total amount paid
-        total_paid = payments.aggregate(
-            total=Sum('amount')
-        )['total'] or Decimal('0.00')
-        
-        # Use rental monthly amount as the total due for this period
-        total_due = rental.monthly_rent_amount
-        
-        # Calculate remaining balance
-        remaining_balance = max(Decimal('0.00'), total_due - total_paid)
-        
-        # Determine status
-        if remaining_balance == Decimal('0.00') and total_paid > Decimal('0.00'):
-            status = 'PAID'
-        elif total_paid > Decimal('0.00'):
-            status = 'PARTIAL'
-        else:
-            status = 'UNPAID'
+        # What the ledger says the paid periods are due
+        total_paid = totals['paid']
+        total_due = totals['due']
         
         return {
             'total_paid': total_paid,
             'total_due': total_due,
-            'remaining_balance': remaining_balance,
-            'payment_count': payments.count(),
-            'status': status
+            'remaining_balance': max(Decimal('0.00'), total_due - total_paid),
+            'payment_count': totals['count'],
+            'status': compute_payment_status(total_paid, total_due)
         }
 
-    def update_payment_balances(self):
+    @classmethod
+    def get_payment_summaries(cls, keys):
         """
-        Update the amount_due field for all payments related to this tenant+rental+period
-        Each payment should show the remaining balance AFTER that specific payment.
+        Payment summaries for many (tenant_id, rental_id, rental_period) keys at once,
+        in the form returned by get_payment_summary_for_tenant_rental plus monthly_rent
+        and updated_at (the ledger row's last change, or None when nothing has been paid).
+        The ledger rows, the charges of unpaid periods and the rents are each read in a
+        single query. Keys whose rental does not exist are left out.
         """
-        # Get all payments for this tenant+rental+period combination
-        related_payments = Payment.objects.filter(
-            tenant=self.tenant, 
-            rental=self.rental,
-            rental_period=self.rental_period
-        ).order_by('payment_date', 'id')
-        
-        if not related_payments.exists():
-            return
-        
-        # Get the original total amount due (should be the rental amount)
-        # Use the rental's monthly rent as the base amount due
-        original_amount_due = self.rental.monthly_rent_amount
-        
-        # Calculate running balances for each payment
-        running_total_paid = Decimal('0.00')
+        keys = set(keys)
+        if not keys:
+            return {}
+
+        from rentals.models import Rental
+
+        def matching(key_set):
+            condition = Q(pk__in=[])
+            for tenant_id, rental_id, rental_period in key_set:
+                condition |= Q(tenant_id=tenant_id, rental_id=rental_id, rental_period=rental_period)
+            return condition
+
+        rents = dict(Rental.objects.filter(
+            id__in={rental_id for tenant_id, rental_id, rental_period in keys}
+        ).values_list('id', 'monthly_rent_amount'))
+        keys = {key for key in keys if key[1] in rents}
+
+        summaries = {}
+        for balance in PaymentPeriodBalance.objects.filter(matching(keys)):
+            key = (balance.tenant_id, balance.rental_id, balance.rental_period)
+            summaries[key] = {
+                'total_paid': balance.total_paid,
+                'total_due': balance.total_due,
+                'remaining_balance': balance.remaining_balance,
+                'payment_count': balance.payment_count,
+                'status': balance.status,
+                'monthly_rent': rents[balance.rental_id],
+                'updated_at': balance.updated_at,
+            }
+
+        # Nothing paid: the period's charge is owed, or the rental amount if it has not been billed
+        unpaid = keys - summaries.keys()
+        charges = {}
+        if unpaid:
+            charges = {
+                (tenant_id, rental_id, rental_period): amount
+                for tenant_id, rental_id, rental_period, amount in Charge.objects.filter(matching(unpaid)).values_list(
+                    'tenant_id', 'rental_id', 'rental_period', 'amount'
+                )
+            }
+        for key in unpaid:
+            total_due = charges.get(key, rents[key[1]])
+            summaries[key] = {
+                'total_paid': Decimal('0.00'),
+                'total_due': total_due,
+                'remaining_balance': total_due,
+                'payment_count': 0,
+                'status': 'UNPAID',
+                'monthly_rent': rents[key[1]],
+                'updated_at': None,
+            }
+        return summaries
+
+    @classmethod
+    def annotate_period_summary(cls, payments):
+        """
+        Annotate payments with the status, total paid and remaining balance of their
+        tenant+rental+period, read from the balance ledger in the same SQL statement.
+        The annotations are period_status, period_total_paid and period_remaining_balance.
+        """
+        balances = PaymentPeriodBalance.objects.filter(
+            tenant_id=OuterRef('tenant_id'),
+            rental_id=OuterRef('rental_id'),
+            rental_period=OuterRef('rental_period')
+        )
+        money = models.DecimalField(max_digits=12, decimal_places=2)
+
+        remaining = balances.annotate(
+            remaining=Case(
+                When(total_paid__gte=F('total_due'), then=Value(Decimal('0.00'))),
+                default=F('total_due') - F('total_paid'),
+                output_field=money
+            )
+        ).values('remaining')[:1]
+
+        return payments.annotate(
+            period_status=Coalesce(
+                Subquery(balances.values('status')[:1]), Value('UNPAID')
+            ),
+            period_total_paid=Coalesce(
+                Subquery(balances.values('total_paid')[:1]), Value(Decimal('0.00')), output_field=money
+            ),
+            period_remaining_balance=Coalesce(
+                Subquery(remaining), F('rental__monthly_rent_amount'), output_field=money
+            )
+        )
+
+    @classmethod
+    def get_latest_period_statistics(cls, payments):
+        """
+        Summarize the latest payment of every tenant+rental+period combination in payments.
+        Returns the outstanding total (latest amount_due per combination) and how many
+        combinations are paid, partial or unpaid, all computed in a single query.
+        """
+        period_status = PaymentPeriodBalance.objects.filter(
+            tenant_id=OuterRef('tenant_id'),
+            rental_id=OuterRef('rental_id'),
+            rental_period=OuterRef('rental_period')
+        ).values('status')[:1]
+
+        latest_payments = payments.order_by().annotate(
+            period_row=Window(
+                RowNumber(),
+                partition_by=[F('tenant_id'), F('rental_id'), F('rental_period')],
+                order_by=[F('payment_date').desc(), F('id').desc()]
+            ),
+            period_status=Subquery(period_status)
+        ).filter(period_row=1)
+
+        totals = latest_payments.aggregate(
+            total_outstanding=Sum('amount_due', filter=Q(amount_due__gt=0)),
+            combinations=Count('id'),
+            paid_count=Count('id', filter=Q(period_status='PAID')),
+            partial_count=Count('id', filter=Q(period_status='PARTIAL'))
+        )
+
+        return {
+            'total_outstanding': totals['total_outstanding'] or 0,
+            'paid_count': totals['paid_count'],
+            'partial_count': totals['partial_count'],
+            'unpaid_count': totals['combinations'] - totals['paid_count'] - totals['partial_count'],
+        }
+
+    @classmethod
+    def recompute_running_balances(cls, tenant_id, rental_id, rental_period, start=None, balance=None):
+        """
+        Rewrite amount_due for the payments of one tenant+rental+period, starting at the
+        (payment_date, id) position start. Payments before start keep their balances; the
+        amount paid before start is taken from the period ledger, so the cost depends only
+        on how many payments come after start. Changed rows are written with one bulk_update.
+        """
+        if balance is None:
+            balance = PaymentPeriodBalance.objects.filter(
+                tenant_id=tenant_id,
+                rental_id=rental_id,
+                rental_period=rental_period
+            ).first()
+        if balance is None:
+            return 0
+
+        later_payments = cls.objects.filter(
+            tenant_id=tenant_id,
+            rental_id=rental_id,
+            rental_period=rental_period
+        )
+        if start:
+            start_date, start_id = start
+            later_payments = later_payments.filter(
+                Q(payment_date__gt=start_date) | Q(payment_date=start_date, id__gte=start_id)
+            )
+        later_payments = list(later_payments.order_by('payment_date', 'id').only('id', 'amount', 'amount_due'))
+
+        # Everything not in later_payments was paid before start
+        running_total_paid = balance.total_paid - sum((payment.amount for payment in later_payments), Decimal('0.00'))
         
-        for payment in related_payments:
+        changed = []
+        for payment in later_payments:
             running_total_paid += payment.amount
-            remaining_balance = max(Decimal('0.00'), original_amount_due - running_total_paid)
-            
-            # Update this payment's amount_due to show remaining balance after this payment
-            Payment.objects.filter(id=payment.id).update(
-                amount_due=remaining_balance
-            )
+            remaining_balance = max(Decimal('0.00'), balance.total_due - running_total_paid)
+            if payment.amount_due != remaining_balance:
+                payment.amount_due = remaining_balance
+                changed.append(payment)
+        
+        if changed:
+            cls.objects.bulk_update(changed, ['amount_due'])
+        return len(changed)
+
+    @classmethod
+    def recompute_balances(cls, groups, batch_size=200):
+        """
+        Recompute the period ledger and every running balance for many
+        (tenant_id, rental_id, rental_period) groups in one pass per batch.
+        Use after bulk changes that bypass Payment.save() and Payment.delete().
+        """
+        groups = list(set(groups))
+        for offset in range(0, len(groups), batch_size):
+            batch = set(groups[offset:offset + batch_size])
+            cls._recompute_balance_batch(batch)
+        bump_stats_version(cls)
+
+        from tenants.due_dates import roll_due_dates
+        roll_due_dates({group[0] for group in groups})
+
+    @classmethod
+    def _recompute_balance_batch(cls, groups):
+        tenant_ids = {group[0] for group in groups}
+        rental_ids = {group[1] for group in groups}
+        periods = {group[2] for group in groups}
+
+        payments = cls.objects.filter(
+            tenant_id__in=tenant_ids,
+            rental_id__in=rental_ids,
+            rental_period__in=periods
+        ).order_by('tenant_id', 'rental_id', 'rental_period', 'payment_date', 'id').values_list(
+            'id', 'tenant_id', 'rental_id', 'rental_period', 'amount', 'amount_due',
+            'rental__monthly_rent_amount'
+        )
+
+        charged = Charge.charged_amounts(groups)
+        # Archived payments of these periods count towards them but are never rewritten
+        totals = {}
+        for row in ArchivedPayment.objects.filter(
+            tenant_id__in=tenant_ids,
+            rental_id__in=rental_ids,
+            rental_period__in=periods
+        ).values('tenant_id', 'rental_id', 'rental_period', 'rental__monthly_rent_amount').annotate(
+            paid=Sum('amount'),
+            count=Count('id')
+        ).order_by():
+            group = (row['tenant_id'], row['rental_id'], row['rental_period'])
+            if group in groups:
+                totals[group] = (row['paid'], row['count'], charged.get(group, row['rental__monthly_rent_amount']))
+
+        changed = []
+        for payment_id, tenant_id, rental_id, rental_period, amount, amount_due, rent in payments.iterator():
+            group = (tenant_id, rental_id, rental_period)
+            if group not in groups:
+                continue
+            paid, count, total_due = totals.get(group, (Decimal('0.00'), 0, charged.get(group, rent)))
+            paid += amount
+            totals[group] = (paid, count + 1, total_due)
+
+            remaining_balance = max(Decimal('0.00'), total_due - paid)
+            if amount_due != remaining_balance:
+                changed.append(cls(id=payment_id, amount_due=remaining_balance))
+
+        with transaction.atomic():
+            if changed:
+                cls.objects.bulk_update(changed, ['amount_due'], batch_size=500)
+
+            # Groups with no payments left lose their ledger row
+            stale_ids = [
+                balance_id
+                for balance_id, tenant_id, rental_id, rental_period in PaymentPeriodBalance.objects.filter(
+                    tenant_id__in=tenant_ids,
+                    rental_id__in=rental_ids,
+                    rental_period__in=periods
+                ).values_list('id', 'tenant_id', 'rental_id', 'rental_period')
+                if (tenant_id, rental_id, rental_period) in groups
+                and (tenant_id, rental_id, rental_period) not in totals
+            ]
+            if stale_ids:
+                PaymentPeriodBalance.objects.filter(id__in=stale_ids).delete()
+
+            PaymentPeriodBalance.objects.bulk_create([
+                PaymentPeriodBalance(
+                    tenant_id=tenant_id,
+                    rental_id=rental_id,
+                    rental_period=rental_period,
+                    total_paid=paid,
+                    total_due=total_due,
+                    payment_count=count,
+                    status=compute_payment_status(paid, total_due),
+                )
+                for (tenant_id, rental_id, rental_period), (paid, count, total_due) in totals.items()
+            ], batch_size=500, update_conflicts=True,
+                unique_fields=['tenant', 'rental', 'rental_period'],
+                update_fields=['total_paid', 'total_due', 'payment_count', 'status', 'updated_at'])
+
+    def update_payment_balances(self, start=None, balance=None):
+        """
+        Update the amount_due field for payments related to this tenant+rental+period.
+        Each payment should show the remaining balance AFTER that specific payment.
+        Only payments from start (by default this payment's position) onward are rewritten.
+        """
+        Payment.recompute_running_balances(
+            self.tenant_id, self.rental_id, self.rental_period,
+            start=start or (self.payment_date, self.pk),
+            balance=balance
+        )
 
     @property
     def payment_status(self):
@@ -126,7 +752,7 @@ class Payment(models.Model):
         Calculate the payment status based on amount paid vs amount due for this rental period.
         """
         summary = self.get_payment_summary_for_tenant_rental(
-            self.tenant, self.rental, self.rental_period
+            self.tenant_id, self.rental, self.rental_period
         )
         return summary['status']
 
@@ -136,7 +762,7 @@ class Payment(models.Model):
         Get the remaining balance for this tenant+rental+period combination.
         """
         summary = self.get_payment_summary_for_tenant_rental(
-            self.tenant, self.rental, self.rental_period
+            self.tenant_id, self.rental, self.rental_period
         )
         return summary['remaining_balance']
 
@@ -146,9 +772,324 @@ class Payment(models.Model):
         Get the total amount paid by this tenant for this rental in this period.
         """
         summary = self.get_payment_summary_for_tenant_rental(
-            self.tenant, self.rental, self.rental_period
+            self.tenant_id, self.rental, self.rental_period
         )
         return summary['total_paid']
 
     def __str__(self):
-        return f"Payment {self.tenant} of {self.amount}"
\ No newline at end of file
+        return f"Payment {self.tenant} of {self.amount}"
+
+
+class ArchivedPayment(models.Model):
+    """
+    A payment from a fully paid rental period, moved out of the payments table
+    by archive_periods() so the table the day-to-day screens read stays small.
+    Archived payments keep their database id and payment ID, and the period
+    ledger rows are left in place, so summaries and statuses read the same.
+    """
+    payment_id = models.CharField(max_length=20, unique=True)
+    rental = models.ForeignKey('rentals.Rental', on_delete=models.CASCADE, related_name='archived_payments')
+    tenant = models.ForeignKey('tenants.Tenant', on_delete=models.CASCADE, related_name='archived_payments')
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    amount_due = models.DecimalField(max_digits=10, decimal_places=2)
+    payment_date = models.DateField()
+    payment_method = models.CharField(max_length=20, choices=PAYMENT_METHODS)
+    rental_period = models.CharField(max_length=20, blank=True)
+    period_start = models.DateField(null=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    # Columns copied from Payment
+    PAYMENT_FIELDS = [
+        'id', 'payment_id', 'rental_id', 'tenant_id', 'amount', 'amount_due',
+        'payment_date', 'payment_method', 'rental_period', 'period_start',
+    ]
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['tenant', 'rental', 'rental_period'], name='archived_payment_period_idx'),
+            models.Index(fields=['period_start', 'payment_date', 'id'], name='archived_period_start_idx'),
+        ]
+
+    @classmethod
+    def archive_periods(cls, before, batch_size=1000):
+        """
+        Move the payments of every fully paid rental period that starts before the
+        date before into the archive, batch_size payments per transaction, and
+        return how many were moved. Periods with anything still owing stay put.
+        """
+        settled = PaymentPeriodBalance.objects.filter(
+            tenant_id=OuterRef('tenant_id'),
+            rental_id=OuterRef('rental_id'),
+            rental_period=OuterRef('rental_period'),
+            status='PAID'
+        )
+        candidates = Payment.objects.filter(period_start__lt=before).filter(Exists(settled))
+
+        archived = 0
+        while True:
+            with transaction.atomic():
+                rows = list(candidates.order_by('id').values(*cls.PAYMENT_FIELDS)[:batch_size])
+                if not rows:
+                    break
+                ids = [row['id'] for row in rows]
+                cls.objects.bulk_create([cls(**row) for row in rows])
+                # Reconciliation lines follow their payment into the archive
+                ReconciliationLine.objects.filter(payment_id__in=ids).update(
+                    payment=None, archived_payment_id=F('payment_id')
+                )
+                # A queryset delete skips Payment.delete(), so the ledger keeps these payments' totals
+                Payment.objects.filter(id__in=ids).delete()
+            archived += len(rows)
+
+        if archived:
+            bump_stats_version(Payment)
+        return archived
+
+    @classmethod
+    def find(cls, payment_id, queryset=None):
+        """
+        The payment with this payment ID from queryset (default: all payments), or
+        else from the archive with its tenant, rental and property loaded.
+        Raises Payment.DoesNotExist if it is in neither.
+        """
+        queryset = queryset if queryset is not None else Payment.objects.all()
+        payment = queryset.filter(payment_id=payment_id).first()
+        if payment is None:
+            payment = cls.objects.select_related('tenant', 'rental__property').filter(payment_id=payment_id).first()
+        if payment is None:
+            raise Payment.DoesNotExist(f'No payment or archived payment {payment_id}')
+        return payment
+
+    def __str__(self):
+        return f"Archived payment {self.payment_id} of {self.amount}"
+
+RECONCILIATION_STATUSES = [
+        ("MATCHED", "Matched"),
+        ("AMBIGUOUS", "Ambiguous"),
+        ("UNMATCHED", "Unmatched"),
+        ("INVALID", "Invalid"),
+    ]
+
+
+class Reconciliation(models.Model):
+    """
+    One run of matching a mobile-money or bank statement against recorded
+    payments (see payments.reconciliation and the reconcile_statement command).
+    """
+    source = models.CharField(max_length=255)
+    date_window = models.PositiveIntegerField(help_text="Days a statement date may differ from the payment date")
+    created_at = models.DateTimeField(auto_now_add=True)
+    line_count = models.PositiveIntegerField(default=0)
+    matched_count = models.PositiveIntegerField(default=0)
+    ambiguous_count = models.PositiveIntegerField(default=0)
+    unmatched_count = models.PositiveIntegerField(default=0)
+    invalid_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Reconciliation of {self.source} on {self.created_at:%d/%m/%Y}"
+
+
+class ReconciliationLine(models.Model):
+    """A statement line and the payment it was matched to, if any"""
+    reconciliation = models.ForeignKey(Reconciliation, on_delete=models.CASCADE, related_name='lines')
+    line_number = models.PositiveIntegerField()
+    reference = models.CharField(max_length=100, blank=True)
+    amount = models.DecimalField(max_digits=10, decimal_places=2, null=True)
+    transaction_date = models.DateField(null=True)
+    phone_number = models.CharField(max_length=15, blank=True)
+    status = models.CharField(max_length=10, choices=RECONCILIATION_STATUSES)
+    payment = models.ForeignKey(Payment, on_delete=models.SET_NULL, null=True, related_name='reconciliation_lines')
+    # Set instead of payment once the matched payment has been archived
+    archived_payment = models.ForeignKey(
+        ArchivedPayment, on_delete=models.SET_NULL, null=True, related_name='reconciliation_lines'
+    )
+    # Payments that fitted equally well, for ambiguous lines
+    candidate_count = models.PositiveIntegerField(default=0)
+    note = models.CharField(max_length=255, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['reconciliation', 'status'], name='reconciliation_line_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"Line {self.line_number} of reconciliation {self.reconciliation_id}: {self.status}"
+
+
+PAYMENT_EVENT_KINDS = [
+        ("CREATED", "Created"),
+        ("EDITED", "Edited"),
+        ("DELETED", "Deleted"),
+    ]
+
+# A tenant+rental gets a new balance snapshot every this many payment events
+SNAPSHOT_INTERVAL = 50
+
+
+class PaymentEvent(models.Model):
+    """
+    Append-only journal of changes to payments, written by Payment.save(),
+    Payment.delete() and the importer. Each row records how one change moved
+    the amount paid and the number of payments of a tenant+rental+period; an
+    edit that moves a payment to another tenant, rental or period is recorded
+    as two EDITED rows, one taking it out of the old period and one adding it
+    to the new. Rows are never updated or deleted.
+    """
+    payment_ref = models.CharField(max_length=20, help_text="Payment ID of the payment that changed")
+    kind = models.CharField(max_length=10, choices=PAYMENT_EVENT_KINDS)
+    tenant = models.ForeignKey('tenants.Tenant', on_delete=models.CASCADE, related_name='payment_events')
+    rental = models.ForeignKey('rentals.Rental', on_delete=models.CASCADE, related_name='payment_events')
+    rental_period = models.CharField(max_length=20, blank=True)
+    amount = models.DecimalField(max_digits=10, decimal_places=2, help_text="The payment's amount after the change")
+    payment_date = models.DateField()
+    amount_delta = models.DecimalField(max_digits=12, decimal_places=2)
+    count_delta = models.SmallIntegerField()
+    recorded_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['tenant', 'rental', 'id'], name='payment_event_pair_idx'),
+            models.Index(fields=['payment_ref'], name='payment_event_ref_idx'),
+        ]
+
+    @classmethod
+    def for_change(cls, kind, payment, group, amount_delta, count_delta):
+        tenant_id, rental_id, rental_period = group
+        return cls(
+            payment_ref=payment.payment_id, kind=kind,
+            tenant_id=tenant_id, rental_id=rental_id, rental_period=rental_period,
+            amount=payment.amount, payment_date=payment.payment_date,
+            amount_delta=amount_delta, count_delta=count_delta,
+        )
+
+    @classmethod
+    def record(cls, events, batch_size=1000):
+        """Append events to the journal and snapshot any tenant+rental that is due one"""
+        cls.objects.bulk_create(events, batch_size=batch_size)
+        BalanceSnapshot.catch_up({(event.tenant_id, event.rental_id) for event in events})
+
+    @classmethod
+    def get_balance(cls, tenant_id, rental_id, as_of=None):
+        """
+        Total paid, number of payments, total charged and balance (charged minus paid)
+        of a tenant+rental as the journal stood at as_of (a datetime; default now).
+        Reads the latest snapshot taken by then and replays the few events after it.
+        """
+        snapshots = BalanceSnapshot.objects.filter(tenant_id=tenant_id, rental_id=rental_id)
+        events = cls.objects.filter(tenant_id=tenant_id, rental_id=rental_id)
+        charges = Charge.objects.filter(tenant_id=tenant_id, rental_id=rental_id)
+        if as_of is not None:
+            snapshots = snapshots.filter(recorded_at__lte=as_of)
+            events = events.filter(recorded_at__lte=as_of)
+            charges = charges.filter(created_at__lte=as_of)
+
+        total_paid, payment_count = Decimal('0.00'), 0
+        snapshot = snapshots.order_by('-last_event_id').first()
+        if snapshot is not None:
+            total_paid, payment_count = snapshot.total_paid, snapshot.payment_count
+            events = events.filter(id__gt=snapshot.last_event_id)
+
+        replay = events.aggregate(paid=Sum('amount_delta'), count=Sum('count_delta'))
+        total_paid += replay['paid'] or 0
+        payment_count += replay['count'] or 0
+        total_charged = charges.aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
+
+        return {
+            'total_paid': total_paid,
+            'payment_count': payment_count,
+            'total_charged': total_charged,
+            'balance': total_charged - total_paid,
+        }
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.payment_ref} ({self.amount_delta:+})"
+
+
+class BalanceSnapshot(models.Model):
+    """
+    Running totals of a tenant+rental's journal up to and including last_event.
+    recorded_at is the latest recorded_at of the events it covers, so a snapshot
+    taken by a given time never includes anything recorded after it.
+    """
+    tenant = models.ForeignKey('tenants.Tenant', on_delete=models.CASCADE, related_name='balance_snapshots')
+    rental = models.ForeignKey('rentals.Rental', on_delete=models.CASCADE, related_name='balance_snapshots')
+    last_event = models.ForeignKey(PaymentEvent, on_delete=models.CASCADE, related_name='+')
+    recorded_at = models.DateTimeField()
+    total_paid = models.DecimalField(max_digits=14, decimal_places=2)
+    payment_count = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['tenant', 'rental', 'last_event'], name='unique_balance_snapshot'),
+        ]
+        indexes = [
+            models.Index(fields=['tenant', 'rental', 'recorded_at'], name='balance_snapshot_time_idx'),
+        ]
+
+    @classmethod
+    def catch_up(cls, pairs, chunk_size=200):
+        """
+        Take the snapshots that are due for some (tenant_id, rental_id) pairs: one
+        for every SNAPSHOT_INTERVAL events since the pair's latest snapshot.
+        Reads only the events after each pair's latest snapshot.
+        """
+        pairs = list(pairs)
+        for offset in range(0, len(pairs), chunk_size):
+            cls._catch_up_chunk(pairs[offset:offset + chunk_size])
+
+    @classmethod
+    def _catch_up_chunk(cls, pairs):
+        condition = Q(pk__in=[])
+        for tenant_id, rental_id in pairs:
+            condition |= Q(tenant_id=tenant_id, rental_id=rental_id)
+
+        latest = cls.objects.filter(
+            tenant_id=OuterRef('tenant_id'), rental_id=OuterRef('rental_id')
+        ).order_by('-last_event_id').values('last_event_id')[:1]
+        pending = {}
+        for event_id, tenant_id, rental_id, amount_delta, count_delta, recorded_at in PaymentEvent.objects.filter(
+            condition
+        ).filter(id__gt=Coalesce(Subquery(latest), 0)).order_by('tenant_id', 'rental_id', 'id').values_list(
+            'id', 'tenant_id', 'rental_id', 'amount_delta', 'count_delta', 'recorded_at'
+        ):
+            pending.setdefault((tenant_id, rental_id), []).append((event_id, amount_delta, count_delta, recorded_at))
+
+        due = {pair: events for pair, events in pending.items() if len(events) >= SNAPSHOT_INTERVAL}
+        if not due:
+            return
+
+        starting = {}
+        due_condition = Q(pk__in=[])
+        for tenant_id, rental_id in due:
+            due_condition |= Q(tenant_id=tenant_id, rental_id=rental_id)
+        for snapshot in cls.objects.filter(due_condition).filter(last_event_id=Subquery(latest)):
+            starting[(snapshot.tenant_id, snapshot.rental_id)] = snapshot
+
+        snapshots = []
+        for (tenant_id, rental_id), events in due.items():
+            previous = starting.get((tenant_id, rental_id))
+            total_paid = previous.total_paid if previous else Decimal('0.00')
+            payment_count = previous.payment_count if previous else 0
+            recorded_at = previous.recorded_at if previous else None
+            for position, (event_id, amount_delta, count_delta, event_recorded_at) in enumerate(events, start=1):
+                total_paid += amount_delta
+                payment_count += count_delta
+                recorded_at = max(recorded_at, event_recorded_at) if recorded_at else event_recorded_at
+                if position % SNAPSHOT_INTERVAL == 0:
+                    snapshots.append(cls(
+                        tenant_id=tenant_id, rental_id=rental_id, last_event_id=event_id,
+                        recorded_at=recorded_at, total_paid=total_paid, payment_count=payment_count,
+                    ))
+        cls.objects.bulk_create(snapshots, batch_size=500)
+
+    @classmethod
+    def rebuild(cls):
+        """Drop every snapshot and replay the whole journal; returns the number of snapshots taken"""
+        with transaction.atomic():
+            cls.objects.all().delete()
+            pairs = PaymentEvent.objects.values_list('tenant_id', 'rental_id').distinct().order_by()
+            cls.catch_up(set(pairs))
+        return cls.objects.count()
+
+    def __str__(self):
+        return f"Balance of tenant {self.tenant_id} on rental {self.rental_id} after event {self.last_event_id}"
@@ -0,0 +1,175 @@
+"""
+Rendering and on-disk caching of payment receipts.
+
+Receipts are cached as HTML fragments and PDF files under
+settings.RECEIPT_CACHE_DIR. File names carry the payment ID and a content
+version, a hash of every value printed on the receipt, so editing a payment
+(or its tenant, rental or property details) makes the next request render a
+fresh copy, and the stale files for that payment are removed.
+"""
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from django.conf import settings
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.safestring import mark_safe
+from home.pdf import CHARS_PER_LINE, build_pdf
+from .models import ArchivedPayment, Payment
+
+# Bump when receipt_body.html or receipt_lines() change layout
+RECEIPT_LAYOUT_VERSION = 1
+
+COMPANY_DETAILS = {
+    'company_name': 'UNIHIVE RENTAL MANAGEMENT',
+    'company_address': 'Kampala, Uganda',
+    'company_phone': '+256 XXX XXX XXX',
+    'company_email': 'info@unihive.com',
+}
+
+
+def receipt_queryset():
+    return Payment.objects.select_related('tenant', 'rental__property')
+
+
+def archived_receipt_queryset():
+    return ArchivedPayment.objects.select_related('tenant', 'rental__property')
+
+
+def receipt_version(payment):
+    """Hash of everything printed on the receipt"""
+    values = (
+        RECEIPT_LAYOUT_VERSION,
+        payment.payment_id, payment.amount, payment.amount_due, payment.payment_date,
+        payment.payment_method, payment.rental_period,
+        payment.tenant.name, payment.tenant.phone_number, payment.tenant.email,
+        payment.rental.rental_number, payment.rental.property.property_name,
+    )
+    return hashlib.sha256(repr(values).encode('utf-8')).hexdigest()[:16]
+
+
+def _cache_dir():
+    return Path(getattr(settings, 'RECEIPT_CACHE_DIR', Path(settings.BASE_DIR) / 'receipt_cache'))
+
+
+def _cached(payment, extension, render):
+    """Return the cached receipt file contents, rendering and storing them on a miss"""
+    cache_dir = _cache_dir()
+    path = cache_dir / f'{payment.payment_id}-{receipt_version(payment)}.{extension}'
+    try:
+        return path.read_bytes()
+    except FileNotFoundError:
+        pass
+
+    content = render()
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    # Write to a temporary file first so readers never see a half-written receipt
+    handle, temporary_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    with os.fdopen(handle, 'wb') as temporary_file:
+        temporary_file.write(content)
+    os.replace(temporary_path, path)
+
+    for stale in cache_dir.glob(f'{payment.payment_id}-*.{extension}'):
+        if stale != path:
+            stale.unlink(missing_ok=True)
+    return content
+
+
+def receipt_context(payment):
+    # Calculate remaining balance after this payment
+    remaining_balance = max(0, payment.amount_due - payment.amount)
+    return {
+        'payment': payment,
+        'remaining_balance': remaining_balance,
+        'issued_at': timezone.now(),
+        **COMPANY_DETAILS,
+    }
+
+
+def get_receipt_body(payment):
+    """The receipt as an HTML fragment (receipt_body.html), from the cache when possible"""
+    content = _cached(
+        payment, 'html',
+        lambda: render_to_string('receipt_body.html', receipt_context(payment)).encode('utf-8')
+    )
+    return mark_safe(content.decode('utf-8'))
+
+
+def receipt_lines(payment):
+    """The receipt as lines of plain text, used for PDF output"""
+    context = receipt_context(payment)
+    width = CHARS_PER_LINE
+
+    def row(label, value):
+        return f'{label:<10}{value}'
+
+    def amount(value):
+        return f'UGX {value:,.0f}'
+
+    return [
+        context['company_name'].center(width),
+        'Property Management Services'.center(width),
+        f'Tel: {context["company_phone"]}'.center(width),
+        context['company_address'].center(width),
+        '',
+        '*** PAYMENT RECEIPT ***'.center(width),
+        f'Receipt #: {payment.payment_id}'.center(width),
+        '-' * width,
+        row('Date:', payment.payment_date.strftime('%d/%m/%Y')),
+        row('Tenant:', payment.tenant.name),
+        row('Phone:', payment.tenant.phone_number),
+        row('Email:', payment.tenant.email or 'N/A'),
+        row('Property:', payment.rental.property.property_name),
+        row('Unit:', payment.rental.rental_number),
+        row('Period:', payment.rental_period),
+        '-' * width,
+        row('Due:', amount(payment.amount_due)),
+        row('Paid:', amount(payment.amount)),
+        row('Balance:', amount(context['remaining_balance'])),
+        row('Method:', payment.get_payment_method_display()),
+        '=' * width,
+        row('TOTAL:', amount(payment.amount)),
+        '=' * width,
+        'THANK YOU FOR YOUR PAYMENT!'.center(width),
+        'UNIHIVE Property Management'.center(width),
+        f'Issued: {timezone.localtime(context["issued_at"]).strftime("%d/%m/%Y %H:%M")}'.center(width),
+    ]
+
+
+def get_receipt_pdf(payment):
+    """The receipt as a one-page PDF, from the cache when possible"""
+    return _cached(payment, 'pdf', lambda: build_pdf([receipt_lines(payment)]))
+
+
+def render_receipts(payment_ids, file_format):
+    """
+    Render receipts for a batch of payment IDs (database ids), in the given order,
+    looking in the archive for any that have been archived. Returns HTML fragments
+    for 'html' and lists of text lines for 'pdf'.
+    Module level so it can run in a process pool worker.
+    """
+    payments = receipt_queryset().in_bulk(payment_ids)
+    missing = [payment_id for payment_id in payment_ids if payment_id not in payments]
+    if missing:
+        payments.update(archived_receipt_queryset().in_bulk(missing))
+    rendered = []
+    for payment_id in payment_ids:
+        payment = payments.get(payment_id)
+        if payment is None:
+            continue
+        if file_format == 'pdf':
+            rendered.append(receipt_lines(payment))
+        else:
+            rendered.append(str(get_receipt_body(payment)))
+    return rendered
+
+
+def merge_receipts(rendered, file_format, title):
+    """Combine rendered receipts from render_receipts() into one HTML or PDF file"""
+    if file_format == 'pdf':
+        return build_pdf(rendered)
+    return render_to_string('payment_receipt_batch.html', {
+        'title': title,
+        'receipt_bodies': [mark_safe(body) for body in rendered],
+    }).encode('utf-8')
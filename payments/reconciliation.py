@@ -0,0 +1,164 @@
+"""
+Reconciliation of mobile-money and bank statements against recorded payments.
+
+A statement line (reference, amount, date, phone) matches a payment of the
+same amount made by a tenant with the same phone number, dated at most
+date_window days from the line. Recorded payments in the statement's date
+range are loaded once into a hash map keyed on (amount in cents, phone,
+date bucket), with buckets date_window days wide, so each line only looks at
+the three buckets around its date and the whole run is linear in the number
+of lines and payments.
+
+A line matches when one candidate is closer in date than every other; a
+matched payment is taken out of the index so it cannot match twice, and
+payments matched by an earlier reconciliation are not considered at all.
+Lines with several equally close candidates are flagged AMBIGUOUS and lines
+with none UNMATCHED, for someone to look at by hand.
+"""
+import re
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from tenants.models import Tenant
+from .models import Payment, Reconciliation, ReconciliationLine
+
+DEFAULT_DATE_WINDOW = 3
+# Ugandan numbers are compared on their last nine digits, so 0772..., 256772... and +256 772... agree
+PHONE_DIGITS = 9
+
+
+def normalize_phone(value):
+    digits = re.sub(r'\D', '', str(value or ''))
+    return digits[-PHONE_DIGITS:]
+
+
+def parse_line(line_number, row):
+    """Build an unsaved ReconciliationLine from a statement row; invalid rows get status INVALID"""
+    line = ReconciliationLine(
+        line_number=line_number,
+        reference=str(row.get('reference') or '').strip()[:100],
+        phone_number=normalize_phone(row.get('phone')),
+    )
+    if '__error__' in row:
+        line.status, line.note = 'INVALID', row['__error__'][:255]
+        return line
+
+    try:
+        line.amount = Decimal(str(row.get('amount', '')).replace(',', '').strip())
+        if not line.amount.is_finite() or line.amount <= 0:
+            raise InvalidOperation
+    except InvalidOperation:
+        line.amount = None
+        line.status, line.note = 'INVALID', f'Invalid amount "{row.get("amount")}"'
+        return line
+    try:
+        # Amounts the column cannot hold would be saved unreadable, or matched after truncating to cents
+        ReconciliationLine._meta.get_field('amount').run_validators(line.amount)
+    except ValidationError as e:
+        line.amount = None
+        line.status, line.note = 'INVALID', f'Invalid amount "{row.get("amount")}": {" ".join(e.messages)}'[:255]
+        return line
+
+    try:
+        # Statements often carry a time as well: 2025-10-18 14:03:22
+        line.transaction_date = datetime.strptime(str(row.get('date', '')).strip()[:10], '%Y-%m-%d').date()
+    except ValueError:
+        line.status, line.note = 'INVALID', f'Invalid date "{row.get("date")}", expected YYYY-MM-DD'
+        return line
+
+    if not line.phone_number:
+        line.status, line.note = 'INVALID', 'Missing phone number'
+    return line
+
+
+class StatementReconciler:
+    """
+    Match statement rows, as (line_number, row) pairs from payments.importers.read_rows,
+    against recorded payments. Rows need amount, date (YYYY-MM-DD) and phone, and
+    may have a reference (the provider's transaction ID).
+    """
+    def __init__(self, date_window=DEFAULT_DATE_WINDOW, batch_size=1000, dry_run=False):
+        self.date_window = date_window
+        self.bucket_days = max(date_window, 1)
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.index = defaultdict(list)
+        self.counts = {status: 0 for status in ('MATCHED', 'AMBIGUOUS', 'UNMATCHED', 'INVALID')}
+
+    def load_payments(self, start, end):
+        """Index unreconciled payments dated between start and end"""
+        phones = {
+            tenant_id: normalize_phone(phone_number)
+            for tenant_id, phone_number in Tenant.objects.values_list('id', 'phone_number').iterator()
+        }
+        payments = Payment.objects.filter(payment_date__range=(start, end)).exclude(Exists(
+            ReconciliationLine.objects.filter(payment_id=OuterRef('pk'), status='MATCHED')
+        )).values_list('id', 'tenant_id', 'amount', 'payment_date').order_by()
+
+        for payment_id, tenant_id, amount, payment_date in payments.iterator(chunk_size=10000):
+            day = payment_date.toordinal()
+            key = (int(amount * 100), phones.get(tenant_id), day // self.bucket_days)
+            self.index[key].append((day, payment_id))
+
+    def match(self, line):
+        """Set the status, payment and candidate count of a parsed line"""
+        cents = int(line.amount * 100)
+        day = line.transaction_date.toordinal()
+        bucket = day // self.bucket_days
+
+        candidates = []
+        for key in ((cents, line.phone_number, bucket + offset) for offset in (-1, 0, 1)):
+            for entry in self.index.get(key, ()):
+                distance = abs(entry[0] - day)
+                if distance <= self.date_window:
+                    candidates.append((distance, key, entry))
+
+        if not candidates:
+            line.status = 'UNMATCHED'
+            return line
+
+        closest = min(distance for distance, key, entry in candidates)
+        best = [(key, entry) for distance, key, entry in candidates if distance == closest]
+        if len(best) > 1:
+            line.status, line.candidate_count = 'AMBIGUOUS', len(best)
+            return line
+
+        key, entry = best[0]
+        self.index[key].remove(entry)
+        line.status, line.payment_id, line.candidate_count = 'MATCHED', entry[1], 1
+        return line
+
+    def run(self, rows, source):
+        """Reconcile every row and save the results; returns the Reconciliation (unsaved on a dry run)"""
+        lines = [parse_line(line_number, row) for line_number, row in rows]
+        dated = [line.transaction_date for line in lines if line.status != 'INVALID']
+        if dated:
+            window = timedelta(days=self.date_window)
+            self.load_payments(min(dated) - window, max(dated) + window)
+
+        for line in lines:
+            if line.status != 'INVALID':
+                self.match(line)
+            self.counts[line.status] += 1
+
+        reconciliation = Reconciliation(
+            source=str(source)[:255],
+            date_window=self.date_window,
+            line_count=len(lines),
+            matched_count=self.counts['MATCHED'],
+            ambiguous_count=self.counts['AMBIGUOUS'],
+            unmatched_count=self.counts['UNMATCHED'],
+            invalid_count=self.counts['INVALID'],
+        )
+        if self.dry_run:
+            return reconciliation
+
+        with transaction.atomic():
+            reconciliation.save()
+            for line in lines:
+                line.reconciliation = reconciliation
+            ReconciliationLine.objects.bulk_create(lines, batch_size=self.batch_size)
+        return reconciliation
@@ -1,3 +1,1034 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import F, Sum, Window
+from django.db.models.functions import RowNumber
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.urls import reverse
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from io import StringIO
+import csv
+import json
+import os
+import tempfile
+from unittest import skipUnless
+from unittest.mock import patch
+from home.search import search_index_available, use_search_index
+from .aging import build_aging_report
+from .forms import PaymentSearchForm
+from .models import (
+    SNAPSHOT_INTERVAL, ArchivedPayment, BalanceSnapshot, Charge, Payment, PaymentEvent, PaymentPeriodBalance,
+    Reconciliation, ReconciliationLine,
+)
+from .receipts import get_receipt_body, receipt_queryset
+from properties.models import Property
+from rentals.models import Rental
+from tenants.models import Tenant
 
 # Create your tests here.
+
+def create_tenancy(name='Bob', rent='800000.00', property_name='Sunrise Estates'):
+    """Create a property, a rental in it and a tenant living there"""
+    property_obj = Property.objects.create(property_name=property_name, address='Plot 1, Kampala Road')
+    rental = Rental.objects.create(
+        rental_type='SINGLE_ROOM',
+        property=property_obj,
+        monthly_rent_amount=Decimal(rent)
+    )
+    tenant = Tenant.objects.create(
+        name=name,
+        email=f'{name.lower()}@example.com',
+        phone_number='0700000000',
+        nin_number=f'NIN-{name.upper()}',
+        emergency_contact_name='Contact',
+        emergency_contact_phone='0700000001',
+        rental=rental,
+        tenant_property=property_obj,
+        move_in_date=date(2025, 1, 1),
+        rent_amount=Decimal(rent)
+    )
+    return tenant, rental
+
+
+def create_payment(tenant, rental, amount, payment_date=date(2025, 10, 18), payment_method='CASH', **kwargs):
+    return Payment.objects.create(
+        tenant=tenant,
+        rental=rental,
+        amount=Decimal(amount),
+        amount_due=Decimal('0.00'),
+        payment_date=payment_date,
+        payment_method=payment_method,
+        **kwargs
+    )
+
+
+class PaymentPeriodBalanceTest(TestCase):
+    def setUp(self):
+        self.tenant, self.rental = create_tenancy()
+
+    def get_balance(self, rental_period='2025-10'):
+        return PaymentPeriodBalance.objects.get(
+            tenant=self.tenant, rental=self.rental, rental_period=rental_period
+        )
+
+    def test_payments_accumulate_in_balance(self):
+        """Each saved payment adds to the period's balance row"""
+        create_payment(self.tenant, self.rental, '200000.00')
+        balance = self.get_balance()
+        self.assertEqual(balance.total_paid, Decimal('200000.00'))
+        self.assertEqual(balance.payment_count, 1)
+        self.assertEqual(balance.status, 'PARTIAL')
+
+        create_payment(self.tenant, self.rental, '600000.00', date(2025, 10, 19))
+        balance = self.get_balance()
+        self.assertEqual(balance.total_paid, Decimal('800000.00'))
+        self.assertEqual(balance.payment_count, 2)
+        self.assertEqual(balance.status, 'PAID')
+
+    def test_editing_amount_adjusts_balance(self):
+        payment = create_payment(self.tenant, self.rental, '200000.00')
+        payment.amount = Decimal('800000.00')
+        payment.save()
+
+        balance = self.get_balance()
+        self.assertEqual(balance.total_paid, Decimal('800000.00'))
+        self.assertEqual(balance.payment_count, 1)
+        self.assertEqual(balance.status, 'PAID')
+
+    def test_moving_payment_to_another_period_adjusts_both_rows(self):
+        create_payment(self.tenant, self.rental, '300000.00')
+        payment = create_payment(self.tenant, self.rental, '200000.00')
+
+        payment.rental_period = '2025-11'
+        payment.save()
+
+        october = self.get_balance('2025-10')
+        self.assertEqual(october.total_paid, Decimal('300000.00'))
+        self.assertEqual(october.payment_count, 1)
+        november = self.get_balance('2025-11')
+        self.assertEqual(november.total_paid, Decimal('200000.00'))
+        self.assertEqual(november.payment_count, 1)
+
+    def test_deleting_last_payment_removes_balance(self):
+        first = create_payment(self.tenant, self.rental, '300000.00')
+        second = create_payment(self.tenant, self.rental, '200000.00')
+
+        second.delete()
+        self.assertEqual(self.get_balance().total_paid, Decimal('300000.00'))
+
+        first.delete()
+        self.assertFalse(PaymentPeriodBalance.objects.exists())
+        summary = Payment.get_payment_summary_for_tenant_rental(self.tenant, self.rental, '2025-10')
+        self.assertEqual(summary['status'], 'UNPAID')
+        self.assertEqual(summary['remaining_balance'], self.rental.monthly_rent_amount)
+
+    def test_rent_change_updates_status(self):
+        first = create_payment(self.tenant, self.rental, '500000.00')
+        second = create_payment(self.tenant, self.rental, '300000.00', date(2025, 10, 20))
+        self.assertEqual(self.get_balance().status, 'PAID')
+
+        self.rental.monthly_rent_amount = Decimal('1000000.00')
+        self.rental.save()
+
+        balance = self.get_balance()
+        self.assertEqual(balance.total_due, Decimal('1000000.00'))
+        self.assertEqual(balance.status, 'PARTIAL')
+        # The running balances of the payments follow the new amount due
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.amount_due, second.amount_due), (Decimal('500000.00'), Decimal('200000.00')))
+
+    def test_rebuild_matches_incremental_balances(self):
+        create_payment(self.tenant, self.rental, '300000.00')
+        create_payment(self.tenant, self.rental, '500000.00', date(2025, 11, 2))
+        expected = list(PaymentPeriodBalance.objects.order_by('rental_period').values(
+            'rental_period', 'total_paid', 'payment_count', 'status'
+        ))
+
+        PaymentPeriodBalance.rebuild()
+
+        rebuilt = list(PaymentPeriodBalance.objects.order_by('rental_period').values(
+            'rental_period', 'total_paid', 'payment_count', 'status'
+        ))
+        self.assertEqual(rebuilt, expected)
+
+    def test_status_properties_read_one_row(self):
+        payment = create_payment(self.tenant, self.rental, '200000.00')
+        payment = Payment.objects.select_related('tenant', 'rental').get(pk=payment.pk)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(payment.payment_status, 'PARTIAL')
+        with self.assertNumQueries(1):
+            self.assertEqual(payment.remaining_balance, Decimal('600000.00'))
+        with self.assertNumQueries(1):
+            self.assertEqual(payment.total_paid_for_rental_period, Decimal('200000.00'))
+
+
+class LatestPeriodStatisticsTest(TestCase):
+    def setUp(self):
+        self.bob, self.bob_rental = create_tenancy('Bob', '800000.00', 'Sunrise Estates')
+        self.alpha, self.alpha_rental = create_tenancy('Alpha', '300000.00', 'Hilltop Apartments')
+
+        create_payment(self.bob, self.bob_rental, '200000.00', date(2025, 10, 18))
+        create_payment(self.bob, self.bob_rental, '200000.00', date(2025, 10, 19))
+        create_payment(self.bob, self.bob_rental, '800000.00', date(2025, 9, 3))
+        create_payment(self.alpha, self.alpha_rental, '100000.00', date(2025, 10, 5))
+        create_payment(self.alpha, self.alpha_rental, '0.00', date(2025, 11, 5))
+
+    def python_statistics(self, payments):
+        """The per-row calculation payment_list used to do, kept as the reference"""
+        latest = {}
+        total_outstanding = 0
+        for payment in payments.order_by('-payment_date', '-payment_id'):
+            combo_key = (payment.tenant_id, payment.rental_id, payment.rental_period)
+            if combo_key not in latest:
+                latest[combo_key] = payment
+                if payment.amount_due > 0:
+                    total_outstanding += payment.amount_due
+        statuses = [payment.payment_status for payment in latest.values()]
+        return {
+            'total_outstanding': total_outstanding,
+            'paid_count': statuses.count('PAID'),
+            'partial_count': statuses.count('PARTIAL'),
+            'unpaid_count': len(statuses) - statuses.count('PAID') - statuses.count('PARTIAL'),
+        }
+
+    def test_matches_python_calculation(self):
+        for payments in [Payment.objects.all(), Payment.objects.filter(tenant__name__icontains='bob')]:
+            with self.assertNumQueries(1):
+                stats = Payment.get_latest_period_statistics(payments)
+            self.assertEqual(stats, self.python_statistics(payments))
+
+    def test_figures(self):
+        stats = Payment.get_latest_period_statistics(Payment.objects.all())
+        self.assertEqual(stats['total_outstanding'], Decimal('900000.00'))
+        self.assertEqual(stats['paid_count'], 1)
+        self.assertEqual(stats['partial_count'], 2)
+        self.assertEqual(stats['unpaid_count'], 1)
+
+    def test_empty_queryset(self):
+        stats = Payment.get_latest_period_statistics(Payment.objects.none())
+        self.assertEqual(stats['total_outstanding'], 0)
+        self.assertEqual(stats['unpaid_count'], 0)
+
+
+class PaymentListViewTest(TestCase):
+    def setUp(self):
+        self.tenant, self.rental = create_tenancy()
+
+    def add_payments(self, count):
+        start = date(2025, 1, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            for day in range(count):
+                create_payment(self.tenant, self.rental, '10000.00', start + timedelta(days=day))
+
+    def test_period_annotations_match_properties(self):
+        self.add_payments(3)
+        create_payment(self.tenant, self.rental, '800000.00', date(2025, 2, 1))
+
+        for payment in Payment.annotate_period_summary(Payment.objects.select_related('rental')):
+            self.assertEqual(payment.period_status, payment.payment_status)
+            self.assertEqual(payment.period_total_paid, payment.total_paid_for_rental_period)
+            self.assertEqual(payment.period_remaining_balance, payment.remaining_balance)
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        self.add_payments(2)
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('payments:payment_list'))
+        self.assertEqual(len(response.context['payments']), 2)
+
+        self.add_payments(40)
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('payments:payment_list'))
+        self.assertEqual(len(response.context['payments']), 20)
+        self.assertContains(response, 'status-partial')
+
+    def test_keyset_pages_cover_every_payment(self):
+        self.add_payments(45)
+        seen = []
+        params = {}
+        while True:
+            response = self.client.get(reverse('payments:payment_list'), params)
+            page = response.context['payments']
+            seen.extend(payment.pk for payment in page)
+            if not page.has_next:
+                break
+            params = {'after': page.next_cursor}
+        self.assertEqual(seen, list(Payment.objects.order_by('-payment_date', '-id').values_list('pk', flat=True)))
+
+    def test_statistics_are_cached_until_payments_change(self):
+        cache.clear()
+        self.add_payments(2)
+        self.client.get(reverse('payments:payment_list'))
+        # Only the page of payments is read again
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('payments:payment_list'), {'after': 'x'})
+        self.assertEqual(response.context['total_payments'], 2)
+
+        # A different search is cached separately
+        response = self.client.get(reverse('payments:payment_list'), {'search': 'nobody'})
+        self.assertEqual(response.context['total_payments'], 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            create_payment(self.tenant, self.rental, '10000.00')
+        response = self.client.get(reverse('payments:payment_list'))
+        self.assertEqual(response.context['total_payments'], 3)
+        outstanding = response.context['total_amount_due']
+
+        # Bulk changes that skip signals invalidate explicitly
+        with self.captureOnCommitCallbacks(execute=True):
+            Charge.generate('2025-09')
+        response = self.client.get(reverse('payments:payment_list'))
+        self.assertEqual(response.context['total_amount_due'], outstanding + Decimal('800000.00'))
+
+
+
+class ChargeTest(TestCase):
+    def setUp(self):
+        self.bob, self.bob_rental = create_tenancy('Bob', rent='800000.00')
+        self.alice, self.alice_rental = create_tenancy('Alice', rent='500000.00', property_name='Hilltop Homes')
+
+    def test_generate_is_idempotent(self):
+        self.assertEqual(Charge.generate('2025-10'), 2)
+        self.assertEqual(Charge.generate('2025-10'), 0)
+        self.assertEqual(Charge.objects.get(tenant=self.bob).amount, Decimal('800000.00'))
+
+        # Tenancies that start after the period are not billed for it
+        Tenant.objects.filter(pk=self.alice.pk).update(move_in_date=date(2025, 11, 5))
+        self.assertEqual(Charge.generate('2025-09'), 1)
+
+    def test_generate_counts_only_charges_it_inserted(self):
+        atomic = transaction.atomic
+        raced = []
+
+        @contextmanager
+        def racing_atomic(*args, **kwargs):
+            # Another run bills Bob between reading the tenancies and inserting
+            if not raced:
+                raced.append(Charge.objects.create(
+                    tenant=self.bob, rental=self.bob_rental, rental_period='2025-10', amount=1
+                ))
+            with atomic(*args, **kwargs):
+                yield
+
+        with patch('payments.models.transaction.atomic', racing_atomic):
+            self.assertEqual(Charge.generate('2025-10'), 1)
+        self.assertEqual(Charge.objects.filter(rental_period='2025-10').count(), 2)
+
+    def test_balances_are_charges_minus_payments(self):
+        Charge.generate('2025-10')
+        Charge.objects.update(created_at=timezone.make_aware(datetime(2025, 10, 1)))
+        create_payment(self.bob, self.bob_rental, '300000.00')
+
+        stats = Charge.get_balance_statistics(Charge.objects.filter(rental_period='2025-10'))
+        self.assertEqual(stats['total_charged'], Decimal('1300000.00'))
+        self.assertEqual(stats['total_paid'], Decimal('300000.00'))
+        self.assertEqual(stats['total_outstanding'], Decimal('1000000.00'))
+        self.assertEqual((stats['paid_count'], stats['partial_count'], stats['unpaid_count']), (0, 1, 1))
+
+        summary = Payment.get_payment_summary_for_tenant_rental(self.alice, self.alice_rental, '2025-10')
+        self.assertEqual(summary['remaining_balance'], Decimal('500000.00'))
+
+    def test_billed_periods_stay_due_their_charge(self):
+        Charge.generate('2025-10')
+        self.bob_rental.monthly_rent_amount = Decimal('900000.00')
+        self.bob_rental.save()
+
+        # Paid after the rent change, billed before it
+        create_payment(self.bob, self.bob_rental, '300000.00', rental_period='2025-10')
+        create_payment(self.bob, self.bob_rental, '300000.00', rental_period='2025-11')
+        october = Payment.get_payment_summary_for_tenant_rental(self.bob, self.bob_rental, '2025-10')
+        self.assertEqual((october['total_due'], october['remaining_balance']), (Decimal('800000.00'), Decimal('500000.00')))
+        november = Payment.get_payment_summary_for_tenant_rental(self.bob, self.bob_rental, '2025-11')
+        self.assertEqual(november['total_due'], Decimal('900000.00'))
+
+        # Another rent change only re-bases the unbilled period, and so does a rebuild
+        self.bob_rental.monthly_rent_amount = Decimal('1000000.00')
+        self.bob_rental.save()
+        PaymentPeriodBalance.rebuild()
+        self.assertEqual(
+            dict(PaymentPeriodBalance.objects.filter(tenant=self.bob).values_list('rental_period', 'total_due')),
+            {'2025-10': Decimal('800000.00'), '2025-11': Decimal('1000000.00')}
+        )
+
+    def test_unpaid_charges_count_as_outstanding(self):
+        create_payment(self.bob, self.bob_rental, '300000.00')
+        call_command('generate_charges', period='2025-10', stdout=StringIO())
+
+        response = self.client.get(reverse('payments:payment_list'))
+        # Bob still owes 500,000 and Alice, who has not paid, owes her whole rent
+        self.assertEqual(response.context['total_amount_due'], Decimal('1000000.00'))
+        self.assertEqual(response.context['unpaid_count'], 1)
+
+        response = self.client.get(reverse('payments:payment_list'), {'search': 'Bob'})
+        self.assertEqual(response.context['total_amount_due'], Decimal('500000.00'))
+
+
+
+class PaymentInfoApiTest(TestCase):
+    def setUp(self):
+        self.bob, self.bob_rental = create_tenancy('Bob', rent='800000.00')
+        self.alice, self.alice_rental = create_tenancy('Alice', rent='500000.00', property_name='Hilltop Homes')
+        create_payment(self.bob, self.bob_rental, '300000.00')
+
+    def batch(self, *keys, **headers):
+        return self.client.get(reverse('payments:payment_info_batch'), {'key': list(keys)}, headers=headers)
+
+    def test_batch_resolves_many_keys(self):
+        Charge.generate('2025-09')
+        bob_key = f'{self.bob.pk}:{self.bob_rental.pk}:2025-10'
+        with self.assertNumQueries(4):
+            response = self.batch(
+                bob_key, f'{self.alice.pk}:{self.alice_rental.pk}:2025-10',
+                f'{self.alice.pk}:{self.alice_rental.pk}:2025-09', f'999:{self.bob_rental.pk}:2025-10'
+            )
+        results = response.json()['results']
+        self.assertEqual(results[0]['key'], bob_key)
+        self.assertEqual(
+            (results[0]['remaining_balance'], results[0]['total_paid'], results[0]['status']),
+            (500000.0, 300000.0, 'PARTIAL')
+        )
+        self.assertEqual((results[1]['remaining_balance'], results[1]['payment_count']), (500000.0, 0))
+        self.assertEqual(results[2]['status'], 'UNPAID')
+        self.assertEqual(results[3]['error'], 'Tenant or Rental not found')
+
+        self.assertEqual(self.batch('1:2').status_code, 400)
+
+    def test_conditional_get(self):
+        key = f'{self.bob.pk}:{self.bob_rental.pk}:2025-10'
+        response = self.batch(key)
+        self.assertIn('no-cache', response['Cache-Control'])
+        etag, last_modified = response['ETag'], response['Last-Modified']
+
+        self.assertEqual(self.batch(key, if_none_match=etag).status_code, 304)
+        self.assertEqual(self.batch(key, if_modified_since=last_modified).status_code, 304)
+
+        create_payment(self.bob, self.bob_rental, '100000.00')
+        response = self.batch(key, if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['total_paid'], 400000.0)
+
+        # Unpaid periods have no change time, so only the ETag is sent
+        response = self.batch(f'{self.alice.pk}:{self.alice_rental.pk}:2025-10')
+        self.assertNotIn('Last-Modified', response)
+
+    def test_single_lookup(self):
+        url = reverse('payments:payment_info_ajax')
+        params = {'tenant_id': self.bob.pk, 'rental_id': self.bob_rental.pk, 'payment_date': '2025-10-20'}
+        response = self.client.get(url, params)
+        self.assertEqual(response.json()['remaining_balance'], 500000.0)
+        self.assertEqual(self.client.get(url, params, headers={'if_none_match': response['ETag']}).status_code, 304)
+
+        self.assertEqual(self.client.get(url, {**params, 'tenant_id': 999}).status_code, 404)
+        self.assertEqual(self.client.get(url, {**params, 'payment_date': '20/10/2025'}).status_code, 400)
+
+
+class ArrearsAgingTest(TestCase):
+    def setUp(self):
+        self.bob, self.bob_rental = create_tenancy('Bob', rent='800000.00')
+        self.alice, self.alice_rental = create_tenancy('Alice', rent='500000.00', property_name='Hilltop Homes')
+        self.carol, self.carol_rental = create_tenancy('Carol', rent='300000.00', property_name='Lakeside')
+        for period in ['2025-07', '2025-09', '2025-10']:
+            Charge.generate(period)
+        # Bob pays July in full and part of October; Carol pays everything
+        create_payment(self.bob, self.bob_rental, '800000.00', date(2025, 7, 3))
+        create_payment(self.bob, self.bob_rental, '200000.00', date(2025, 10, 2))
+        for payment_date in [date(2025, 7, 1), date(2025, 9, 1), date(2025, 10, 1)]:
+            create_payment(self.carol, self.carol_rental, '300000.00', payment_date)
+        # Alice paid part of August, which was never billed
+        create_payment(self.alice, self.alice_rental, '100000.00', date(2025, 8, 10))
+
+    def test_buckets_and_queue(self):
+        report = build_aging_report(as_of=date(2025, 10, 20))
+        buckets = {bucket['label']: bucket['amount'] for bucket in report.buckets}
+        self.assertEqual(buckets, {
+            '0-30': Decimal('1100000'),     # October: Bob 600k, Alice 500k
+            '31-60': Decimal('1300000'),    # September: Bob 800k, Alice 500k
+            '61-90': Decimal('400000'),     # August: Alice 400k left of the ledger's due amount
+            '90+': Decimal('500000'),       # July: Alice
+        })
+        self.assertEqual(report.total_arrears, Decimal('3300000'))
+
+        queue = report.collections_queue(size=1)
+        self.assertEqual(len(queue), 1)
+        self.assertEqual(queue[0]['tenant'], self.alice)
+        self.assertEqual(queue[0]['total'], Decimal('1900000'))
+        self.assertEqual(queue[0]['oldest_days'], 111)
+        self.assertEqual([entry['tenant'] for entry in report.ranked()], [self.alice, self.bob])
+
+    def test_view_and_export(self):
+        response = self.client.get(reverse('payments:arrears_aging'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['collections_queue']), 2)
+
+        response = self.client.get(reverse('payments:export_arrears'))
+        rows = list(csv.reader(b''.join(response.streaming_content).decode('utf-8').splitlines()))
+        self.assertEqual(rows[0][:3], ['Tenant', 'Phone Number', 'Rental'])
+        self.assertEqual([row[0] for row in rows[1:]], ['Alice', 'Bob'])
+
+    def test_invalid_periods_are_left_out(self):
+        create_payment(self.carol, self.carol_rental, '100000.00', date(2025, 10, 5), rental_period='2025-13')
+        report = build_aging_report(as_of=date(2025, 10, 20))
+        self.assertEqual(report.total_arrears, Decimal('3300000'))
+        self.assertEqual(self.client.get(reverse('payments:arrears_aging')).status_code, 200)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN is SQLite syntax')
+class PaymentIndexTest(TestCase):
+    def setUp(self):
+        self.tenant, self.rental = create_tenancy()
+        create_payment(self.tenant, self.rental, '300000.00', rental_period='2025-10')
+
+    def assertUsesIndex(self, queryset, index_name, sorted_by_index=True):
+        with connection.cursor() as cursor:
+            sql, params = queryset.query.sql_with_params()
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            plan = ' '.join(str(row[-1]) for row in cursor.fetchall())
+        self.assertIn(f'INDEX {index_name}', plan)
+        if sorted_by_index:
+            self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_period_start_is_kept_in_step(self):
+        self.assertEqual(Payment.objects.get().period_start, date(2025, 10, 1))
+        payment = create_payment(self.tenant, self.rental, '1000.00', rental_period='October')
+        self.assertIsNone(payment.period_start)
+        payment.rental_period = '2025-11'
+        payment.save()
+        self.assertEqual(Payment.objects.get(pk=payment.pk).period_start, date(2025, 11, 1))
+
+    def test_running_balance_query_uses_period_index(self):
+        self.assertUsesIndex(Payment.objects.filter(
+            tenant_id=self.tenant.pk, rental_id=self.rental.pk, rental_period='2025-10'
+        ).order_by('payment_date', 'id'), 'payment_period_idx')
+
+    def test_latest_payment_per_period_uses_period_index(self):
+        latest = Payment.objects.order_by().annotate(period_row=Window(
+            RowNumber(),
+            partition_by=[F('tenant_id'), F('rental_id'), F('rental_period')],
+            order_by=[F('payment_date').desc(), F('id').desc()]
+        ))
+        # Partitions come straight from the index; only rows within a period are sorted
+        self.assertUsesIndex(latest, 'payment_period_idx', sorted_by_index=False)
+
+    def test_period_query_uses_period_start_index(self):
+        self.assertUsesIndex(
+            Payment.objects.filter(period_start=date(2025, 10, 1)).order_by('payment_date', 'id'),
+            'payment_period_start_idx'
+        )
+
+    def test_list_ordering_uses_date_index(self):
+        self.assertUsesIndex(Payment.objects.order_by('-payment_date', '-id')[:21], 'payment_date_id_idx')
+
+
+class PaymentIdTest(TestCase):
+    def setUp(self):
+        self.tenant, self.rental = create_tenancy()
+
+    def test_ids_continue_from_existing_payments(self):
+        Payment.objects.bulk_create([
+            Payment(payment_id='PAY-0041', tenant=self.tenant, rental=self.rental,
+                    amount=Decimal('1000.00'), amount_due=Decimal('0.00'),
+                    payment_date=date(2025, 10, 1), payment_method='CASH', rental_period='2025-10')
+        ])
+        self.assertEqual(create_payment(self.tenant, self.rental, '1000.00').payment_id, 'PAY-0042')
+        self.assertEqual(Payment.reserve_payment_ids(2), ['PAY-0043', 'PAY-0044'])
+        self.assertEqual(create_payment(self.tenant, self.rental, '1000.00').payment_id, 'PAY-0045')
+
+
+class RunningBalanceTest(TestCase):
+    def setUp(self):
+        self.tenant, self.rental = create_tenancy()
+
+    def balances(self, rental_period='2025-10'):
+        return list(Payment.objects.filter(rental_period=rental_period).order_by(
+            'payment_date', 'id'
+        ).values_list('amount_due', flat=True))
+
+    def test_payment_inserted_before_others(self):
+        create_payment(self.tenant, self.rental, '200000.00', date(2025, 10, 10))
+        create_payment(self.tenant, self.rental, '200000.00', date(2025, 10, 20))
+        create_payment(self.tenant, self.rental, '100000.00', date(2025, 10, 1))
+        self.assertEqual(self.balances(), [Decimal('700000.00'), Decimal('500000.00'), Decimal('300000.00')])
+
+    def test_editing_date_moves_payment_later(self):
+        first = create_payment(self.tenant, self.rental, '100000.00', date(2025, 10, 1))
+        create_payment(self.tenant, self.rental, '200000.00', date(2025, 10, 10))
+        first.payment_date = date(2025, 10, 20)
+        first.save()
+        self.assertEqual(self.balances(), [Decimal('600000.00'), Decimal('500000.00')])
+
+    def test_delete_and_move_recompute_remaining_payments(self):
+        first = create_payment(self.tenant, self.rental, '100000.00', date(2025, 10, 1))
+        second = create_payment(self.tenant, self.rental, '200000.00', date(2025, 10, 10))
+        create_payment(self.tenant, self.rental, '300000.00', date(2025, 10, 20))
+
+        first.delete()
+        self.assertEqual(self.balances(), [Decimal('600000.00'), Decimal('300000.00')])
+
+        second.rental_period = '2025-11'
+        second.save()
+        self.assertEqual(self.balances(), [Decimal('500000.00')])
+        self.assertEqual(self.balances('2025-11'), [Decimal('600000.00')])
+
+    def test_bulk_recompute(self):
+        create_payment(self.tenant, self.rental, '100000.00', date(2025, 10, 1))
+        create_payment(self.tenant, self.rental, '200000.00', date(2025, 10, 10))
+        create_payment(self.tenant, self.rental, '800000.00', date(2025, 11, 10))
+        expected = {
+            period: self.balances(period) for period in ['2025-10', '2025-11']
+        }
+        expected_ledger = list(PaymentPeriodBalance.objects.order_by('rental_period').values(
+            'rental_period', 'total_paid', 'payment_count', 'status'
+        ))
+
+        # Scramble the stored balances the way a bulk import would leave them
+        Payment.objects.update(amount_due=Decimal('0.00'))
+        PaymentPeriodBalance.objects.all().delete()
+
+        # The queries include the charges and the archived payments of these periods,
+        # and two that catch the tenant's next due date up with the paid periods
+        with self.assertNumQueries(10):
+            Payment.recompute_balances([
+                (self.tenant.id, self.rental.id, '2025-10'),
+                (self.tenant.id, self.rental.id, '2025-11'),
+            ])
+        self.assertEqual({period: self.balances(period) for period in expected}, expected)
+        self.assertEqual(list(PaymentPeriodBalance.objects.order_by('rental_period').values(
+            'rental_period', 'total_paid', 'payment_count', 'status'
+        )), expected_ledger)
+
+
+class RunningBalanceBenchmarkTest(TestCase):
+    """
+    Benchmark: the cost of saving a payment must not grow with the number of
+    payments already recorded for the period.
+    """
+    def setUp(self):
+        self.tenant, self.rental = create_tenancy(rent='50000000.00')
+
+    def measure_save(self, payment_date):
+        with CaptureQueriesContext(connection) as queries:
+            create_payment(self.tenant, self.rental, '1000.00', payment_date)
+        updates = [query for query in queries.captured_queries if query['sql'].startswith('UPDATE "payments_payment"')]
+        return len(queries), len(updates)
+
+    def test_cost_per_save_stays_flat(self):
+        results = {}
+        saved = 0
+        # Sizes stay clear of multiples of SNAPSHOT_INTERVAL, where a save also takes a balance snapshot
+        for size in [2, 60, 210]:
+            while saved < size - 1:
+                create_payment(self.tenant, self.rental, '1000.00', date(2025, 10, 1))
+                saved += 1
+            results[size] = self.measure_save(date(2025, 10, 2))
+            saved += 1
+
+        # results maps period size to (queries, payment UPDATEs) for the save
+        query_counts = {size: result[0] for size, result in results.items()}
+        update_counts = {size: result[1] for size, result in results.items()}
+        self.assertEqual(len(set(query_counts.values())), 1, results)
+        self.assertEqual(set(update_counts.values()), {1}, results)
+
+
+class ImportPaymentsCommandTest(TestCase):
+    def setUp(self):
+        self.tenant, self.rental = create_tenancy()
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write_file(self, name, content):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w', encoding='utf-8') as handle:
+            handle.write(content)
+        return path
+
+    def test_csv_import_with_rejects(self):
+        path = self.write_file('statement.csv', (
+            'tenant,rental,amount,payment_date,payment_method,rental_period\n'
+            f'bob@example.com,{self.rental.rental_number},200000,2025-10-18,Mobile Money,\n'
+            'NIN-BOB,,300000,2025-10-19,CASH,2025-10\n'
+            'nobody@example.com,,100000,2025-10-19,CASH,\n'
+            'bob@example.com,,abc,2025-10-19,CASH,\n'
+        ))
+        rejects_path = os.path.join(self.directory.name, 'rejects.csv')
+        output = StringIO()
+
+        call_command('import_payments', path, rejects=rejects_path, chunk_size=1, stdout=output)
+
+        self.assertEqual(Payment.objects.count(), 2)
+        self.assertEqual(
+            list(Payment.objects.order_by('payment_date').values_list('payment_id', 'amount_due', 'payment_method')),
+            [('PAY-0001', Decimal('600000.00'), 'MOBILE'), ('PAY-0002', Decimal('300000.00'), 'CASH')]
+        )
+        balance = PaymentPeriodBalance.objects.get(rental_period='2025-10')
+        self.assertEqual(balance.total_paid, Decimal('500000.00'))
+        self.assertEqual(balance.payment_count, 2)
+
+        with open(rejects_path, newline='') as handle:
+            rejects = list(csv.DictReader(handle))
+        self.assertEqual([row['line'] for row in rejects], ['4', '5'])
+        self.assertIn('Unknown tenant', rejects[0]['error'])
+        self.assertIn('Processed 2 rows', output.getvalue())
+
+    def test_jsonl_dry_run_saves_nothing(self):
+        path = self.write_file('statement.jsonl', json.dumps({
+            'tenant': 'bob@example.com', 'amount': '800000', 'payment_date': '2025-10-18'
+        }) + '\n')
+        output = StringIO()
+
+        call_command('import_payments', path, dry_run=True, stdout=output)
+
+        self.assertFalse(Payment.objects.exists())
+        self.assertIn('Validated 1 payments', output.getvalue())
+
+    def test_oversized_amounts_and_non_object_lines_are_rejected(self):
+        path = self.write_file('statement.jsonl', '\n'.join([
+            json.dumps({'tenant': 'bob@example.com', 'amount': '99999999999', 'payment_date': '2025-10-18'}),
+            json.dumps({'tenant': 'bob@example.com', 'amount': '100.005', 'payment_date': '2025-10-18'}),
+            json.dumps([1, 2]),
+            json.dumps({'tenant': 'bob@example.com', 'amount': '300000', 'payment_date': '2025-10-18'}),
+        ]) + '\n')
+        rejects_path = os.path.join(self.directory.name, 'rejects.csv')
+
+        call_command('import_payments', path, rejects=rejects_path, chunk_size=10, stdout=StringIO())
+
+        self.assertEqual(list(Payment.objects.values_list('amount', flat=True)), [Decimal('300000.00')])
+        with open(rejects_path, newline='') as handle:
+            rejects = list(csv.DictReader(handle))
+        self.assertEqual([row['line'] for row in rejects], ['1', '2', '3'])
+        self.assertIn('digits', rejects[0]['error'])
+        self.assertIn('decimal places', rejects[1]['error'])
+        self.assertIn('JSON object', rejects[2]['error'])
+
+    def test_periods_must_be_ascii_yyyy_mm(self):
+        path = self.write_file('statement.jsonl', '\n'.join(
+            json.dumps({'tenant': 'bob@example.com', 'amount': '100000', 'payment_date': '2025-10-18', 'rental_period': period})
+            for period in ['\uff12\uff10\uff12\uff15-10', '2025-13', '2025-10']
+        ) + '\n')
+        rejects_path = os.path.join(self.directory.name, 'rejects.csv')
+
+        call_command('import_payments', path, rejects=rejects_path, stdout=StringIO())
+
+        self.assertEqual(list(Payment.objects.values_list('rental_period', flat=True)), ['2025-10'])
+        with open(rejects_path, newline='') as handle:
+            self.assertEqual([row['line'] for row in csv.DictReader(handle)], ['1', '2'])
+
+
+class ReconcileStatementTest(TestCase):
+    def setUp(self):
+        self.bob, self.bob_rental = create_tenancy('Bob')
+        self.alice, self.alice_rental = create_tenancy('Alice', rent='500000.00', property_name='Hilltop Homes')
+        Tenant.objects.filter(pk=self.bob.pk).update(phone_number='0772123456')
+        Tenant.objects.filter(pk=self.alice.pk).update(phone_number='0701987654')
+
+        self.bob_payment = create_payment(self.bob, self.bob_rental, '300000.00', date(2025, 10, 18))
+        create_payment(self.bob, self.bob_rental, '300000.00', date(2025, 10, 25))
+        create_payment(self.alice, self.alice_rental, '500000.00', date(2025, 10, 18))
+        create_payment(self.alice, self.alice_rental, '500000.00', date(2025, 10, 20))
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'statement.csv')
+        with open(self.path, 'w', encoding='utf-8') as handle:
+            handle.write(
+                'reference,amount,date,phone\n'
+                'T1,300000,2025-10-19 10:00:00,+256 772 123 456\n'
+                'T2,"300,000",2025-10-19,256772123456\n'
+                'T3,500000,2025-10-19,0701987654\n'
+                'T4,abc,2025-10-19,0701987654\n'
+                'T5,500000,2025-10-19,0799999999\n'
+            )
+
+    def test_lines_are_matched_and_saved(self):
+        output = StringIO()
+        call_command('reconcile_statement', self.path, stdout=output)
+        self.assertIn('5 lines: 1 matched, 1 ambiguous, 2 unmatched, 1 invalid', output.getvalue())
+
+        reconciliation = Reconciliation.objects.get()
+        lines = {line.reference: line for line in reconciliation.lines.all()}
+        self.assertEqual((lines['T1'].status, lines['T1'].payment), ('MATCHED', self.bob_payment))
+        # T1 took the only payment within three days
+        self.assertEqual(lines['T2'].status, 'UNMATCHED')
+        self.assertEqual((lines['T3'].status, lines['T3'].candidate_count), ('AMBIGUOUS', 2))
+        self.assertEqual(lines['T4'].status, 'INVALID')
+        self.assertEqual(lines['T5'].status, 'UNMATCHED')
+
+        # Payments matched before are not matched again
+        call_command('reconcile_statement', self.path, window=7, stdout=StringIO())
+        lines = {line.reference: line for line in Reconciliation.objects.latest('id').lines.all()}
+        self.assertNotEqual(lines['T1'].payment, self.bob_payment)
+        self.assertEqual(lines['T1'].payment.payment_date, date(2025, 10, 25))
+
+    def test_amounts_the_column_cannot_hold_are_invalid(self):
+        with open(self.path, 'w', encoding='utf-8') as handle:
+            handle.write(
+                'reference,amount,date,phone\n'
+                'T1,123456789012,2025-10-19,0772123456\n'
+                'T2,300000.005,2025-10-19,0772123456\n'
+            )
+        call_command('reconcile_statement', self.path, stdout=StringIO())
+
+        lines = list(Reconciliation.objects.get().lines.order_by('line_number'))
+        self.assertEqual([(line.status, line.amount, line.payment) for line in lines], [('INVALID', None, None)] * 2)
+        self.assertIn('digits', lines[0].note)
+        self.assertIn('decimal places', lines[1].note)
+
+    def test_dry_run_saves_nothing(self):
+        output = StringIO()
+        call_command('reconcile_statement', self.path, dry_run=True, stdout=output)
+        self.assertFalse(Reconciliation.objects.exists())
+        self.assertIn('Dry run of 5 lines', output.getvalue())
+
+
+class ExportPaymentsViewTest(TestCase):
+    def test_export_applies_search(self):
+        bob, bob_rental = create_tenancy('Bob', '800000.00', 'Sunrise Estates')
+        alpha, alpha_rental = create_tenancy('Alpha', '300000.00', 'Hilltop Apartments')
+        create_payment(bob, bob_rental, '200000.00')
+        create_payment(alpha, alpha_rental, '100000.00')
+
+        response = self.client.get(reverse('payments:export_payments'), {'search': 'Hilltop'})
+
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[0].startswith('Payment ID,Tenant,Rental,Property'))
+        self.assertIn('Alpha', lines[1])
+        self.assertTrue(lines[1].endswith('PARTIAL'))
+
+    def test_export_is_in_list_order(self):
+        bob, bob_rental = create_tenancy('Bob', '800000.00', 'Sunrise Estates')
+        create_payment(bob, bob_rental, '100000.00', payment_id='PAY-9999')
+        create_payment(bob, bob_rental, '100000.00', payment_id='PAY-10000')
+
+        response = self.client.get(reverse('payments:export_payments'))
+
+        rows = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual([row[0] for row in rows[1:]], ['PAY-10000', 'PAY-9999'])
+        self.assertEqual(len(rows[1]), len(rows[0]))
+
+
+
+class PaymentSearchTest(TestCase):
+    def setUp(self):
+        self.bob, self.sunrise_rental = create_tenancy('Bob', property_name='Sunrise Estates')
+        self.alice, self.hilltop_rental = create_tenancy('Alice', property_name='Hilltop Homes')
+        self.bob_payment = create_payment(self.bob, self.sunrise_rental, '100000.00')
+        self.alice_payment = create_payment(self.alice, self.hilltop_rental, '200000.00', payment_method='MOBILE')
+
+    def search(self, text):
+        return set(PaymentSearchForm({'search': text}).filter_queryset(Payment.objects.all()))
+
+    def test_index_matches_icontains(self):
+        self.assertTrue(search_index_available())
+        for text in ['sunrise', 'RISE', 'alic', 'mobile', self.bob_payment.payment_id, 'HILLTO001', 'nothing']:
+            with patch('payments.forms.use_search_index', return_value=False):
+                expected = self.search(text)
+            self.assertEqual(self.search(text), expected, text)
+        self.assertEqual(self.search('rise est'), {self.bob_payment})
+
+    def test_index_follows_renames_and_deletes(self):
+        self.bob.name = 'Robert'
+        self.bob.save()
+        self.assertEqual(self.search('robert'), {self.bob_payment})
+        self.assertEqual(self.search('bob'), set())
+
+        Property.objects.filter(property_name='Hilltop Homes').update(property_name='Lakeside')
+        self.assertEqual(self.search('lakes'), {self.alice_payment})
+
+        self.bob_payment.delete()
+        self.assertEqual(self.search(self.bob_payment.payment_id), set())
+
+    def test_short_queries_use_icontains(self):
+        self.assertFalse(use_search_index('Bo'))
+        self.assertEqual(self.search('Bo'), {self.bob_payment})
+
+
+class ArchivePeriodsTest(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(RECEIPT_CACHE_DIR=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.tenant, self.rental = create_tenancy()
+        self.settled = create_payment(self.tenant, self.rental, '800000.00', date(2025, 9, 5))
+        create_payment(self.tenant, self.rental, '300000.00', date(2025, 10, 5))
+        create_payment(self.tenant, self.rental, '800000.00', date(2025, 11, 5))
+
+        reconciliation = Reconciliation.objects.create(source='statement.csv', date_window=3)
+        self.line = ReconciliationLine.objects.create(
+            reconciliation=reconciliation, line_number=2, status='MATCHED', payment=self.settled
+        )
+        output = StringIO()
+        call_command('archive_periods', before='2025-11', stdout=output)
+        self.assertIn('Archived 1 payments', output.getvalue())
+
+    def test_only_settled_older_periods_are_archived(self):
+        self.assertEqual(
+            sorted(Payment.objects.values_list('rental_period', flat=True)), ['2025-10', '2025-11']
+        )
+        archived = ArchivedPayment.objects.get()
+        self.assertEqual((archived.pk, archived.payment_id), (self.settled.pk, self.settled.payment_id))
+
+        self.line.refresh_from_db()
+        self.assertEqual((self.line.payment, self.line.archived_payment), (None, archived))
+
+        # The ledger keeps the archived period, through rebuilds and recomputes too
+        PaymentPeriodBalance.rebuild()
+        Payment.recompute_balances([(self.tenant.id, self.rental.id, '2025-09')])
+        balance = PaymentPeriodBalance.objects.get(rental_period='2025-09')
+        self.assertEqual((balance.total_paid, balance.payment_count, balance.status), (Decimal('800000.00'), 1, 'PAID'))
+
+    def test_archived_payments_are_still_found(self):
+        payment_id = self.settled.payment_id
+        data = self.client.get(reverse('payments:payment_details_api', args=[payment_id])).json()
+        self.assertEqual((data['archived'], data['payment_status']), (True, 'PAID'))
+        self.assertEqual(self.client.get(reverse('payments:payment_details_api', args=['PAY-9999'])).status_code, 404)
+
+        response = self.client.get(reverse('payments:payment_receipt', args=[payment_id]))
+        self.assertContains(response, f'Receipt #: {payment_id}')
+
+        content = b''.join(self.client.get(reverse('payments:export_payments')).streaming_content).decode()
+        rows = list(csv.reader(content.splitlines()))
+        self.assertEqual([row[0] for row in rows[1:]], ['PAY-0003', 'PAY-0002', payment_id])
+        self.assertEqual(rows[-1][-1], 'PAID')
+
+        # The list and its search only read the payments table
+        response = self.client.get(reverse('payments:payment_list'), {'search': payment_id})
+        self.assertEqual(response.context['total_payments'], 0)
+
+
+class PaymentJournalTest(TestCase):
+    def setUp(self):
+        self.tenant, self.rental = create_tenancy()
+
+    def journal(self):
+        return list(PaymentEvent.objects.order_by('id').values_list('kind', 'rental_period', 'amount_delta', 'count_delta'))
+
+    def test_changes_are_journaled(self):
+        payment = create_payment(self.tenant, self.rental, '300000.00', date(2025, 10, 5))
+        payment.amount = Decimal('350000.00')
+        payment.save()
+        payment.rental_period = '2025-11'
+        payment.save()
+        payment.delete()
+
+        self.assertEqual(self.journal(), [
+            ('CREATED', '2025-10', Decimal('300000.00'), 1),
+            ('EDITED', '2025-10', Decimal('50000.00'), 0),
+            ('EDITED', '2025-10', Decimal('-350000.00'), -1),
+            ('EDITED', '2025-11', Decimal('350000.00'), 1),
+            ('DELETED', '2025-11', Decimal('-350000.00'), -1),
+        ])
+        balance = PaymentEvent.get_balance(self.tenant.id, self.rental.id)
+        self.assertEqual((balance['total_paid'], balance['payment_count']), (Decimal('0.00'), 0))
+
+    def test_balance_as_of_a_date(self):
+        Charge.generate('2025-10')
+        Charge.objects.update(created_at=timezone.make_aware(datetime(2025, 10, 1)))
+        create_payment(self.tenant, self.rental, '300000.00', date(2025, 10, 5))
+        create_payment(self.tenant, self.rental, '200000.00', date(2025, 10, 20))
+        # Date the journal as if the payments had been entered on their payment dates
+        for event in PaymentEvent.objects.all():
+            PaymentEvent.objects.filter(pk=event.pk).update(
+                recorded_at=timezone.make_aware(datetime.combine(event.payment_date, datetime.min.time()))
+            )
+
+        balance = PaymentEvent.get_balance(
+            self.tenant.id, self.rental.id, as_of=timezone.make_aware(datetime(2025, 10, 10))
+        )
+        self.assertEqual((balance['total_paid'], balance['payment_count']), (Decimal('300000.00'), 1))
+        self.assertEqual(balance['balance'], Decimal('500000.00'))
+
+        url = reverse('payments:balance_api', args=[self.tenant.id, self.rental.id])
+        self.assertEqual(self.client.get(url, {'as_of': '2025-10-20'}).json()['balance'], 300000.0)
+        self.assertEqual(self.client.get(url, {'as_of': '2025-10-04'}).json()['payment_count'], 0)
+        self.assertEqual(self.client.get(url, {'as_of': '20/10/2025'}).status_code, 400)
+        with self.settings(TIME_ZONE='America/New_York'):
+            self.assertEqual(self.client.get(url, {'as_of': '9999-12-31'}).json()['payment_count'], 2)
+        missing = reverse('payments:balance_api', args=[self.tenant.id, self.rental.id + 100])
+        self.assertEqual(self.client.get(missing).status_code, 404)
+
+    def test_snapshots_bound_the_replay(self):
+        for day in range(SNAPSHOT_INTERVAL + 5):
+            create_payment(self.tenant, self.rental, '1000.00', date(2025, 1, 1) + timedelta(days=day))
+
+        snapshot = BalanceSnapshot.objects.get()
+        self.assertEqual((snapshot.total_paid, snapshot.payment_count), (Decimal('50000.00'), SNAPSHOT_INTERVAL))
+        balance = PaymentEvent.get_balance(self.tenant.id, self.rental.id)
+        self.assertEqual((balance['total_paid'], balance['payment_count']), (Decimal('55000.00'), 55))
+        self.assertEqual(balance['total_paid'], Payment.objects.aggregate(total=Sum('amount'))['total'])
+
+        # Reads touch the latest snapshot and at most SNAPSHOT_INTERVAL - 1 events after it
+        with CaptureQueriesContext(connection) as queries:
+            PaymentEvent.get_balance(self.tenant.id, self.rental.id)
+        self.assertEqual(len(queries), 3)
+
+        BalanceSnapshot.objects.update(total_paid=0)
+        output = StringIO()
+        call_command('rebuild_balance_snapshots', stdout=output)
+        self.assertIn('Replayed 55 payment events into 1 snapshots', output.getvalue())
+        self.assertEqual(BalanceSnapshot.objects.get().total_paid, Decimal('50000.00'))
+
+
+class PaymentReceiptTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        settings_override = override_settings(RECEIPT_CACHE_DIR=self.directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.tenant, self.rental = create_tenancy()
+        self.payment = create_payment(self.tenant, self.rental, '200000.00')
+
+    def cached_files(self):
+        return sorted(os.listdir(self.directory.name))
+
+    def test_receipt_is_cached_until_payment_changes(self):
+        url = reverse('payments:payment_receipt', args=[self.payment.payment_id])
+        response = self.client.get(url)
+        self.assertContains(response, 'Sunrise Estates')
+        first_files = self.cached_files()
+        self.assertEqual(len(first_files), 1)
+
+        # A second view is served from the cached fragment
+        with self.assertNumQueries(1):
+            self.client.get(url)
+
+        self.payment.amount = Decimal('300000.00')
+        self.payment.save()
+        response = self.client.get(url)
+        self.assertContains(response, 'UGX 300000')
+        self.assertEqual(len(self.cached_files()), 1)
+        self.assertNotEqual(self.cached_files(), first_files)
+
+    def test_pdf_receipt(self):
+        url = reverse('payments:payment_receipt', args=[self.payment.payment_id])
+        response = self.client.get(url, {'format': 'pdf'})
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(response.content.startswith(b'%PDF-1.4'))
+        self.assertIn(b'Receipt #: PAY-0001)', response.content)
+        self.assertTrue(any(name.endswith('.pdf') for name in self.cached_files()))
+
+    def test_generate_receipts_for_period(self):
+        create_payment(self.tenant, self.rental, '100000.00', date(2025, 10, 20))
+        create_payment(self.tenant, self.rental, '100000.00', date(2025, 11, 2))
+
+        for file_format in ['pdf', 'html']:
+            output = os.path.join(self.directory.name, f'october.{file_format}')
+            call_command('generate_receipts', period='2025-10', format=file_format, workers=1,
+                         batch_size=1, output=output, stdout=StringIO())
+            with open(output, 'rb') as handle:
+                content = handle.read()
+            if file_format == 'pdf':
+                self.assertIn(b'/Count 2', content)
+            else:
+                self.assertEqual(content.count(b'class="receipt-container"'), 2)
+                self.assertIn(str(get_receipt_body(receipt_queryset().get(pk=self.payment.pk))).encode(), content)
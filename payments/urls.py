@@ -6,6 +6,9 @@ app_name = 'payments'
 urlpatterns = [
     # Payment management URLs
     path('', views.payment_list, name='payment_list'),
+    path('export/', views.export_payments, name='export_payments'),
+    path('arrears/', views.arrears_aging, name='arrears_aging'),
+    path('arrears/export/', views.export_arrears, name='export_arrears'),
     path('add/', views.add_payment, name='add_payment'),
     path('edit/<str:payment_id>/', views.edit_payment, name='edit_payment'),
     path('delete/<str:payment_id>/', views.delete_payment, name='delete_payment'),
@@ -14,4 +17,6 @@ urlpatterns = [
     # API endpoints
     path('api/payment/<str:payment_id>/', views.get_payment_details, name='payment_details_api'),
     path('api/payment-info/', views.get_payment_info_ajax, name='payment_info_ajax'),
+    path('api/payment-info/batch/', views.get_payment_info_batch, name='payment_info_batch'),
+    path('api/balance/<int:tenant_id>/<int:rental_id>/', views.get_balance_ajax, name='balance_api'),
 ]
\ No newline at end of file
@@ -1,15 +1,90 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
-from django.core.paginator import Paginator
 from django.db.models import Q, Sum, Count
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse
 from django.urls import reverse_lazy
 from django.utils import timezone
-from datetime import datetime, timedelta
-from .models import Payment
+from datetime import date, datetime, timedelta
+from .models import ArchivedPayment, Charge, Payment, PaymentEvent
 from .forms import PaymentForm, PaymentSearchForm
+from .aging import ARREARS_EXPORT_HEADER, build_aging_report
+from .receipts import get_receipt_body, get_receipt_pdf, receipt_queryset
 from tenants.models import Tenant
 from rentals.models import Rental
+from properties.models import Property
+from home.conditional import conditional_json_response
+from home.exports import export_response, rows_response
+from home.pagination import KeysetPaginator
+from home.stats import cached_stats, request_params
+
+PAYMENT_EXPORT_COLUMNS = [
+    ('payment_id', 'Payment ID'),
+    ('tenant__name', 'Tenant'),
+    ('rental__rental_number', 'Rental'),
+    ('rental__property__property_name', 'Property'),
+    ('amount', 'Amount (UGX)'),
+    ('amount_due', 'Remaining Balance (UGX)'),
+    ('rental_period', 'Rental Period'),
+    ('payment_date', 'Payment Date'),
+    ('payment_method', 'Payment Method'),
+    ('period_status', 'Status'),
+]
+
+PAYMENT_INFO_BATCH_LIMIT = 100
+
+PAYMENT_STATS_MODELS = [Payment, Charge, Tenant, Rental, Property]
+
+
+def payments_for_export(search_form):
+    """
+    Payments matching the list view's search, archived ones included, newest first,
+    with their period status
+    """
+    fields = [field for field, heading in PAYMENT_EXPORT_COLUMNS]
+    payments = Payment.annotate_period_summary(search_form.filter_queryset(Payment.objects.all()))
+    archived = Payment.annotate_period_summary(search_form.filter_archived(ArchivedPayment.objects.all()))
+    # A combined query can only be ordered by the columns it selects, so id is selected
+    # after the exported ones to break ties like the list view (archived payments keep theirs)
+    return payments.values_list(*fields, 'id').union(
+        archived.values_list(*fields, 'id'), all=True
+    ).order_by('-payment_date', '-id')
+
+
+def payment_statistics(payments, search_form, today):
+    """Stat card figures for the payments matching the list view's search"""
+    first_day_of_month = today.replace(day=1)
+    totals = payments.aggregate(
+        total_payments=Count('id'),
+        total_amount_paid=Sum('amount'),
+        this_month_payments=Count('id', filter=Q(
+            payment_date__gte=first_day_of_month,
+            payment_date__lte=today
+        ))
+    )
+    total_payments = totals['total_payments']
+    
+    # Outstanding amounts and statuses come from the latest payment per tenant+rental+period
+    period_stats = Payment.get_latest_period_statistics(payments)
+    # plus the charges of periods that have not been paid at all
+    unpaid_charges = Charge.get_balance_statistics(
+        Charge.without_payments(search_form.filter_charges(Charge.objects.all()))
+    )
+    paid_count = period_stats['paid_count']
+    
+    # Calculate completion rate based on payments with zero amount_due
+    completion_rate = (paid_count / total_payments * 100) if total_payments > 0 else 0
+    
+    return {
+        'total_payments': total_payments,
+        'total_amount_paid': totals['total_amount_paid'] or 0,
+        'total_amount_due': period_stats['total_outstanding'] + unpaid_charges['total_outstanding'],  # Outstanding amounts
+        'this_month_payments': totals['this_month_payments'],
+        'paid_count': paid_count,
+        'partial_count': period_stats['partial_count'],
+        'unpaid_count': period_stats['unpaid_count'] + unpaid_charges['unpaid_count'],
+        'completion_rate': round(completion_rate, 1),
+    }
+
 
 def payment_list(request):
     """Display paginated list of payments with search functionality"""
@@ -17,85 +92,54 @@ def payment_list(request):
     payments = Payment.objects.select_related('tenant', 'rental__property').all()
     
     # Apply search filters
-    if search_form.is_valid():
-        search_query = search_form.cleaned_data.get('search')
-        if search_query:
-            payments = payments.filter(
-                Q(payment_id__icontains=search_query) |
-                Q(tenant__name__icontains=search_query) |
-                Q(rental__rental_number__icontains=search_query) |
-                Q(rental__property__property_name__icontains=search_query) |
-                Q(payment_method__icontains=search_query)
-            )
+    payments = search_form.filter_queryset(payments)
     
     # Order payments by most recent first
-    payments = payments.order_by('-payment_date', '-payment_id')
-    
-    # Calculate enhanced statistics
-    total_payments = payments.count()
-    total_amount_paid = payments.aggregate(Sum('amount'))['amount__sum'] or 0
-    
-    # Calculate outstanding amounts correctly - get latest amount_due per tenant+rental+period
-    outstanding_combinations = {}
-    total_outstanding = 0
+    payments = payments.order_by('-payment_date', '-id')
     
-    for payment in payments:
-        # Create unique key for each tenant+rental+period combination
-        combo_key = (payment.tenant_id, payment.rental_id, payment.rental_period)
-        
-        # Keep only the most recent payment for each combination (since payments are ordered by date desc)
-        if combo_key not in outstanding_combinations:
-            outstanding_combinations[combo_key] = payment
-            # Only add to outstanding if there's still money due
-            if payment.amount_due > 0:
-                total_outstanding += payment.amount_due
-    
-    # Count payment statuses from the latest payments per combination
-    paid_count = 0
-    partial_count = 0
-    unpaid_count = 0
-    
-    for payment in outstanding_combinations.values():
-        status = payment.payment_status
-        if status == 'PAID':
-            paid_count += 1
-        elif status == 'PARTIAL':
-            partial_count += 1
-        else:
-            unpaid_count += 1
-    
-    # This month's payments
+    # Headline statistics, cached until a payment, charge, tenant, rental or property changes
     today = timezone.now().date()
-    first_day_of_month = today.replace(day=1)
-    this_month_payments = payments.filter(
-        payment_date__gte=first_day_of_month,
-        payment_date__lte=today
-    ).count()
-    
-    # Calculate completion rate based on payments with zero amount_due
-    total_rental_periods = total_payments
-    completion_rate = (paid_count / total_rental_periods * 100) if total_rental_periods > 0 else 0
+    stats = cached_stats(
+        'payment_list', PAYMENT_STATS_MODELS, (request_params(request), today),
+        lambda: payment_statistics(payments, search_form, today)
+    )
     
-    # Pagination
-    paginator = Paginator(payments, 20)  # Show 20 payments per page
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Keyset pagination on (payment_date, id) - rows carry their period status so the table needs no per-row queries
+    paginator = KeysetPaginator(
+        Payment.annotate_period_summary(payments), 20, ('-payment_date', '-id'), count=stats['total_payments']
+    )  # Show 20 payments per page
+    page_obj = paginator.get_page_from_request(request)
     
     context = {
         'payments': page_obj,
         'search_form': search_form,
-        'total_payments': total_payments,
-        'total_amount_paid': total_amount_paid,
-        'total_amount_due': total_outstanding,  # Outstanding amounts
-        'this_month_payments': this_month_payments,
-        'paid_count': paid_count,
-        'partial_count': partial_count,
-        'unpaid_count': unpaid_count,
-        'completion_rate': round(completion_rate, 1),
+        **stats,
     }
     
     return render(request, 'paymentlist.html', context)
 
+def export_payments(request):
+    """Stream every payment matching the current search as CSV or XLSX"""
+    return export_response(
+        request, 'payments', payments_for_export(PaymentSearchForm(request.GET)), PAYMENT_EXPORT_COLUMNS
+    )
+
+def arrears_aging(request):
+    """Arrears by age (0-30, 31-60, 61-90 and 90+ days) and the tenants who owe the most"""
+    report = build_aging_report()
+    return render(request, 'arrears_aging.html', {
+        'as_of': report.as_of,
+        'buckets': report.buckets,
+        'total_arrears': report.total_arrears,
+        'tenants_in_arrears': len(report.tenant_ids),
+        'collections_queue': report.collections_queue(),
+    })
+
+def export_arrears(request):
+    """Download every tenant in arrears with their aging buckets, largest debt first"""
+    report = build_aging_report()
+    return rows_response(request, 'arrears', ARREARS_EXPORT_HEADER, report.export_rows())
+
 def add_payment(request):
     """Add a new payment"""
     if request.method == 'POST':
@@ -155,10 +199,7 @@ def delete_payment(request, payment_id):
 def get_payment_details(request, payment_id):
     """API endpoint to get payment details for modal view"""
     try:
-        payment = get_object_or_404(
-            Payment.objects.select_related('tenant', 'rental__property'), 
-            payment_id=payment_id
-        )
+        payment = ArchivedPayment.find(payment_id, Payment.objects.select_related('tenant', 'rental__property'))
         
         # Get payment summary for this tenant/rental/period
         summary = Payment.get_payment_summary_for_tenant_rental(
@@ -177,6 +218,7 @@ def get_payment_details(request, payment_id):
             'payment_date': payment.payment_date.isoformat(),
             'payment_method': payment.payment_method,
             'rental_period': payment.rental_period,
+            'archived': isinstance(payment, ArchivedPayment),
         }
         
         return JsonResponse(data)
@@ -186,6 +228,40 @@ def get_payment_details(request, payment_id):
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
+def payment_info(summary, rental_period):
+    """Form auto-fill data for one tenant+rental+period from its payment summary"""
+    # If no previous payments for this period, use rental amount
+    if summary['payment_count'] == 0:
+        remaining_balance = float(summary['monthly_rent'])
+    else:
+        remaining_balance = float(summary['remaining_balance'])
+    
+    return {
+        'rental_period': rental_period,
+        'remaining_balance': remaining_balance,
+        'total_paid': float(summary['total_paid']),
+        'payment_count': summary['payment_count'],
+        'status': summary['status'],
+        'monthly_rent': float(summary['monthly_rent'])
+    }
+
+def lookup_payment_info(keys):
+    """
+    Payment summaries of keys whose tenant and rental exist, and the time the
+    data last changed for Last-Modified. That is the latest ledger change, and
+    only known when every key has been paid: a period that loses its last
+    payment loses its ledger row, so only the ETag can vouch for it.
+    """
+    summaries = Payment.get_payment_summaries(keys)
+    existing_tenants = set(Tenant.objects.filter(
+        id__in={tenant_id for tenant_id, rental_id, rental_period in keys}
+    ).values_list('id', flat=True))
+    summaries = {key: summary for key, summary in summaries.items() if key[0] in existing_tenants}
+    
+    updated = [summaries[key]['updated_at'] if key in summaries else None for key in keys]
+    last_modified = max(updated) if None not in updated else None
+    return summaries, last_modified
+
 def get_payment_info_ajax(request):
     """AJAX endpoint to get payment information for form auto-fill"""
     tenant_id = request.GET.get('tenant_id')
@@ -196,76 +272,94 @@ def get_payment_info_ajax(request):
         return JsonResponse({'error': 'Missing required parameters'}, status=400)
     
     try:
-        from datetime import datetime
-        tenant = get_object_or_404(Tenant, id=tenant_id)
-        rental = get_object_or_404(Rental, id=rental_id)
-        
         # Parse payment date and generate rental period
         payment_date_obj = datetime.strptime(payment_date, '%Y-%m-%d').date()
-        rental_period = payment_date_obj.strftime('%Y-%m')
-        
-        # Get payment summary for this combination
-        summary = Payment.get_payment_summary_for_tenant_rental(
-            tenant, rental, rental_period
-        )
-        
-        # If no previous payments for this period, use rental amount
-        if summary['payment_count'] == 0:
-            remaining_balance = float(rental.monthly_rent_amount)
-        else:
-            remaining_balance = float(summary['remaining_balance'])
-        
-        data = {
-            'rental_period': rental_period,
-            'remaining_balance': remaining_balance,
-            'total_paid': float(summary['total_paid']),
-            'payment_count': summary['payment_count'],
-            'status': summary['status'],
-            'monthly_rent': float(rental.monthly_rent_amount)
-        }
-        
-        return JsonResponse(data)
-        
-    except (Tenant.DoesNotExist, Rental.DoesNotExist):
-        return JsonResponse({'error': 'Tenant or Rental not found'}, status=404)
+        key = (int(tenant_id), int(rental_id), payment_date_obj.strftime('%Y-%m'))
     except ValueError:
         return JsonResponse({'error': 'Invalid date format'}, status=400)
-    except Exception as e:
-        return JsonResponse({'error': str(e)}, status=500)
+    
+    summaries, last_modified = lookup_payment_info([key])
+    if key not in summaries:
+        return JsonResponse({'error': 'Tenant or Rental not found'}, status=404)
+    
+    return conditional_json_response(request, payment_info(summaries[key], key[2]), last_modified)
+
+def get_payment_info_batch(request):
+    """
+    Payment information for many tenant+rental+period combinations in one request.
+    GET /payments/api/payment-info/batch/?key=<tenant_id>:<rental_id>:<YYYY-MM>&key=...
+    Results come back in request order; unknown tenants or rentals get an error entry.
+    Supports If-None-Match and If-Modified-Since.
+    """
+    raw_keys = request.GET.getlist('key')
+    if not raw_keys:
+        return JsonResponse({'error': 'Missing required parameters'}, status=400)
+    if len(raw_keys) > PAYMENT_INFO_BATCH_LIMIT:
+        return JsonResponse({'error': f'At most {PAYMENT_INFO_BATCH_LIMIT} keys per request'}, status=400)
+    
+    keys = []
+    for raw_key in raw_keys:
+        try:
+            tenant_id, rental_id, rental_period = raw_key.split(':')
+            datetime.strptime(rental_period, '%Y-%m')
+            keys.append((int(tenant_id), int(rental_id), rental_period))
+        except ValueError:
+            return JsonResponse({'error': f'Invalid key "{raw_key}", expected tenant_id:rental_id:YYYY-MM'}, status=400)
+    
+    summaries, last_modified = lookup_payment_info(keys)
+    results = []
+    for raw_key, key in zip(raw_keys, keys):
+        if key in summaries:
+            results.append({'key': raw_key, **payment_info(summaries[key], key[2])})
+        else:
+            results.append({'key': raw_key, 'error': 'Tenant or Rental not found'})
+    
+    return conditional_json_response(request, {'results': results}, last_modified)
+
+def get_balance_ajax(request, tenant_id, rental_id):
+    """
+    Balance of a tenant+rental from the payment journal.
+    GET /payments/api/balance/<tenant_id>/<rental_id>/?as_of=YYYY-MM-DD
+    With as_of, the balance as it stood at the end of that day.
+    """
+    if not (Tenant.objects.filter(pk=tenant_id).exists() and Rental.objects.filter(pk=rental_id).exists()):
+        return JsonResponse({'error': 'Tenant or Rental not found'}, status=404)
+
+    as_of = request.GET.get('as_of')
+    if as_of:
+        try:
+            as_of = datetime.strptime(as_of, '%Y-%m-%d')
+        except ValueError:
+            return JsonResponse({'error': f'Invalid date "{as_of}", expected YYYY-MM-DD'}, status=400)
+        # The end of the last day cannot be converted to UTC west of Greenwich, and nothing comes after it anyway
+        as_of = None if as_of.date() == date.max else timezone.make_aware(as_of + timedelta(days=1, microseconds=-1))
+    
+    balance = PaymentEvent.get_balance(tenant_id, rental_id, as_of=as_of or None)
+    return JsonResponse({
+        'tenant_id': tenant_id,
+        'rental_id': rental_id,
+        'as_of': request.GET.get('as_of') or None,
+        'total_paid': float(balance['total_paid']),
+        'payment_count': balance['payment_count'],
+        'total_charged': float(balance['total_charged']),
+        'balance': float(balance['balance']),
+    })
 
 def payment_receipt(request, payment_id):
-    """Generate and display payment receipt"""
+    """Display a payment receipt, or download it as a PDF with ?format=pdf"""
     try:
-        payment = get_object_or_404(
-            Payment.objects.select_related('tenant', 'rental__property'), 
-            payment_id=payment_id
-        )
-        
-        # Get payment summary for context
-        try:
-            summary = Payment.get_payment_summary_for_tenant_rental(
-                payment.tenant, payment.rental, payment.rental_period
-            )
-        except Exception as summary_error:
-            # If summary fails, create a basic one
-            summary = {
-                'total_due': payment.amount_due,
-                'total_paid': payment.amount,
-                'status': 'PAID' if payment.amount >= payment.amount_due else 'PARTIAL',
-                'payment_count': 1
-            }
+        # Falls back to the archive for payments of archived periods
+        payment = ArchivedPayment.find(payment_id, receipt_queryset())
         
-        # Calculate remaining balance after this payment
-        remaining_balance = max(0, payment.amount_due - payment.amount)
+        # Receipts are cached on disk and re-rendered only when the payment changes
+        if request.GET.get('format') == 'pdf':
+            response = HttpResponse(get_receipt_pdf(payment), content_type='application/pdf')
+            response['Content-Disposition'] = f'inline; filename="receipt-{payment.payment_id}.pdf"'
+            return response
         
         context = {
             'payment': payment,
-            'summary': summary,
-            'remaining_balance': remaining_balance,
-            'company_name': 'UNIHIVE RENTAL MANAGEMENT',
-            'company_address': 'Kampala, Uganda',
-            'company_phone': '+256 XXX XXX XXX',
-            'company_email': 'info@unihive.com',
+            'receipt_body': get_receipt_body(payment),
         }
         
         return render(request, 'payment_receipt.html', context)
@@ -1,7 +1,12 @@
+from decimal import Decimal
 from django import forms
+from django.db.models import Q
 from crispy_forms.helper import FormHelper
 from crispy_forms.layout import Layout, Submit, Div, Field
+from .forecasting import FORECAST_MONTHS
+from .onboarding import READ_ERRORS, SHEETS, read_upload
 from .models import Property
+from home.search import matching_ids, use_search_index
 
 
 class PropertySearchForm(forms.Form):
@@ -27,6 +32,112 @@ class PropertySearchForm(forms.Form):
             Submit('submit', 'Search', css_class='bg-Unity-Purple hover:bg-Unity-purple2 text-white font-bold py-2 px-6 rounded-lg transition duration-200')
         )
 
+    def filter_queryset(self, properties):
+        """Apply the search query to a Property queryset"""
+        if self.is_valid():
+            search_query = self.cleaned_data.get('search')
+            if use_search_index(search_query):
+                properties = properties.filter(id__in=matching_ids('property', search_query))
+            elif search_query:
+                properties = properties.filter(
+                    Q(property_id__icontains=search_query) |
+                    Q(property_name__icontains=search_query) |
+                    Q(address__icontains=search_query)
+                )
+        return properties
+
+
+class ForecastForm(forms.Form):
+    """What-if parameters of the cash-flow forecast; every field is optional"""
+    input_class = 'w-full px-4 py-2 border border-gray-300 rounded-lg focus:ring-2 focus:ring-Unity-Purple5 focus:border-Unity-Purple5'
+
+    rent_increase = forms.DecimalField(
+        required=False, min_value=-100, max_value=100, decimal_places=2, label='Rent increase (%)',
+        widget=forms.NumberInput(attrs={'placeholder': '0', 'step': '0.5', 'class': input_class})
+    )
+    vacancy_rate = forms.DecimalField(
+        required=False, min_value=0, max_value=100, decimal_places=2, label='Vacancy rate (%)',
+        widget=forms.NumberInput(attrs={'placeholder': '0', 'step': '0.5', 'class': input_class})
+    )
+    months = forms.IntegerField(
+        required=False, min_value=1, max_value=36, label='Months',
+        widget=forms.NumberInput(attrs={'placeholder': '12', 'class': input_class})
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.helper = FormHelper()
+        self.helper.form_method = 'get'
+        self.helper.form_class = 'flex items-end space-x-2'
+        self.helper.layout = Layout(
+            Div(Field('rent_increase'), css_class='flex-1'),
+            Div(Field('vacancy_rate'), css_class='flex-1'),
+            Div(Field('months'), css_class='flex-1'),
+            Submit('submit', 'Forecast', css_class='bg-Unity-Purple hover:bg-Unity-purple2 text-white font-bold py-2 px-6 rounded-lg transition duration-200')
+        )
+
+    def forecast_params(self):
+        """Keyword arguments for build_forecast, the defaults if the form is invalid"""
+        data = self.cleaned_data if self.is_valid() else {}
+        return {
+            'rent_increase': data.get('rent_increase') or Decimal('0'),
+            'vacancy_rate': data.get('vacancy_rate') or Decimal('0'),
+            'months': data.get('months') or FORECAST_MONTHS,
+        }
+
+
+class PortfolioImportForm(forms.Form):
+    """Upload of an onboarding workbook, or of one CSV file per sheet"""
+    input_class = 'w-full px-4 py-2 border border-gray-300 rounded-lg focus:ring-2 focus:ring-Unity-Purple5 focus:border-Unity-Purple5'
+
+    workbook = forms.FileField(
+        required=False, label='Workbook (.xlsx with properties, rentals and tenants sheets)',
+        widget=forms.ClearableFileInput(attrs={'accept': '.xlsx', 'class': input_class})
+    )
+    properties = forms.FileField(
+        required=False, label='or properties.csv',
+        widget=forms.ClearableFileInput(attrs={'accept': '.csv', 'class': input_class})
+    )
+    rentals = forms.FileField(
+        required=False, label='rentals.csv',
+        widget=forms.ClearableFileInput(attrs={'accept': '.csv', 'class': input_class})
+    )
+    tenants = forms.FileField(
+        required=False, label='tenants.csv',
+        widget=forms.ClearableFileInput(attrs={'accept': '.csv', 'class': input_class})
+    )
+    dry_run = forms.BooleanField(required=False, label='Only check the rows, do not import them')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.helper = FormHelper()
+        self.helper.form_method = 'post'
+        self.helper.layout = Layout(
+            Field('workbook'),
+            Div(Field('properties'), Field('rentals'), Field('tenants'), css_class='grid grid-cols-1 md:grid-cols-3 gap-4'),
+            Field('dry_run'),
+            Submit('submit', 'Import', css_class='bg-Unity-Purple hover:bg-Unity-purple2 text-white font-bold py-2 px-6 rounded-lg transition duration-200')
+        )
+
+    def clean(self):
+        """Read the uploads into cleaned_data['sheets']"""
+        cleaned_data = super().clean()
+        sheets = {}
+        try:
+            if cleaned_data.get('workbook'):
+                sheets.update(read_upload(cleaned_data['workbook']))
+            for sheet in SHEETS:
+                if cleaned_data.get(sheet):
+                    # The file name does not matter here, the field says which sheet it is
+                    cleaned_data[sheet].name = f'{sheet}.csv'
+                    sheets.update(read_upload(cleaned_data[sheet]))
+        except READ_ERRORS as e:
+            raise forms.ValidationError(f'Could not read the upload: {e}')
+        if not sheets:
+            raise forms.ValidationError('Upload a workbook or at least one CSV file.')
+        cleaned_data['sheets'] = sheets
+        return cleaned_data
+
 
 class PropertyForm(forms.ModelForm):
     class Meta:
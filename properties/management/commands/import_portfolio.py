@@ -0,0 +1,38 @@
+import csv
+from django.core.management.base import BaseCommand, CommandError
+from properties.onboarding import READ_ERRORS, SHEETS, PortfolioImporter, read_portfolio
+
+
+class Command(BaseCommand):
+    help = 'Onboard properties, rental units and tenants from a workbook or a set of CSV files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+',
+                            help='XLSX workbook with properties, rentals and tenants sheets, CSV files named '
+                                 'after those sheets, or a directory of such CSV files')
+        parser.add_argument('--dry-run', action='store_true', help='Validate every row without saving anything')
+        parser.add_argument('--rejects', help='Write rows that could not be imported to this CSV file')
+
+    def handle(self, *args, **options):
+        try:
+            sheets = read_portfolio(options['paths'])
+        except READ_ERRORS as e:
+            raise CommandError(f'Could not read the import: {e}')
+
+        importer = PortfolioImporter(dry_run=options['dry_run'])
+        importer.run(sheets)
+
+        if options['rejects']:
+            with open(options['rejects'], 'w', newline='', encoding='utf-8') as rejects_file:
+                writer = csv.writer(rejects_file)
+                writer.writerow(['sheet', 'line', 'error'])
+                writer.writerows(importer.errors)
+        for sheet, line_number, error in importer.errors[:20]:
+            self.stdout.write(self.style.WARNING(f'{sheet} line {line_number}: {error}'))
+        if len(importer.errors) > 20:
+            self.stdout.write(self.style.WARNING(f'... and {len(importer.errors) - 20} more rejected rows'))
+
+        verb = 'Validated' if options['dry_run'] else 'Imported'
+        self.stdout.write(self.style.SUCCESS(f'{verb} ' + ', '.join(
+            f'{importer.created[sheet]} of {importer.processed[sheet]} {sheet}' for sheet in SHEETS
+        ) + f' ({len(importer.errors)} rows rejected)'))
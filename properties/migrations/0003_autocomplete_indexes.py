@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:40
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0002_alter_property_property_id'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(django.db.models.functions.text.Lower('property_name'), name='property_name_lower_idx'),
+        ),
+    ]
@@ -1,4 +1,7 @@
 from django.db import models
+from django.db.models import Max
+from django.db.models.functions import Cast, Lower, Substr
+from home.sequences import reserve_block
 
 # Create your models here.
 class Property(models.Model):
@@ -6,16 +9,29 @@ class Property(models.Model):
     property_name = models.CharField(max_length=100)
     address = models.CharField(max_length=255)
 
+    class Meta:
+        indexes = [
+            # Prefix range scans of the property autocomplete (see home/autocomplete.py)
+            models.Index(Lower('property_name'), name='property_name_lower_idx'),
+        ]
+
+    @classmethod
+    def reserve_property_ids(cls, count):
+        """
+        Reserve count consecutive property IDs from the shared sequence.
+        """
+        def last_property_number():
+            return cls.objects.filter(property_id__regex=r'^PROP[0-9]+$').aggregate(
+                last=Max(Cast(Substr('property_id', 5), models.IntegerField()))
+            )['last']
+
+        # Format: PROP001, PROP002, etc.
+        return [f'PROP{number:03d}' for number in reserve_block('property', count, last_property_number)]
+
     def save(self, *args, **kwargs):
         if not self.property_id:
             # Auto-generate property_id
-            last_property = Property.objects.all().order_by('id').last()
-            if last_property:
-                last_number = int(last_property.property_id.replace('PROP', ''))
-                new_number = last_number + 1
-            else:
-                new_number = 1
-            self.property_id = f'PROP{new_number:03d}'  # Format: PROP001, PROP002, etc.
+            self.property_id = Property.reserve_property_ids(1)[0]
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -0,0 +1,385 @@
+"""
+Bulk onboarding of an estate: properties, their rental units and tenants.
+
+The input is a workbook with properties, rentals and tenants sheets, or one
+CSV file per sheet. Rows refer to each other by name rather than by ID:
+
+    properties  property_name, address
+    rentals     property, unit, rental_type, monthly_rent_amount
+    tenants     name, email, phone_number, nin_number, emergency_contact_name,
+                emergency_contact_phone, move_in_date, rent_amount, and either
+                property + unit (a unit of this import) or rental (an
+                existing rental number)
+
+A rental's property is a property_name of the properties sheet or the
+property ID of an existing property. unit is a label that is only used to
+match tenants to units. rent_amount defaults to the unit's monthly rent.
+
+Every row is checked with the model's own field validation, and emails and
+NIN numbers are checked against existing tenants with one IN query per
+field. Rows with errors, and rows that depend on them, are reported and
+left out; the rest are written with bulk_create in a single transaction,
+with property IDs and rental numbers reserved in one block per sequence.
+"""
+import csv
+import io
+import os
+import re
+import zipfile
+from datetime import date, timedelta
+from xml.etree.ElementTree import ParseError, iterparse
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models.functions import Upper
+from home.stats import bump_stats_version
+from rentals.models import RENTAL_TYPES, Rental
+from tenants.models import Tenant, rent_due_date_for
+from .models import Property
+
+SHEETS = ['properties', 'rentals', 'tenants']
+# What reading a damaged or unexpected file can raise
+READ_ERRORS = (OSError, ValueError, KeyError, zipfile.BadZipFile, ParseError, csv.Error)
+
+_SHEET_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+_PACKAGE_REL_NS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+# Spreadsheets count dates in days from 1899-12-30
+_SPREADSHEET_EPOCH = date(1899, 12, 30)
+
+
+def _column_index(reference):
+    """Zero-based column of a cell reference such as B7"""
+    index = 0
+    for letter in re.match(r'[A-Z]+', reference).group():
+        index = index * 26 + ord(letter) - ord('A') + 1
+    return index - 1
+
+
+def _text(element):
+    return ''.join(node.text or '' for node in element.iter(f'{_SHEET_NS}t'))
+
+
+def _sheet_rows(archive, part, shared_strings):
+    """Yield every row of a worksheet part as a list of cell strings"""
+    with archive.open(part) as handle:
+        for event, element in iterparse(handle):
+            if element.tag != f'{_SHEET_NS}row':
+                continue
+            cells = []
+            for cell in element.iter(f'{_SHEET_NS}c'):
+                if cell.get('t') == 'inlineStr':
+                    value = _text(cell)
+                else:
+                    value_element = cell.find(f'{_SHEET_NS}v')
+                    value = value_element.text if value_element is not None else ''
+                    if cell.get('t') == 's':
+                        value = shared_strings[int(value)]
+                column = _column_index(cell.get('r')) if cell.get('r') else len(cells)
+                cells.extend([''] * (column + 1 - len(cells)))
+                cells[column] = value or ''
+            element.clear()
+            yield cells
+
+
+def _as_records(rows, first_line=1):
+    """(line_number, row) pairs of dicts keyed by the lower-cased header row, skipping blank rows"""
+    header = None
+    for line_number, cells in enumerate(rows, start=first_line):
+        if header is None:
+            header = [str(cell).strip().lower() for cell in cells]
+            continue
+        if not any(str(cell).strip() for cell in cells):
+            continue
+        yield line_number, dict(zip(header, cells))
+
+
+def read_workbook(file):
+    """{sheet: [(line_number, row), ...]} for the properties, rentals and tenants sheets of an XLSX file"""
+    with zipfile.ZipFile(file) as archive:
+        names = set(archive.namelist())
+        shared_strings = []
+        if 'xl/sharedStrings.xml' in names:
+            with archive.open('xl/sharedStrings.xml') as handle:
+                for event, element in iterparse(handle):
+                    if element.tag == f'{_SHEET_NS}si':
+                        shared_strings.append(_text(element))
+                        element.clear()
+
+        with archive.open('xl/_rels/workbook.xml.rels') as handle:
+            targets = {
+                element.get('Id'): element.get('Target')
+                for event, element in iterparse(handle) if element.tag == f'{_PACKAGE_REL_NS}Relationship'
+            }
+        with archive.open('xl/workbook.xml') as handle:
+            sheets = [
+                (element.get('name').strip().lower(), targets[element.get(f'{_REL_NS}id')])
+                for event, element in iterparse(handle) if element.tag == f'{_SHEET_NS}sheet'
+            ]
+
+        workbook = {}
+        for name, target in sheets:
+            if name in SHEETS:
+                part = target.lstrip('/') if target.startswith('/') else f'xl/{target}'
+                workbook[name] = list(_as_records(_sheet_rows(archive, part, shared_strings)))
+    return workbook
+
+
+def read_csv(handle):
+    """[(line_number, row), ...] of a CSV file opened in text mode"""
+    return list(_as_records(csv.reader(handle)))
+
+
+def sheet_for_filename(filename):
+    """The sheet a CSV file holds, from its name (properties.csv, rentals-block-b.csv, ...), or None"""
+    stem = os.path.basename(filename).lower()
+    return next((sheet for sheet in SHEETS if stem.startswith(sheet)), None)
+
+
+def read_portfolio(paths):
+    """
+    The sheets of an import from files on disk: XLSX workbooks, CSV files named
+    after their sheet, or directories holding such CSV files
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(os.path.join(path, name) for name in sorted(os.listdir(path)) if name.lower().endswith('.csv'))
+        else:
+            files.append(path)
+
+    sheets = {}
+    for path in files:
+        if path.lower().endswith('.xlsx'):
+            for sheet, rows in read_workbook(path).items():
+                sheets.setdefault(sheet, []).extend(rows)
+            continue
+        sheet = sheet_for_filename(path)
+        if sheet is None:
+            raise ValueError(f'Cannot tell which sheet {path} holds; name it properties, rentals or tenants')
+        with open(path, newline='', encoding='utf-8-sig') as handle:
+            sheets.setdefault(sheet, []).extend(read_csv(handle))
+    return sheets
+
+
+def read_upload(uploaded_file):
+    """The sheets of an uploaded workbook, or of an uploaded CSV file named after its sheet"""
+    if uploaded_file.name.lower().endswith('.xlsx'):
+        return read_workbook(uploaded_file)
+    sheet = sheet_for_filename(uploaded_file.name)
+    if sheet is None:
+        raise ValueError(f'Cannot tell which sheet {uploaded_file.name} holds; name it properties, rentals or tenants')
+    return {sheet: read_csv(io.TextIOWrapper(uploaded_file, encoding='utf-8-sig', newline=''))}
+
+
+class RowError(ValueError):
+    """A row that cannot be imported"""
+
+
+def _value(row, field):
+    return str(row.get(field) or '').strip()
+
+
+def _check(instance, exclude):
+    """Run the model's field validation (no queries) and turn its errors into a RowError"""
+    try:
+        instance.clean_fields(exclude=exclude)
+    except ValidationError as e:
+        raise RowError('; '.join(
+            f'{field}: {" ".join(messages)}' for field, messages in e.message_dict.items()
+        ))
+
+
+def _date(text):
+    """A YYYY-MM-DD date, or a spreadsheet date serial number"""
+    if re.fullmatch(r'\d+(\.0+)?', text):
+        return _SPREADSHEET_EPOCH + timedelta(days=int(float(text)))
+    return text
+
+
+class PortfolioImporter:
+    """
+    Import the properties, rentals and tenants sheets of one onboarding file
+    (see the module docstring for the columns). errors lists (sheet,
+    line_number, message) for every row left out.
+    """
+    def __init__(self, dry_run=False):
+        self.dry_run = dry_run
+        self.errors = []
+        self.prefixes = {}
+        self.created = {sheet: 0 for sheet in SHEETS}
+        self.processed = {sheet: 0 for sheet in SHEETS}
+        self.rental_types = {}
+        for code, label in RENTAL_TYPES:
+            self.rental_types[code.upper()] = code
+            self.rental_types[label.upper()] = code
+
+    def reject(self, sheet, line_number, error):
+        self.errors.append((sheet, line_number, str(error)))
+
+    def run(self, sheets):
+        """Import {sheet: [(line_number, row), ...]}; returns the number of rows created"""
+        for sheet in SHEETS:
+            self.processed[sheet] = len(sheets.get(sheet, []))
+        properties = self.build_properties(sheets.get('properties', []))
+        rentals = self.build_rentals(sheets.get('rentals', []), properties)
+        tenants = self.build_tenants(sheets.get('tenants', []), rentals)
+
+        self.created = {'properties': len(properties), 'rentals': len(rentals), 'tenants': len(tenants)}
+        if not self.dry_run and (properties or rentals or tenants):
+            self.write(list(properties.values()), rentals, tenants)
+        return sum(self.created.values())
+
+    def build_properties(self, rows):
+        """{upper-cased name: unsaved Property} of the valid property rows"""
+        properties = {}
+        names = {}
+        for line_number, row in rows:
+            try:
+                name = _value(row, 'property_name')
+                if not name:
+                    raise RowError('property_name is required')
+                if name.upper() in properties:
+                    raise RowError(f'Property "{name}" appears more than once')
+                property_instance = Property(property_name=name, address=_value(row, 'address'))
+                _check(property_instance, exclude=['property_id'])
+            except RowError as e:
+                self.reject('properties', line_number, e)
+                continue
+            properties[name.upper()] = property_instance
+            names[name.upper()] = line_number
+
+        # Importing an estate twice would duplicate it
+        existing = Property.objects.annotate(name_key=Upper('property_name')).filter(
+            name_key__in=list(properties)
+        ).values_list('name_key', 'property_id')
+        for name_key, property_id in existing:
+            self.reject('properties', names[name_key], f'Property "{properties.pop(name_key).property_name}" '
+                                                       f'already exists ({property_id})')
+        return properties
+
+    def build_rentals(self, rows, properties):
+        """{(property key, upper-cased unit): unsaved Rental} of the valid rental rows"""
+        references = {_value(row, 'property').upper() for line_number, row in rows} - set(properties)
+        existing_properties = {
+            property_id.upper(): (pk, property_name)
+            for pk, property_id, property_name in Property.objects.filter(
+                property_id__in=list(references)
+            ).values_list('id', 'property_id', 'property_name')
+        }
+
+        rentals = {}
+        for line_number, row in rows:
+            try:
+                reference = _value(row, 'property').upper()
+                if not reference:
+                    raise RowError('property is required')
+                rental = Rental(
+                    rental_type=self.rental_types.get(_value(row, 'rental_type').upper(), _value(row, 'rental_type')),
+                    monthly_rent_amount=_value(row, 'monthly_rent_amount').replace(',', ''),
+                )
+                if reference in properties:
+                    rental.property = properties[reference]
+                    property_name = properties[reference].property_name
+                elif reference in existing_properties:
+                    rental.property_id, property_name = existing_properties[reference]
+                else:
+                    raise RowError(f'Unknown property "{_value(row, "property")}"')
+                _check(rental, exclude=['rental_number', 'property'])
+
+                # Units without a label can still be created, just not given tenants
+                key = (reference, _value(row, 'unit').upper() or f'#{line_number}')
+                if key in rentals:
+                    raise RowError(f'Unit "{_value(row, "unit")}" appears more than once for "{_value(row, "property")}"')
+            except RowError as e:
+                self.reject('rentals', line_number, e)
+                continue
+            rentals[key] = rental
+            self.prefixes[key] = rental.generate_property_prefix(property_name)
+        return rentals
+
+    def build_tenants(self, rows, rentals):
+        """Unsaved Tenants of the valid tenant rows"""
+        emails = {_value(row, 'email').lower() for line_number, row in rows} - {''}
+        nin_numbers = {_value(row, 'nin_number').upper() for line_number, row in rows} - {''}
+        rental_numbers = {_value(row, 'rental').upper() for line_number, row in rows} - {''}
+        # One set query per unique field
+        taken_emails = set(Tenant.objects.filter(email__in=list(emails)).values_list('email', flat=True))
+        taken_nin_numbers = set(Tenant.objects.filter(nin_number__in=list(nin_numbers)).values_list('nin_number', flat=True))
+        existing_rentals = {
+            rental_number.upper(): (pk, property_id, monthly_rent_amount)
+            for pk, rental_number, property_id, monthly_rent_amount in Rental.objects.filter(
+                rental_number__in=list(rental_numbers)
+            ).values_list('id', 'rental_number', 'property_id', 'monthly_rent_amount')
+        }
+
+        tenants = []
+        seen_emails, seen_nin_numbers = set(), set()
+        for line_number, row in rows:
+            try:
+                email, nin_number = _value(row, 'email').lower(), _value(row, 'nin_number').upper()
+                if email in taken_emails:
+                    raise RowError(f'A tenant with email {email} already exists')
+                if nin_number in taken_nin_numbers:
+                    raise RowError(f'A tenant with NIN {nin_number} already exists')
+                if email in seen_emails or nin_number in seen_nin_numbers:
+                    raise RowError('Email or NIN appears more than once in this import')
+
+                tenant = Tenant(
+                    name=_value(row, 'name'),
+                    email=email,
+                    phone_number=_value(row, 'phone_number'),
+                    nin_number=nin_number,
+                    emergency_contact_name=_value(row, 'emergency_contact_name'),
+                    emergency_contact_phone=_value(row, 'emergency_contact_phone'),
+                    move_in_date=_date(_value(row, 'move_in_date')),
+                )
+                rental_number = _value(row, 'rental').upper()
+                if rental_number:
+                    if rental_number not in existing_rentals:
+                        raise RowError(f'Unknown rental "{_value(row, "rental")}"')
+                    tenant.rental_id, tenant.tenant_property_id, rent = existing_rentals[rental_number]
+                else:
+                    key = (_value(row, 'property').upper(), _value(row, 'unit').upper())
+                    if not all(key):
+                        raise RowError('Either rental, or property and unit, is required')
+                    if key not in rentals:
+                        raise RowError(f'Unknown unit "{_value(row, "unit")}" of "{_value(row, "property")}"')
+                    tenant.rental = rentals[key]
+                    rent = tenant.rental.monthly_rent_amount
+                tenant.rent_amount = _value(row, 'rent_amount').replace(',', '') or rent
+                _check(tenant, exclude=['rental', 'tenant_property', 'next_due_date'])
+            except RowError as e:
+                self.reject('tenants', line_number, e)
+                continue
+            seen_emails.add(email)
+            seen_nin_numbers.add(nin_number)
+            tenants.append(tenant)
+        return tenants
+
+    def write(self, properties, rentals, tenants):
+        with transaction.atomic():
+            if properties:
+                for property_instance, property_id in zip(properties, Property.reserve_property_ids(len(properties))):
+                    property_instance.property_id = property_id
+                Property.objects.bulk_create(properties, batch_size=500)
+
+            # One block of rental numbers per property prefix
+            by_prefix = {}
+            for key, rental in rentals.items():
+                rental.property_id = rental.property_id or rental.property.pk
+                by_prefix.setdefault(self.prefixes[key], []).append(rental)
+            for prefix, prefix_rentals in by_prefix.items():
+                for rental, rental_number in zip(prefix_rentals, Rental.reserve_rental_numbers(prefix, len(prefix_rentals))):
+                    rental.rental_number = rental_number
+            Rental.objects.bulk_create(list(rentals.values()), batch_size=500)
+
+            for tenant in tenants:
+                if not tenant.rental_id:
+                    # Reads the unit created above; set after it, rental_id would drop the cached unit
+                    tenant.tenant_property_id = tenant.rental.property_id
+                    tenant.rental_id = tenant.rental.pk
+                # New tenants have no paid periods yet, so this is already rolled forward
+                tenant.next_due_date = rent_due_date_for(tenant.move_in_date)
+            Tenant.objects.bulk_create(tenants, batch_size=500)
+
+        bump_stats_version(Property, Rental, Tenant)
@@ -1,3 +1,295 @@
+import csv
+import io
+import os
+import tempfile
+import zipfile
+from datetime import date
+from decimal import Decimal
+from xml.sax.saxutils import escape
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from payments.models import Charge, Payment
+from rentals.models import Rental
+from tenants.models import Tenant
+from .forecasting import build_forecast, collection_history
+from .onboarding import PortfolioImporter
+from .models import Property
 
 # Create your tests here.
+
+class PropertyIdTest(TestCase):
+    def test_ids_continue_from_existing_properties(self):
+        # A property created before the sequence existed
+        Property.objects.bulk_create([
+            Property(property_id='PROP007', property_name='Old Estate', address='Plot 7, Jinja Road')
+        ])
+        new_property = Property.objects.create(property_name='Sunrise Estates', address='Plot 1, Kampala Road')
+        self.assertEqual(new_property.property_id, 'PROP008')
+
+    def test_reserve_property_ids(self):
+        self.assertEqual(Property.reserve_property_ids(2), ['PROP001', 'PROP002'])
+        self.assertEqual(
+            Property.objects.create(property_name='Hilltop', address='Plot 9, Entebbe Road').property_id,
+            'PROP003'
+        )
+
+
+class PropertyListViewTest(TestCase):
+    def test_list_is_paginated(self):
+        Property.objects.bulk_create([
+            Property(property_id=f'PROP{number:03d}', property_name=f'Estate {number}', address='Kampala')
+            for number in range(1, 26)
+        ])
+        response = self.client.get(reverse('properties:property_list'))
+        self.assertEqual(response.status_code, 200)
+        page = response.context['properties']
+        self.assertEqual(len(page), 20)
+        self.assertEqual(page[0].property_id, 'PROP025')
+
+        response = self.client.get(reverse('properties:property_list'), {'after': page.next_cursor})
+        self.assertEqual(len(response.context['properties']), 5)
+        self.assertContains(response, 'First page')
+
+
+class PortfolioForecastTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.sunrise = Property.objects.create(property_name='Sunrise Estates', address='Plot 1, Kampala Road')
+        self.hilltop = Property.objects.create(property_name='Hilltop', address='Plot 9, Entebbe Road')
+        self.tenants = [
+            self.create_tenant('Bob', self.sunrise, '800000.00', date(2025, 1, 1)),
+            self.create_tenant('Ann', self.sunrise, '500000.00', date(2025, 1, 1)),
+            self.create_tenant('Eve', self.hilltop, '400000.00', date(2026, 1, 15)),
+        ]
+        # An empty unit counts towards potential rent only
+        Rental.objects.create(rental_type='SHOP', property=self.hilltop, monthly_rent_amount=Decimal('300000.00'))
+
+        # Bob paid September and October in full; Ann paid half of September and nothing in October
+        Charge.generate('2025-09')
+        Charge.generate('2025-10')
+        for tenant, amount, payment_date in [
+            (self.tenants[0], '800000.00', date(2025, 9, 3)),
+            (self.tenants[0], '800000.00', date(2025, 10, 3)),
+            (self.tenants[1], '250000.00', date(2025, 9, 5)),
+        ]:
+            Payment.objects.create(tenant=tenant, rental=tenant.rental, amount=Decimal(amount),
+                                   amount_due=Decimal('0.00'), payment_date=payment_date, payment_method='CASH')
+
+    def create_tenant(self, name, property_obj, rent, move_in_date):
+        rental = Rental.objects.create(rental_type='SINGLE_ROOM', property=property_obj,
+                                       monthly_rent_amount=Decimal(rent))
+        return Tenant.objects.create(
+            name=name, email=f'{name.lower()}@example.com', phone_number='0700000000',
+            nin_number=f'NIN-{name.upper()}', emergency_contact_name='Contact',
+            emergency_contact_phone='0700000001', rental=rental, tenant_property=property_obj,
+            move_in_date=move_in_date, rent_amount=Decimal(rent)
+        )
+
+    def test_projection_uses_collection_rates(self):
+        forecast = build_forecast(date(2025, 11, 20), months=3)
+        self.assertEqual([month.isoformat() for month in forecast.months], ['2025-11-01', '2025-12-01', '2026-01-01'])
+
+        hilltop, sunrise = forecast.properties
+        # Bob at 100%, Ann at 25%
+        self.assertEqual(sunrise['monthly'], [Decimal('925000.00')] * 3)
+        self.assertEqual((sunrise['occupied_units'], sunrise['unit_count']), (2, 2))
+        # Eve has no history, so gets the portfolio rate (1,850,000 of 2,600,000), from January
+        self.assertEqual(hilltop['monthly'], [Decimal('0.00'), Decimal('0.00'), Decimal('284615.38')])
+        self.assertEqual((hilltop['unit_count'], hilltop['potential_rent']), (2, Decimal('700000.00')))
+        self.assertEqual(forecast.total, Decimal('3059615.38'))
+
+        what_if = build_forecast(date(2025, 11, 20), months=3, rent_increase=10, vacancy_rate=50)
+        self.assertEqual(what_if.properties[1]['monthly'][0], Decimal('508750.00'))
+
+    def test_history_skips_invalid_periods(self):
+        # 2025-13 sorts between 2025-12 and 2026-01, so the range alone lets it in
+        Payment.objects.create(tenant=self.tenants[1], rental=self.tenants[1].rental, amount=Decimal('500000.00'),
+                               amount_due=Decimal('0.00'), payment_date=date(2025, 12, 5), payment_method='CASH',
+                               rental_period='2025-13')
+        self.assertEqual(len(collection_history('2025-06', '2026-05')), 4)
+
+    def test_views_are_cached(self):
+        url = reverse('properties:portfolio_forecast_api')
+        data = self.client.get(url, {'rent_increase': '5', 'months': '6'}).json()
+        self.assertEqual((len(data['months']), data['rent_increase']), (6, 5.0))
+        self.assertEqual([row['property_name'] for row in data['properties']], ['Hilltop', 'Sunrise Estates'])
+
+        # The same parameters are served from the cache, with no queries at all
+        with self.assertNumQueries(0):
+            response = self.client.get(url, {'months': '6', 'rent_increase': '5'})
+        self.assertEqual(response.json(), data)
+        self.assertEqual(self.client.get(url, {'vacancy_rate': '120'}).status_code, 400)
+
+        response = self.client.get(reverse('properties:portfolio_forecast'), {'vacancy_rate': '10'})
+        self.assertContains(response, 'Sunrise Estates')
+        self.assertEqual(response.context['forecast'].vacancy_rate, Decimal('10'))
+
+
+def make_workbook(sheets):
+    """XLSX bytes with a sheet per {name: rows}; text goes in shared strings, numbers in number cells"""
+    shared_strings = []
+
+    def cell(value):
+        if isinstance(value, (int, float)):
+            return f'<c><v>{value}</v></c>'
+        shared_strings.append(value)
+        return f'<c t="s"><v>{len(shared_strings) - 1}</v></c>'
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        relationships, entries = [], []
+        for number, (name, rows) in enumerate(sheets.items(), start=1):
+            archive.writestr(f'xl/worksheets/sheet{number}.xml', (
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+                + ''.join('<row>' + ''.join(cell(value) for value in row) + '</row>' for row in rows)
+                + '</sheetData></worksheet>'
+            ))
+            relationships.append(
+                f'<Relationship Id="rId{number}" Type="http://schemas.openxmlformats.org/officeDocument/2006/'
+                f'relationships/worksheet" Target="worksheets/sheet{number}.xml"/>'
+            )
+            entries.append(f'<sheet name="{name}" sheetId="{number}" r:id="rId{number}"/>')
+        archive.writestr('xl/_rels/workbook.xml.rels', (
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            + ''.join(relationships) + '</Relationships>'
+        ))
+        archive.writestr('xl/workbook.xml', (
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            '<sheets>' + ''.join(entries) + '</sheets></workbook>'
+        ))
+        archive.writestr('xl/sharedStrings.xml', (
+            '<sst xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+            + ''.join(f'<si><t>{escape(text)}</t></si>' for text in shared_strings) + '</sst>'
+        ))
+    return buffer.getvalue()
+
+
+TENANT_HEADER = [
+    'name', 'email', 'phone_number', 'nin_number', 'emergency_contact_name', 'emergency_contact_phone',
+    'move_in_date', 'rent_amount', 'property', 'unit', 'rental',
+]
+
+
+def tenant_row(name, nin_number, move_in_date='2025-01-15', rent_amount='', property_name='Sunrise Estates',
+               unit='', rental=''):
+    return [name, f'{name.lower()}@example.com', '0700000000', nin_number, 'Contact', '0700000001',
+            move_in_date, rent_amount, property_name, unit, rental]
+
+
+class PortfolioImportTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.hilltop = Property.objects.create(property_name='Hilltop', address='Plot 9, Entebbe Road')
+        self.hilltop_unit = Rental.objects.create(
+            rental_type='HOUSE', property=self.hilltop, monthly_rent_amount=Decimal('900000.00')
+        )
+        Tenant.objects.create(
+            name='Eve', email='eve@example.com', phone_number='0700000000', nin_number='NIN-EVE',
+            emergency_contact_name='Contact', emergency_contact_phone='0700000001', rental=self.hilltop_unit,
+            tenant_property=self.hilltop, move_in_date=date(2024, 1, 1), rent_amount=Decimal('900000.00')
+        )
+        self.sheets = {
+            'properties': [
+                ['property_name', 'address'],
+                ['Sunrise Estates', 'Plot 1, Kampala Road'],
+                ['Block B', ''],
+                ['hilltop', 'Plot 9, Entebbe Road'],
+            ],
+            'rentals': [
+                ['property', 'unit', 'rental_type', 'monthly_rent_amount'],
+                ['Sunrise Estates', 'A1', 'SHOP', '500000'],
+                ['sunrise estates', 'A2', 'Single Room', '300,000'],
+                ['Block B', 'B1', 'SHOP', '400000'],
+                [self.hilltop.property_id, 'H2', 'HOUSE', 900000],
+                ['Sunrise Estates', 'A3', 'CASTLE', '100000'],
+                ['Sunrise Estates', 'A1', 'SHOP', '500000'],
+            ],
+            'tenants': [
+                TENANT_HEADER,
+                tenant_row('Bob', 'NIN-BOB', unit='A1'),
+                # 45703 is 2025-02-15 as a spreadsheet date
+                tenant_row('Ann', 'nin-ann', move_in_date=45703, rent_amount='250000', unit='a2'),
+                tenant_row('Eve', 'NIN-EVE2', unit='A1'),
+                tenant_row('Joe', 'NIN-JOE', property_name='', rental=self.hilltop_unit.rental_number.lower()),
+                tenant_row('Kim', 'NIN-KIM', unit='A9'),
+                tenant_row('Lee', 'NIN-BOB', unit='A1'),
+            ],
+        }
+
+    def assert_imported(self, importer):
+        self.assertEqual(importer.created, {'properties': 1, 'rentals': 3, 'tenants': 3})
+        self.assertEqual(sorted((sheet, line) for sheet, line, error in importer.errors), [
+            ('properties', 3), ('properties', 4),
+            ('rentals', 4), ('rentals', 6), ('rentals', 7),
+            ('tenants', 4), ('tenants', 6), ('tenants', 7),
+        ])
+        sunrise = Property.objects.get(property_name='Sunrise Estates')
+        self.assertEqual(sunrise.property_id, 'PROP002')
+        self.assertEqual(
+            list(Rental.objects.order_by('rental_number').values_list('rental_number', 'rental_type', 'monthly_rent_amount')),
+            [('HILLTO001', 'HOUSE', Decimal('900000.00')), ('HILLTO002', 'HOUSE', Decimal('900000.00')),
+             ('SUNRIS001', 'SHOP', Decimal('500000.00')), ('SUNRIS002', 'SINGLE_ROOM', Decimal('300000.00'))]
+        )
+        ann = Tenant.objects.get(name='Ann')
+        self.assertEqual(
+            (ann.nin_number, ann.rental.rental_number, ann.tenant_property, ann.move_in_date, ann.rent_amount,
+             ann.next_due_date),
+            ('NIN-ANN', 'SUNRIS002', sunrise, date(2025, 2, 15), Decimal('250000.00'), date(2025, 5, 15))
+        )
+        self.assertEqual(Tenant.objects.get(name='Joe').rental, self.hilltop_unit)
+        self.assertEqual(Tenant.objects.count(), 4)
+
+    def test_upload_workbook(self):
+        upload = SimpleUploadedFile('estate.xlsx', make_workbook(self.sheets))
+        response = self.client.post(reverse('properties:import_portfolio'), {'workbook': upload})
+        self.assertEqual(response.status_code, 200)
+        self.assert_imported(response.context['importer'])
+        self.assertContains(response, 'Unknown unit')
+
+    def test_dry_run_and_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for sheet, rows in self.sheets.items():
+                with open(os.path.join(directory, f'{sheet}.csv'), 'w', newline='') as handle:
+                    csv.writer(handle).writerows(rows)
+
+            call_command('import_portfolio', directory, dry_run=True, stdout=io.StringIO())
+            self.assertFalse(Property.objects.filter(property_name='Sunrise Estates').exists())
+
+            rejects = os.path.join(directory, 'rejects.csv')
+            output = io.StringIO()
+            call_command('import_portfolio', directory, rejects=rejects, stdout=output)
+            self.assertIn('Imported 1 of 3 properties, 3 of 6 rentals, 3 of 6 tenants (8 rows rejected)', output.getvalue())
+            with open(rejects, newline='') as handle:
+                rejected = list(csv.DictReader(handle))
+        self.assertEqual(len(rejected), 8)
+        self.assertIn('already exists', rejected[1]['error'])
+        self.assertEqual(Tenant.objects.count(), 4)
+
+    def test_queries_do_not_grow_with_rows(self):
+        def import_estate(name, units):
+            sheets = {
+                'properties': [(1, {'property_name': name, 'address': 'Plot 1, Kampala Road'})],
+                'rentals': [
+                    (line, {'property': name, 'unit': str(line), 'rental_type': 'SHOP', 'monthly_rent_amount': '500000'})
+                    for line in range(units)
+                ],
+                'tenants': [
+                    (line, dict(zip(TENANT_HEADER, tenant_row(f'{name}{line}', f'NIN-{name}-{line}', property_name=name, unit=str(line)))))
+                    for line in range(units)
+                ],
+            }
+            with CaptureQueriesContext(connection) as queries:
+                importer = PortfolioImporter()
+                importer.run(sheets)
+            self.assertEqual(importer.errors, [])
+            return len(queries)
+
+        # 60 times the rows only adds the INSERT batches SQLite's limit of 999 parameters per query needs
+        self.assertLessEqual(import_estate('Beta', 300), import_estate('Alpha', 5) + 4)
+        self.assertEqual(Rental.objects.filter(rental_number__startswith='BETA').count(), 300)
@@ -8,4 +8,7 @@ urlpatterns = [
     path('addproperty/', views.add_property, name='add_property'),
     path('edit/<int:pk>/', views.edit_property, name='edit_property'),
     path('delete/<int:pk>/', views.delete_property, name='delete_property'),
+    path('forecast/', views.portfolio_forecast, name='portfolio_forecast'),
+    path('import/', views.import_portfolio, name='import_portfolio'),
+    path('forecast/api/', views.portfolio_forecast_json, name='portfolio_forecast_api'),
 ]
\ No newline at end of file
@@ -1,10 +1,20 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.views.decorators.http import require_http_methods
-from django.core.paginator import Paginator
-from django.db.models import Q
-from .forms import PropertyForm, PropertySearchForm
+from datetime import date
+from django.http import JsonResponse
+from .forecasting import build_forecast
+from .onboarding import PortfolioImporter
+from .forms import ForecastForm, PortfolioImportForm, PropertyForm, PropertySearchForm
 from .models import Property
+from home.conditional import conditional_json_response
+from home.pagination import KeysetPaginator
+from home.stats import cached_stats
+from payments.models import Charge, Payment
+from rentals.models import Rental
+from tenants.models import Tenant
+
+FORECAST_STATS_MODELS = [Payment, Charge, Tenant, Rental, Property]
 
 # Create your views here.
 
@@ -70,21 +80,74 @@ def property_list2(request):
     """
     # Get search query
     search_form = PropertySearchForm(request.GET)
-    properties = Property.objects.all()
+    properties = search_form.filter_queryset(Property.objects.all())
     
-    # Apply search filter
-    if search_form.is_valid():
-        search_query = search_form.cleaned_data.get('search')
-        if search_query:
-            properties = properties.filter(
-                Q(property_id__icontains=search_query) |
-                Q(property_name__icontains=search_query) |
-                Q(address__icontains=search_query)
-            )
+    # Keyset pagination, newest properties first; the total is counted up to a limit
+    paginator = KeysetPaginator(properties, 20, ('-id',))
     
-    # Create table (simplified without django-tables2 for now)
     return render(request, 'property_list2.html', {
         'search_form': search_form,
-        'total_properties': properties.count(),
-        'properties': properties
+        'properties': paginator.get_page_from_request(request),
+        'total_properties': paginator.count,
+        'total_is_estimate': paginator.count_is_estimate,
     })
+
+
+def cached_forecast(params):
+    """The forecast for today's month with params, cached until the data behind it changes"""
+    first_of_month = date.today().replace(day=1)
+    return cached_stats(
+        'portfolio_forecast', FORECAST_STATS_MODELS, (first_of_month, sorted(params.items())),
+        lambda: build_forecast(first_of_month, **params)
+    )
+
+
+def portfolio_forecast(request):
+    """
+    Expected rent collections per property for the coming months, with what-if
+    rent increase and vacancy rate
+    """
+    form = ForecastForm(request.GET)
+    # Invalid parameters are shown as form errors and the plain forecast is used
+    forecast = cached_forecast(form.forecast_params())
+    return render(request, 'portfolio_forecast.html', {'form': form, 'forecast': forecast})
+
+
+def portfolio_forecast_json(request):
+    """
+    The portfolio forecast as JSON.
+    GET /properties/forecast/api/?rent_increase=5&vacancy_rate=10&months=12
+    Supports If-None-Match.
+    """
+    form = ForecastForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    return conditional_json_response(request, cached_forecast(form.forecast_params()).as_dict())
+
+
+@require_http_methods(["GET", "POST"])
+def import_portfolio(request):
+    """
+    Onboard an estate from an uploaded workbook or CSV files: properties, their
+    rental units and tenants in one go. Rows with errors are listed and left out.
+    """
+    importer = None
+    if request.method == 'POST':
+        form = PortfolioImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            importer = PortfolioImporter(dry_run=form.cleaned_data['dry_run'])
+            importer.run(form.cleaned_data['sheets'])
+            created = importer.created
+            summary = f"{created['properties']} properties, {created['rentals']} rental units and {created['tenants']} tenants"
+            if importer.dry_run:
+                messages.info(request, f'Checked the upload: {summary} would be imported.')
+            else:
+                messages.success(request, f'Imported {summary}.')
+            if importer.errors:
+                messages.warning(request, f'{len(importer.errors)} rows were left out, see below.')
+        else:
+            messages.error(request, 'Please correct the errors below.')
+    else:
+        form = PortfolioImportForm()
+
+    return render(request, 'portfolio_import.html', {'form': form, 'importer': importer})
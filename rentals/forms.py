@@ -1,8 +1,11 @@
 from django import forms
+from django.db.models import Q
 from crispy_forms.helper import FormHelper
 from crispy_forms.layout import Layout, Submit, Div, Field
 from .models import Rental, RENTAL_TYPES
 from properties.models import Property
+from home.search import matching_ids, use_search_index
+from home.widgets import AutocompleteSelect
 
 
 class RentalSearchForm(forms.Form):
@@ -28,6 +31,23 @@ class RentalSearchForm(forms.Form):
             Submit('submit', 'Search', css_class='bg-Unity-Purple hover:bg-Unity-purple2 text-white font-bold py-2 px-6 rounded-lg transition duration-200')
         )
 
+    def filter_queryset(self, rentals):
+        """Apply the search query to a Rental queryset (used by the list view and exports)"""
+        if self.is_valid():
+            search_query = self.cleaned_data.get('search')
+            if use_search_index(search_query):
+                rentals = rentals.filter(
+                    Q(id__in=matching_ids('rental', search_query)) |
+                    Q(property_id__in=matching_ids('property', search_query, ['name']))
+                )
+            elif search_query:
+                rentals = rentals.filter(
+                    Q(rental_number__icontains=search_query) |
+                    Q(property__property_name__icontains=search_query) |
+                    Q(rental_type__icontains=search_query)
+                )
+        return rentals
+
 
 class RentalForm(forms.ModelForm):
     class Meta:
@@ -37,9 +57,9 @@ class RentalForm(forms.ModelForm):
             'rental_type': forms.Select(attrs={
                 'class': 'w-full pl-10 pr-3 py-3 border border-gray-300 rounded-lg focus:ring-2 focus:ring-Unity-Purple5 focus:border-Unity-Purple5'
             }),
-            'property': forms.Select(attrs={
+            'property': AutocompleteSelect('property', attrs={
                 'class': 'w-full pl-10 pr-3 py-3 border border-gray-300 rounded-lg focus:ring-2 focus:ring-Unity-Purple5 focus:border-Unity-Purple5'
-            }),
+            }, placeholder='Search properties by name or ID...'),
             'monthly_rent_amount': forms.NumberInput(attrs={
                 'placeholder': 'Enter monthly rent amount',
                 'class': 'w-full pl-16 pr-3 py-3 border border-gray-300 rounded-lg focus:ring-2 focus:ring-Unity-Purple5 focus:border-Unity-Purple5 placeholder-gray-500',
@@ -1,4 +1,7 @@
 from django.db import models
+from django.db.models import Max
+from django.db.models.functions import Cast, Substr
+from home.sequences import reserve_block
 import re
 
 # Create your models here.
@@ -53,33 +56,36 @@ class Rental(models.Model):
         
         return prefix
     
+    @classmethod
+    def reserve_rental_numbers(cls, prefix, count):
+        """
+        Reserve count consecutive rental numbers for a property prefix (SUNRIS001, SUNRIS002, ...).
+        Every prefix has its own sequence.
+        """
+        def last_rental_number():
+            return cls.objects.filter(rental_number__regex=rf'^{prefix}[0-9]+$').aggregate(
+                last=Max(Cast(Substr('rental_number', len(prefix) + 1), models.IntegerField()))
+            )['last']
+
+        numbers = reserve_block(f'rental:{prefix}', count, last_rental_number)
+        return [f"{prefix}{number:03d}" for number in numbers]
+    
     def save(self, *args, **kwargs):
         if not self.rental_number:
             # Generate rental number based on property name
             property_name = self.property.property_name
             prefix = self.generate_property_prefix(property_name)
             
-            # Find the last rental number for this property
-            existing_rentals = Rental.objects.filter(
-                rental_number__startswith=prefix
-            ).order_by('rental_number')
-            
-            if existing_rentals.exists():
-                # Get the last rental number and extract the numeric part
-                last_rental = existing_rentals.last()
-                last_number_str = last_rental.rental_number[len(prefix):]
-                try:
-                    last_number = int(last_number_str)
-                    new_number = last_number + 1
-                except ValueError:
-                    new_number = 1
-            else:
-                new_number = 1
-            
-            # Generate the new rental number
-            self.rental_number = f"{prefix}{new_number:03d}"
+            # Take the next rental number for this prefix from its sequence
+            self.rental_number = Rental.reserve_rental_numbers(prefix, 1)[0]
         
+        is_new = self.pk is None
         super().save(*args, **kwargs)
+        
+        if not is_new:
+            # Keep period balances in line with the (possibly changed) rent amount
+            from payments.models import PaymentPeriodBalance
+            PaymentPeriodBalance.refresh_total_due(self)
     
     def __str__(self):
         return f"Rental {self.rental_number} - {self.rental_type}"
\ No newline at end of file
@@ -1,3 +1,49 @@
 from django.test import TestCase
+from django.urls import reverse
+from decimal import Decimal
+from properties.models import Property
+from .models import Rental
 
 # Create your tests here.
+
+class RentalNumberTest(TestCase):
+    def setUp(self):
+        self.sunrise = Property.objects.create(property_name='Sunrise Estates', address='Plot 1, Kampala Road')
+        self.hilltop = Property.objects.create(property_name='Hilltop Homes', address='Plot 2, Entebbe Road')
+
+    def create_rental(self, property_obj):
+        return Rental.objects.create(
+            rental_type='SINGLE_ROOM',
+            property=property_obj,
+            monthly_rent_amount=Decimal('500000.00')
+        )
+
+    def test_numbers_are_per_prefix(self):
+        self.assertEqual(self.create_rental(self.sunrise).rental_number, 'SUNRIS001')
+        self.assertEqual(self.create_rental(self.sunrise).rental_number, 'SUNRIS002')
+        self.assertEqual(self.create_rental(self.hilltop).rental_number, 'HILLTO001')
+
+    def test_numbers_continue_from_existing_rentals(self):
+        Rental.objects.bulk_create([
+            Rental(rental_number='SUNRIS012', rental_type='SHOP', property=self.sunrise,
+                   monthly_rent_amount=Decimal('500000.00'))
+        ])
+        self.assertEqual(self.create_rental(self.sunrise).rental_number, 'SUNRIS013')
+
+
+class RentalListViewTest(TestCase):
+    def test_list_pages_keep_search(self):
+        sunrise = Property.objects.create(property_name='Sunrise Estates', address='Plot 1, Kampala Road')
+        Rental.objects.bulk_create([
+            Rental(rental_number=f'SUNRIS{number:03d}', rental_type='SHOP', property=sunrise,
+                   monthly_rent_amount=Decimal('500000.00'))
+            for number in range(1, 13)
+        ])
+        response = self.client.get(reverse('rentals:rental_list'), {'search': 'SUNRIS'})
+        page = response.context['rentals']
+        self.assertEqual(len(page), 10)
+        self.assertTrue(page.has_next)
+        self.assertContains(response, f'?search=SUNRIS&amp;after={page.next_cursor}')
+
+        response = self.client.get(reverse('rentals:rental_list'), {'search': 'SUNRIS', 'after': page.next_cursor})
+        self.assertEqual([rental.rental_number for rental in response.context['rentals']], ['SUNRIS002', 'SUNRIS001'])
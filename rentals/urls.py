@@ -5,6 +5,7 @@ app_name = 'rentals'
 
 urlpatterns = [
     path('', views.rental_list, name='rental_list'),
+    path('export/', views.export_rentals, name='export_rentals'),
     path('create/', views.rental_create, name='rental_create'),
     path('<int:pk>/edit/', views.rental_edit, name='rental_edit'),
     path('<int:pk>/', views.rental_detail, name='rental_detail'),
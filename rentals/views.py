@@ -3,10 +3,37 @@ from django.contrib import messages
 from django.urls import reverse
 from django.db import transaction
 from django.db import models
-from django.core.paginator import Paginator
 from django.db.models import Sum, Count
 from .models import Rental
 from .forms import RentalForm, RentalSearchForm
+from home.exports import export_response
+from home.pagination import KeysetPaginator
+from home.stats import cached_stats, request_params
+from properties.models import Property
+
+RENTAL_EXPORT_COLUMNS = [
+    ('rental_number', 'Rental Number'),
+    ('rental_type', 'Rental Type'),
+    ('property__property_name', 'Property'),
+    ('property__address', 'Address'),
+    ('monthly_rent_amount', 'Monthly Rent (UGX)'),
+]
+
+RENTAL_STATS_MODELS = [Rental, Property]
+
+
+def rentals_for_export(search_form):
+    """Rentals matching the list view's search, in list order"""
+    return search_form.filter_queryset(Rental.objects.all()).order_by('-id')
+
+
+def rental_statistics(rentals):
+    """Stat card figures for the rentals matching the list view's search"""
+    return {
+        'total_rentals': rentals.count(),
+        'total_monthly_revenue': rentals.aggregate(total=Sum('monthly_rent_amount'))['total'] or 0,
+        'unique_properties_count': rentals.values('property').distinct().count(),
+    }
 
 
 def rental_list(request):
@@ -14,35 +41,32 @@ def rental_list(request):
     form = RentalSearchForm(request.GET)
     rentals = Rental.objects.select_related('property').prefetch_related('rental_tenants').all().order_by('-id')
     
-    if form.is_valid():
-        search_query = form.cleaned_data.get('search')
-        if search_query:
-            rentals = rentals.filter(
-                models.Q(rental_number__icontains=search_query) |
-                models.Q(property__property_name__icontains=search_query) |
-                models.Q(rental_type__icontains=search_query)
-            )
+    rentals = form.filter_queryset(rentals)
     
-    # Calculate statistics
-    total_rentals = rentals.count()
-    total_monthly_revenue = rentals.aggregate(total=Sum('monthly_rent_amount'))['total'] or 0
-    unique_properties_count = rentals.values('property').distinct().count()
+    # Headline statistics, cached until a rental or property changes
+    stats = cached_stats(
+        'rental_list', RENTAL_STATS_MODELS, request_params(request), lambda: rental_statistics(rentals)
+    )
     
-    # Pagination
-    paginator = Paginator(rentals, 10)  # Show 10 rentals per page
-    page_number = request.GET.get('page')
-    rentals_page = paginator.get_page(page_number)
+    # Keyset pagination, newest rentals first
+    paginator = KeysetPaginator(rentals, 10, ('-id',), count=stats['total_rentals'])  # Show 10 rentals per page
+    rentals_page = paginator.get_page_from_request(request)
     
     context = {
         'rentals': rentals_page,
         'search_form': form,
-        'total_rentals': total_rentals,
-        'total_monthly_revenue': total_monthly_revenue,
-        'unique_properties_count': unique_properties_count,
+        **stats,
     }
     return render(request, 'rentalslist.html', context)
 
 
+def export_rentals(request):
+    """Stream every rental matching the current search as CSV or XLSX"""
+    return export_response(
+        request, 'rentals', rentals_for_export(RentalSearchForm(request.GET)), RENTAL_EXPORT_COLUMNS
+    )
+
+
 def rental_create(request):
     """Create a new rental"""
     if request.method == 'POST':
@@ -1,13 +1,13 @@
 from django.contrib import admin
-from .models import Tenant
+from .models import ReminderLog, Tenant
 
 # Register your models here.
 @admin.register(Tenant)
 class TenantAdmin(admin.ModelAdmin):
-    list_display = ['name', 'email', 'phone_number', 'move_in_date', 'rent_due_date', 'rent_amount']
+    list_display = ['name', 'email', 'phone_number', 'move_in_date', 'next_due_date', 'rent_amount']
     list_filter = ['move_in_date', 'tenant_property', 'rental']
     search_fields = ['name', 'email', 'nin_number']
-    readonly_fields = ['rent_due_date']
+    readonly_fields = ['next_due_date']
     
     fieldsets = (
         ('Personal Information', {
@@ -17,11 +17,15 @@ class TenantAdmin(admin.ModelAdmin):
             'fields': ('emergency_contact_name', 'emergency_contact_phone')
         }),
         ('Rental Information', {
-            'fields': ('rental', 'tenant_property', 'move_in_date', 'rent_due_date', 'rent_amount')
+            'fields': ('rental', 'tenant_property', 'move_in_date', 'next_due_date', 'rent_amount')
         }),
     )
-    
-    def rent_due_date(self, obj):
-        """Display the calculated rent due date"""
-        return obj.rent_due_date
-    rent_due_date.short_description = 'Rent Due Date'
\ No newline at end of file
+
+
+
+@admin.register(ReminderLog)
+class ReminderLogAdmin(admin.ModelAdmin):
+    list_display = ['tenant', 'due_date', 'offset_days', 'channel', 'status', 'sent_at']
+    list_filter = ['status', 'channel', 'offset_days']
+    list_select_related = ['tenant']
+    readonly_fields = ['tenant', 'due_date', 'offset_days', 'channel', 'status', 'error', 'sent_at']
@@ -0,0 +1,96 @@
+"""
+Keeping Tenant.next_due_date up to date.
+
+Rent first falls due RENT_DUE_MONTHS after moving in, then monthly on the
+move-in day (the last day of shorter months). A tenant's next due date is
+the first of those dates whose rental period is not fully paid in the
+period ledger, so it moves forward as periods are paid and back if a
+payment is deleted.
+
+roll_due_dates() works it out for many tenants at once: move-in dates and
+paid periods are loaded into NumPy arrays, and every round moves each tenant
+whose current due date is paid on by a month, with a vectorised month-add,
+until no tenant moves. Only the tenants whose date changed are written.
+"""
+import numpy as np
+from home.stats import bump_stats_version
+from payments.models import PERIOD_PATTERN, PaymentPeriodBalance
+from .models import RENT_DUE_MONTHS, Tenant
+
+# Tenants loaded and written per batch
+ROLL_BATCH_SIZE = 2000
+
+
+def add_months(days, months):
+    """
+    days (datetime64[D] array) plus months (int array) months each, on the same
+    day of the month or the month's last day if it is shorter
+    """
+    target = days.astype('datetime64[M]') + months
+    month_length = ((target + 1).astype('datetime64[D]') - target.astype('datetime64[D]')).astype(np.int64)
+    day_of_month = (days - days.astype('datetime64[M]').astype('datetime64[D]')).astype(np.int64) + 1
+    return target.astype('datetime64[D]') + (np.minimum(day_of_month, month_length) - 1)
+
+
+def _month_number(days):
+    return days.astype('datetime64[M]').astype(np.int64)
+
+
+def _next_due_dates(tenant_ids, rental_ids, move_in_dates):
+    """The next due date of each tenant, from the paid periods of their current rental"""
+    paid = PaymentPeriodBalance.objects.filter(
+        tenant_id__in=tenant_ids.tolist(), status='PAID', rental_period__regex=PERIOD_PATTERN
+    ).values_list('tenant_id', 'rental_id', 'rental_period')
+    rentals = dict(zip(tenant_ids.tolist(), rental_ids.tolist()))
+    paid_keys = np.array([
+        (tenant_id << 20) + (int(period[:4]) - 1970) * 12 + int(period[5:7]) - 1
+        for tenant_id, rental_id, period in paid.iterator()
+        if rentals.get(tenant_id) == rental_id
+    ], dtype=np.int64)
+
+    months = np.full(len(tenant_ids), RENT_DUE_MONTHS, dtype=np.int64)
+    while True:
+        due = add_months(move_in_dates, months)
+        covered = np.isin((tenant_ids << 20) + _month_number(due), paid_keys)
+        if not covered.any():
+            return due
+        months += covered
+
+
+def _roll_batch(rows):
+    ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    rental_ids = np.fromiter((row[1] for row in rows), dtype=np.int64, count=len(rows))
+    move_in_dates = np.array([row[2] for row in rows], dtype='datetime64[D]')
+    stored = np.array([row[3] for row in rows], dtype='datetime64[D]')  # None becomes NaT
+
+    due = _next_due_dates(ids, rental_ids, move_in_dates)
+    moved = np.flatnonzero(due != stored)
+    Tenant.objects.bulk_update([
+        Tenant(id=int(ids[index]), next_due_date=due[index].item()) for index in moved
+    ], ['next_due_date'], batch_size=500)
+    return len(moved)
+
+
+def roll_due_dates(tenant_ids=None):
+    """
+    Bring next_due_date up to date for tenant_ids (default every tenant).
+    Returns the number of tenants whose due date changed.
+    """
+    tenants = Tenant.objects.order_by('id').values_list('id', 'rental_id', 'move_in_date', 'next_due_date')
+    if tenant_ids is not None:
+        tenants = tenants.filter(id__in=list(tenant_ids))
+
+    changed = 0
+    last_id = 0
+    while True:
+        rows = list(tenants.filter(id__gt=last_id)[:ROLL_BATCH_SIZE])
+        if rows:
+            changed += _roll_batch(rows)
+        if len(rows) < ROLL_BATCH_SIZE:
+            break
+        last_id = rows[-1][0]
+
+    if changed:
+        # Takes effect when the surrounding transaction (a payment's, say) commits
+        bump_stats_version(Tenant)
+    return changed
@@ -1,9 +1,12 @@
 from django import forms
+from django.db.models import Q
 from crispy_forms.helper import FormHelper
 from crispy_forms.layout import Layout, Submit, Div, Field
 from .models import Tenant
 from rentals.models import Rental
 from properties.models import Property
+from home.search import matching_ids, use_search_index
+from home.widgets import AutocompleteSelect
 
 class TenantSearchForm(forms.Form):
     search = forms.CharField(
@@ -28,6 +31,27 @@ class TenantSearchForm(forms.Form):
             Submit('submit', 'Search', css_class='bg-Unity-Purple hover:bg-Unity-purple2 text-white font-bold py-2 px-6 rounded-lg transition duration-200')
         )
 
+    def filter_queryset(self, tenants):
+        """Apply the search query to a Tenant queryset (used by the list view and exports)"""
+        if self.is_valid():
+            search_query = self.cleaned_data.get('search')
+            if use_search_index(search_query):
+                tenants = tenants.filter(
+                    Q(id__in=matching_ids('tenant', search_query)) |
+                    Q(tenant_property_id__in=matching_ids('property', search_query, ['name'])) |
+                    Q(rental_id__in=matching_ids('rental', search_query, ['code']))
+                )
+            elif search_query:
+                tenants = tenants.filter(
+                    Q(name__icontains=search_query) |
+                    Q(email__icontains=search_query) |
+                    Q(phone_number__icontains=search_query) |
+                    Q(nin_number__icontains=search_query) |
+                    Q(tenant_property__property_name__icontains=search_query) |
+                    Q(rental__rental_number__icontains=search_query)
+                )
+        return tenants
+
 class TenantForm(forms.ModelForm):
     class Meta:
         model = Tenant
@@ -67,12 +91,12 @@ class TenantForm(forms.ModelForm):
                 'placeholder': 'Enter rent amount',
                 'class': 'w-full pl-10 pr-3 py-3 border border-gray-300 rounded-lg focus:ring-2 focus:ring-Unity-Purple5 focus:border-Unity-Purple5 placeholder-gray-500'
             }),
-            'rental': forms.Select(attrs={
+            'rental': AutocompleteSelect('rental', attrs={
                 'class': 'w-full pl-10 pr-3 py-3 border border-gray-300 rounded-lg focus:ring-2 focus:ring-Unity-Purple5 focus:border-Unity-Purple5'
-            }),
-            'tenant_property': forms.Select(attrs={
+            }, placeholder='Search rentals by number...'),
+            'tenant_property': AutocompleteSelect('property', attrs={
                 'class': 'w-full pl-10 pr-3 py-3 border border-gray-300 rounded-lg focus:ring-2 focus:ring-Unity-Purple5 focus:border-Unity-Purple5'
-            }),
+            }, placeholder='Search properties by name or ID...'),
         }
         labels = {
             'name': 'Tenant Name',
@@ -0,0 +1,17 @@
+"""Background jobs for tenants, run by manage.py run_worker (see home.jobs)"""
+from datetime import date
+from home.jobs import register
+from .due_dates import roll_due_dates
+from .reminders import send_reminders as send_due_reminders
+
+
+@register('tenants.roll_due_dates')
+def roll_all_due_dates():
+    """Catch next due dates up with payments written in bulk since the last run"""
+    roll_due_dates()
+
+
+@register('tenants.send_reminders')
+def send_reminders(today=None):
+    """Send the day's rent reminders; today is YYYY-MM-DD, default the current date"""
+    send_due_reminders(date.fromisoformat(today) if today else None)
@@ -0,0 +1,15 @@
+import time
+from django.core.management.base import BaseCommand
+from tenants.due_dates import roll_due_dates
+
+
+class Command(BaseCommand):
+    help = "Move every tenant's next due date past the rental periods they have paid (safe to run again)"
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        changed = roll_due_dates()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Updated the next due date of {changed} tenants in {time.monotonic() - started:.1f}s'
+        ))
@@ -0,0 +1,26 @@
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from tenants.reminders import send_reminders
+
+
+class Command(BaseCommand):
+    help = 'Send the rent reminders due today by SMS and email (reminders already sent are skipped)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='Send the reminders due on this day, YYYY-MM-DD (default today)')
+        parser.add_argument('--backend', help='Dotted path of the backend to use instead of REMINDERS["BACKEND"], '
+                                              'e.g. tenants.reminders.ConsoleBackend')
+
+    def handle(self, *args, **options):
+        try:
+            today = date.fromisoformat(options['date']) if options['date'] else None
+        except ValueError:
+            raise CommandError('--date must be in YYYY-MM-DD format')
+
+        try:
+            run = send_reminders(today, options['backend'])
+        except ImportError as e:
+            raise CommandError(f'Unknown reminder backend: {e}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Sent {run.sent} reminders for {run.today} ({run.failed} failed, {run.skipped} already sent)'
+        ))
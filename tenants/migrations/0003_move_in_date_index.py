@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0002_alter_property_property_id'),
+        ('rentals', '0004_remove_rental_tenant'),
+        ('tenants', '0002_remove_tenant_rent_due_date'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='tenant',
+            index=models.Index(fields=['move_in_date', 'id'], name='tenant_move_in_date_id_idx'),
+        ),
+    ]
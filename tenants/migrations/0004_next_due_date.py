@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:30
+
+import calendar
+from datetime import date
+from django.db import migrations, models
+
+
+def seed_next_due_date(apps, schema_editor):
+    """
+    Start every tenant at their first due date, three months after moving in.
+    Run roll_due_dates afterwards to move tenants past the periods they have paid.
+    """
+    Tenant = apps.get_model('tenants', 'Tenant')
+    tenants = []
+    for tenant in Tenant.objects.only('id', 'move_in_date').iterator(chunk_size=2000):
+        year, month = divmod(tenant.move_in_date.month + 2, 12)
+        year, month = tenant.move_in_date.year + year, month + 1
+        day = min(tenant.move_in_date.day, calendar.monthrange(year, month)[1])
+        tenant.next_due_date = date(year, month, day)
+        tenants.append(tenant)
+        if len(tenants) == 2000:
+            Tenant.objects.bulk_update(tenants, ['next_due_date'])
+            tenants = []
+    Tenant.objects.bulk_update(tenants, ['next_due_date'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0002_alter_property_property_id'),
+        ('rentals', '0004_remove_rental_tenant'),
+        ('tenants', '0003_move_in_date_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tenant',
+            name='next_due_date',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='tenant',
+            index=models.Index(fields=['next_due_date'], name='tenant_next_due_date_idx'),
+        ),
+        migrations.RunPython(seed_next_due_date, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:40
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0003_autocomplete_indexes'),
+        ('rentals', '0004_remove_rental_tenant'),
+        ('tenants', '0005_reminderlog'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='tenant',
+            index=models.Index(django.db.models.functions.text.Lower('name'), name='tenant_name_lower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tenant',
+            index=models.Index(django.db.models.functions.text.Lower('email'), name='tenant_email_lower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tenant',
+            index=models.Index(django.db.models.functions.text.Lower('nin_number'), name='tenant_nin_lower_idx'),
+        ),
+    ]
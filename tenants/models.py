@@ -1,7 +1,34 @@
 from django.db import models
-from datetime import datetime
+from django.db.models.functions import Lower
+from datetime import datetime, timedelta
 import calendar
 
+# Rent first falls due this many months after moving in
+RENT_DUE_MONTHS = 3
+# Rent due within this many days counts as due soon
+DUE_SOON_DAYS = 7
+
+
+def rent_due_date_for(move_in_date):
+    """move_in_date plus RENT_DUE_MONTHS, on the last day of the month if that day does not exist"""
+    # Add 3 months to the move_in_date
+    year = move_in_date.year
+    month = move_in_date.month + RENT_DUE_MONTHS
+    day = move_in_date.day
+
+    # Handle year overflow
+    if month > 12:
+        year += (month - 1) // 12
+        month = ((month - 1) % 12) + 1
+
+    # Handle day overflow for months with fewer days
+    max_day = calendar.monthrange(year, month)[1]
+    if day > max_day:
+        day = max_day
+
+    return datetime(year, month, day).date()
+
+
 # Create your models here.
 class Tenant(models.Model):
     name = models.CharField(max_length=30)
@@ -14,28 +41,93 @@ class Tenant(models.Model):
     tenant_property = models.ForeignKey('properties.Property', on_delete=models.CASCADE)
     move_in_date = models.DateField()    
     rent_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    # The first due date whose period is not paid yet, kept up to date by
+    # tenants.due_dates.roll_due_dates(); bulk_create callers run it themselves
+    next_due_date = models.DateField(null=True, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Ordering key of the tenant list (keyset pagination)
+            models.Index(fields=['move_in_date', 'id'], name='tenant_move_in_date_id_idx'),
+            # Overdue and due-soon range scans
+            models.Index(fields=['next_due_date'], name='tenant_next_due_date_idx'),
+            # Prefix range scans of the tenant autocomplete (see home/autocomplete.py)
+            models.Index(Lower('name'), name='tenant_name_lower_idx'),
+            models.Index(Lower('email'), name='tenant_email_lower_idx'),
+            models.Index(Lower('nin_number'), name='tenant_nin_lower_idx'),
+        ]
 
     @property
     def rent_due_date(self):
-        """Calculate rent due date as exactly 3 months from move_in_date"""
+        """
+        The next date rent is due: the stored next_due_date, or for a tenant not
+        saved yet exactly 3 months from move_in_date
+        """
+        if self.next_due_date:
+            return self.next_due_date
         if self.move_in_date:
-            # Add 3 months to the move_in_date
-            year = self.move_in_date.year
-            month = self.move_in_date.month + 3
-            day = self.move_in_date.day
-            
-            # Handle year overflow
-            if month > 12:
-                year += (month - 1) // 12
-                month = ((month - 1) % 12) + 1
-            
-            # Handle day overflow for months with fewer days
-            max_day = calendar.monthrange(year, month)[1]
-            if day > max_day:
-                day = max_day
-                
-            return datetime(year, month, day).date()
+            return rent_due_date_for(self.move_in_date)
         return None
 
+    @classmethod
+    def overdue(cls, today):
+        """Tenants whose next due date has passed, as a range scan of tenant_next_due_date_idx"""
+        return cls.objects.filter(next_due_date__lt=today)
+
+    @classmethod
+    def due_soon(cls, today, days=DUE_SOON_DAYS):
+        """Tenants whose rent falls due between today and days from now"""
+        return cls.objects.filter(next_due_date__range=(today, today + timedelta(days=days)))
+
+    def save(self, *args, **kwargs):
+        previous = None
+        if self.pk:
+            previous = Tenant.objects.filter(pk=self.pk).values_list('move_in_date', 'rental_id').first()
+        if previous is None or previous[0] != self.move_in_date:
+            self.next_due_date = rent_due_date_for(self.move_in_date)
+        super().save(*args, **kwargs)
+
+        # Periods already paid on the (new) rental carry the due date forward
+        if previous is not None and previous != (self.move_in_date, self.rental_id):
+            from .due_dates import roll_due_dates
+            roll_due_dates([self.pk])
+            self.refresh_from_db(fields=['next_due_date'])
+
     def __str__(self):
         return f"{self.name} {self.rental}"
+
+
+REMINDER_CHANNELS = [
+    ('SMS', 'SMS'),
+    ('EMAIL', 'Email'),
+]
+
+REMINDER_STATUSES = [
+    ('SENT', 'Sent'),
+    ('FAILED', 'Failed'),
+]
+
+
+class ReminderLog(models.Model):
+    """
+    One rent reminder sent (or attempted) to a tenant. A reminder is identified
+    by the due date it is about and its offset in days from that date (negative
+    before it, positive once overdue), so re-runs never send the same one twice.
+    """
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name='reminders')
+    due_date = models.DateField()
+    offset_days = models.IntegerField()
+    channel = models.CharField(max_length=10, choices=REMINDER_CHANNELS)
+    status = models.CharField(max_length=10, choices=REMINDER_STATUSES)
+    error = models.TextField(blank=True)
+    sent_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['tenant', 'due_date', 'offset_days', 'channel'], name='unique_tenant_reminder'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.get_channel_display()} reminder to {self.tenant_id} for {self.due_date} ({self.offset_days:+d} days)'
@@ -0,0 +1,285 @@
+"""
+Rent reminders by SMS and email.
+
+send_reminders() runs once a day as the tenants.send_reminders job. A tenant
+is reminded DAYS_BEFORE days before their next due date and, while it stays
+unpaid, DAYS_AFTER days after it, with a firmer message. A reminder missed
+because the job did not run is still sent up to CATCH_UP_DAYS late, but only
+the latest one that is due.
+
+Tenants are read with a range scan of the next_due_date index. Messages are
+rendered from the reminders/ templates and handed to the configured backend
+in batches of BATCH_SIZE by a pool of WORKERS threads, so slow gateways
+overlap. Every reminder is recorded in ReminderLog; one already SENT is
+never sent again, and a FAILED one is retried on the next run.
+
+Settings live in settings.REMINDERS (see DEFAULTS). Backends are classes
+with a send_messages(reminders) method, like Django's email backends:
+ConsoleBackend, FileBackend and SMTPBackend are stand-ins for a real SMS
+and email gateway.
+"""
+import logging
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import date, timedelta
+from itertools import islice
+from django.conf import settings
+from django.core import mail
+from django.template.loader import get_template
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from .models import ReminderLog, Tenant
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'BACKEND': 'tenants.reminders.ConsoleBackend',
+    'CHANNELS': ['SMS', 'EMAIL'],
+    'DAYS_BEFORE': [7, 1],
+    'DAYS_AFTER': [1, 7, 14],
+    'CATCH_UP_DAYS': 3,
+    'BATCH_SIZE': 100,
+    'WORKERS': 4,
+    # Tenants read and logged per round
+    'CHUNK_SIZE': 2000,
+    'FROM_EMAIL': 'rent@unihive.local',
+    'FILE_PATH': 'reminders.log',
+    'SMTP_HOST': 'localhost',
+    'SMTP_PORT': 1025,
+    # SMTPBackend sends SMS through an email-to-SMS gateway at this address
+    'SMS_GATEWAY': '{phone}@sms.localhost',
+}
+
+
+def reminder_setting(name):
+    return getattr(settings, 'REMINDERS', {}).get(name, DEFAULTS[name])
+
+
+@dataclass
+class Reminder:
+    tenant_id: int
+    due_date: date
+    offset_days: int
+    channel: str
+    to: str
+    subject: str
+    body: str
+
+
+class BaseBackend:
+    """Delivers reminders. Backends are created per batch, so open() and close() wrap one batch."""
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def send(self, reminder):
+        raise NotImplementedError
+
+    def send_messages(self, reminders):
+        """Send a batch of reminders; returns the error of each one, None if it was sent"""
+        self.open()
+        try:
+            errors = []
+            for reminder in reminders:
+                try:
+                    self.send(reminder)
+                    errors.append(None)
+                except Exception as e:
+                    # One bad number or address must not hold up the rest of the batch
+                    logger.warning('Could not send %s reminder to %s: %s', reminder.channel, reminder.to, e)
+                    errors.append(str(e) or e.__class__.__name__)
+            return errors
+        finally:
+            self.close()
+
+
+def _format(reminder):
+    subject = f'Subject: {reminder.subject}\n' if reminder.channel == 'EMAIL' else ''
+    return f'{reminder.channel} to {reminder.to}\n{subject}\n{reminder.body.strip()}\n{"-" * 60}\n'
+
+
+class ConsoleBackend(BaseBackend):
+    """Writes reminders to standard output"""
+    lock = threading.Lock()
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+
+    def send(self, reminder):
+        with self.lock:
+            self.stream.write(_format(reminder))
+
+
+class FileBackend(BaseBackend):
+    """Appends reminders to the REMINDERS['FILE_PATH'] file"""
+    lock = threading.Lock()
+
+    def open(self):
+        self.handle = open(reminder_setting('FILE_PATH'), 'a', encoding='utf-8')
+
+    def close(self):
+        self.handle.close()
+
+    def send(self, reminder):
+        with self.lock:
+            self.handle.write(_format(reminder))
+            self.handle.flush()
+
+
+class SMTPBackend(BaseBackend):
+    """
+    Sends reminders through the SMTP server at SMTP_HOST:SMTP_PORT (for example
+    `python -m aiosmtpd -n` locally), with one connection per batch. SMS go to
+    the SMS_GATEWAY address of the phone number.
+    """
+    def open(self):
+        self.connection = mail.get_connection(
+            'django.core.mail.backends.smtp.EmailBackend',
+            host=reminder_setting('SMTP_HOST'), port=reminder_setting('SMTP_PORT'), fail_silently=False,
+        )
+        self.connection.open()
+
+    def close(self):
+        self.connection.close()
+
+    def send(self, reminder):
+        to = reminder.to
+        if reminder.channel == 'SMS':
+            to = reminder_setting('SMS_GATEWAY').format(phone=''.join(c for c in to if c.isdigit() or c == '+'))
+        mail.EmailMessage(
+            reminder.subject, reminder.body, reminder_setting('FROM_EMAIL'), [to], connection=self.connection
+        ).send()
+
+
+def _send_batch(backend_class, reminders):
+    """The errors of backend_class sending reminders; a batch that cannot be sent at all fails every reminder"""
+    try:
+        return backend_class().send_messages(reminders)
+    except Exception as e:
+        logger.warning('Could not send a batch of %d reminders: %s', len(reminders), e)
+        return [str(e) or e.__class__.__name__] * len(reminders)
+
+
+def reminder_offset(days_from_due, offsets, catch_up_days):
+    """
+    The offset of the reminder due days_from_due days after the due date (negative
+    before it): the latest offset already reached, if it is at most catch_up_days
+    old. None if no reminder is due.
+    """
+    reached = [offset for offset in offsets if offset <= days_from_due]
+    if reached and days_from_due - max(reached) <= catch_up_days:
+        return max(reached)
+    return None
+
+
+class ReminderRun:
+    """One day's reminders; counts what was sent, failed or had already been sent"""
+    def __init__(self, today=None, backend=None):
+        self.today = today or date.today()
+        self.backend_class = import_string(backend or reminder_setting('BACKEND'))
+        self.channels = reminder_setting('CHANNELS')
+        self.offsets = sorted([-days for days in reminder_setting('DAYS_BEFORE')] + list(reminder_setting('DAYS_AFTER')))
+        self.catch_up_days = reminder_setting('CATCH_UP_DAYS')
+        self.batch_size = reminder_setting('BATCH_SIZE')
+        self.templates = {
+            (kind, part): get_template(f'reminders/{kind}_{part}.txt')
+            for kind in ('upcoming', 'overdue') for part in ('subject', 'email', 'sms')
+        }
+        self.sent = self.failed = self.skipped = 0
+
+    def tenants(self):
+        """Tenants with a reminder due today, as a range scan of tenant_next_due_date_idx"""
+        if not self.offsets:
+            return Tenant.objects.none()
+        return Tenant.objects.filter(next_due_date__range=(
+            self.today - timedelta(days=self.offsets[-1] + self.catch_up_days),
+            self.today - timedelta(days=self.offsets[0]),
+        )).select_related('rental', 'tenant_property').only(
+            'name', 'email', 'phone_number', 'rent_amount', 'next_due_date',
+            'rental__rental_number', 'tenant_property__property_name',
+        ).order_by('next_due_date', 'id')
+
+    def render(self, tenant, offset):
+        kind = 'overdue' if offset > 0 else 'upcoming'
+        context = {
+            'tenant': tenant,
+            'due_date': tenant.next_due_date,
+            'days': abs((self.today - tenant.next_due_date).days),
+            'amount': tenant.rent_amount,
+            'rental_number': tenant.rental.rental_number,
+            'property_name': tenant.tenant_property.property_name,
+        }
+        subject = ' '.join(self.templates[kind, 'subject'].render(context).split())
+        recipients = {'SMS': tenant.phone_number, 'EMAIL': tenant.email}
+        return [
+            Reminder(
+                tenant.pk, tenant.next_due_date, offset, channel, recipients[channel].strip(),
+                subject, self.templates[kind, channel.lower()].render(context),
+            )
+            for channel in self.channels if recipients[channel].strip()
+        ]
+
+    def reminders(self, tenants):
+        """The reminders due for tenants that were not sent yet"""
+        due = {}
+        for tenant in tenants:
+            offset = reminder_offset((self.today - tenant.next_due_date).days, self.offsets, self.catch_up_days)
+            if offset is not None:
+                due[tenant.pk] = (tenant, offset)
+        already_sent = set(ReminderLog.objects.filter(
+            tenant_id__in=list(due), status='SENT', due_date__gte=self.today - timedelta(days=self.offsets[-1] + self.catch_up_days)
+        ).values_list('tenant_id', 'due_date', 'offset_days', 'channel'))
+
+        reminders = []
+        for tenant, offset in due.values():
+            for reminder in self.render(tenant, offset):
+                if (reminder.tenant_id, reminder.due_date, reminder.offset_days, reminder.channel) in already_sent:
+                    self.skipped += 1
+                else:
+                    reminders.append(reminder)
+        return reminders
+
+    def dispatch(self, executor, reminders):
+        batches = [reminders[offset:offset + self.batch_size] for offset in range(0, len(reminders), self.batch_size)]
+        sent_at = timezone.now()
+        for batch, errors in zip(batches, executor.map(_send_batch, [self.backend_class] * len(batches), batches)):
+            logs = []
+            for reminder, error in zip(batch, errors):
+                logs.append(ReminderLog(
+                    tenant_id=reminder.tenant_id, due_date=reminder.due_date, offset_days=reminder.offset_days,
+                    channel=reminder.channel, status='FAILED' if error else 'SENT', error=error or '',
+                    sent_at=sent_at,
+                ))
+                if error:
+                    self.failed += 1
+                else:
+                    self.sent += 1
+            # Logged as each batch comes back, so what was delivered is never sent again even if
+            # a later batch brings the run down. A retried reminder replaces its FAILED log.
+            ReminderLog.objects.bulk_create(
+                logs, update_conflicts=True,
+                unique_fields=['tenant', 'due_date', 'offset_days', 'channel'], update_fields=['status', 'error', 'sent_at'],
+            )
+
+    def run(self):
+        tenants = self.tenants().iterator(chunk_size=reminder_setting('CHUNK_SIZE'))
+        with ThreadPoolExecutor(max_workers=reminder_setting('WORKERS')) as executor:
+            while chunk := list(islice(tenants, reminder_setting('CHUNK_SIZE'))):
+                reminders = self.reminders(chunk)
+                if reminders:
+                    self.dispatch(executor, reminders)
+        return self.sent
+
+
+def send_reminders(today=None, backend=None):
+    """
+    Send the reminders due today (default the current date) with backend (a
+    dotted path, default REMINDERS['BACKEND']); returns the ReminderRun
+    """
+    run = ReminderRun(today, backend)
+    run.run()
+    return run
@@ -1,6 +1,22 @@
-from django.test import TestCase
-from datetime import datetime, date
-from .models import Tenant
+from django.core.cache import cache
+from django.db import connection
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from datetime import datetime, date, timedelta
+from io import StringIO
+import os
+import tempfile
+import threading
+from decimal import Decimal
+from unittest import skipUnless
+import numpy as np
+from .models import ReminderLog, Tenant
+from .views import tenant_statistics
+from .due_dates import add_months, roll_due_dates
+from .reminders import BaseBackend, reminder_offset, send_reminders
+from payments.models import Payment
 from properties.models import Property
 from rentals.models import Rental
 
@@ -84,3 +100,269 @@ class TenantModelTest(TestCase):
         )
         
         self.assertIsNone(tenant.rent_due_date)
+
+
+class TenantListViewTest(TestCase):
+    def test_list_is_paginated_by_move_in_date(self):
+        sunrise = Property.objects.create(property_name='Sunrise Estates', address='Plot 1, Kampala Road')
+        rental = Rental.objects.create(rental_type='SHOP', property=sunrise, monthly_rent_amount=500000)
+        with self.captureOnCommitCallbacks(execute=True):
+            for number in range(25):
+                Tenant.objects.create(
+                    name=f'Tenant {number}', email=f'tenant{number}@example.com', phone_number='0700000000',
+                    nin_number=f'NIN{number:05d}', emergency_contact_name='Contact',
+                    emergency_contact_phone='0700000001', rental=rental, tenant_property=sunrise,
+                    move_in_date=date(2025, 1, 1 + number % 5), rent_amount=500000
+                )
+
+        response = self.client.get(reverse('tenants:tenant_list'))
+        page = response.context['tenants']
+        self.assertEqual(response.context['total_tenants'], 25)
+        self.assertEqual(len(page), 20)
+
+        response = self.client.get(reverse('tenants:tenant_list'), {'after': page.next_cursor})
+        rest = response.context['tenants']
+        self.assertEqual(len(rest), 5)
+        self.assertEqual(
+            [tenant.pk for tenant in list(page) + list(rest)],
+            list(Tenant.objects.order_by('-move_in_date', '-id').values_list('pk', flat=True))
+        )
+
+
+class TenantListQueryTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.sunrise = Property.objects.create(property_name='Sunrise Estates', address='Plot 1, Kampala Road')
+        self.rental = Rental.objects.create(rental_type='SHOP', property=self.sunrise, monthly_rent_amount=500000)
+
+    def add_tenants(self, count, start=0):
+        today = timezone.now().date()
+        with self.captureOnCommitCallbacks(execute=True):
+            Tenant.objects.bulk_create([
+                Tenant(
+                    name=f'Tenant {number}', email=f'tenant{number}@example.com', phone_number='0700000000',
+                    nin_number=f'NIN{number:05d}', emergency_contact_name='Contact',
+                    emergency_contact_phone='0700000001', rental=self.rental, tenant_property=self.sunrise,
+                    # Move-in dates spread over the last 200 days, so due dates straddle today
+                    move_in_date=today - timedelta(days=number % 200), rent_amount=500000
+                )
+                for number in range(start, start + count)
+            ], batch_size=1000)
+            # bulk_create skips save(), which sets the due date
+            roll_due_dates()
+
+    def test_counts_match_rent_due_dates(self):
+        self.add_tenants(400)
+        today = timezone.now().date()
+        stats = tenant_statistics(Tenant.objects.all(), today)
+
+        due_dates = [tenant.rent_due_date for tenant in Tenant.objects.all()]
+        self.assertEqual(stats['overdue_count'], sum(due < today for due in due_dates))
+        self.assertEqual(stats['due_soon_count'], sum(today <= due <= today + timedelta(days=7) for due in due_dates))
+        self.assertEqual(stats['on_track_count'], sum(due > today + timedelta(days=7) for due in due_dates))
+        self.assertEqual(stats['total_tenants'], 400)
+
+    def test_query_count_does_not_depend_on_tenant_count(self):
+        self.add_tenants(20)
+        # One aggregate for the statistics and one for the page, with properties and rentals joined
+        with self.assertNumQueries(2):
+            self.client.get(reverse('tenants:tenant_list'))
+
+        self.add_tenants(10000 - 20, start=20)
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('tenants:tenant_list'))
+        self.assertEqual(response.context['total_tenants'], 10000)
+        self.assertEqual(len(response.context['tenants']), 20)
+        self.assertContains(response, 'Rental SUNRIS001 - SHOP')
+
+
+class NextDueDateTest(TestCase):
+    def setUp(self):
+        self.sunrise = Property.objects.create(property_name='Sunrise Estates', address='Plot 1, Kampala Road')
+        self.rental = Rental.objects.create(rental_type='SHOP', property=self.sunrise, monthly_rent_amount=500000)
+        self.tenant = Tenant.objects.create(
+            name='Bob', email='bob@example.com', phone_number='0700000000', nin_number='NIN-BOB',
+            emergency_contact_name='Contact', emergency_contact_phone='0700000001', rental=self.rental,
+            tenant_property=self.sunrise, move_in_date=date(2024, 10, 31), rent_amount=500000
+        )
+
+    def pay(self, rental_period, amount='500000.00'):
+        return Payment.objects.create(
+            tenant=self.tenant, rental=self.rental, amount=Decimal(amount), amount_due=Decimal('0.00'),
+            payment_date=date(2025, 1, 5), payment_method='CASH', rental_period=rental_period
+        )
+
+    def next_due_date(self):
+        return Tenant.objects.values_list('next_due_date', flat=True).get(pk=self.tenant.pk)
+
+    def test_add_months_keeps_the_day_where_it_can(self):
+        days = np.array(['2024-01-31', '2024-01-31', '2024-01-31', '2023-11-30'], dtype='datetime64[D]')
+        self.assertEqual(
+            add_months(days, np.array([1, 2, 3, 3])).astype(str).tolist(),
+            ['2024-02-29', '2024-03-31', '2024-04-30', '2024-02-29']
+        )
+
+    def test_due_date_follows_paid_periods(self):
+        self.assertEqual(self.next_due_date(), date(2025, 1, 31))
+        # A partly paid period does not move it; paying it off does, past any later paid period too
+        partial = self.pay('2025-01', '200000.00')
+        self.pay('2025-02')
+        self.assertEqual(self.next_due_date(), date(2025, 1, 31))
+        partial.amount = Decimal('500000.00')
+        partial.save()
+        self.assertEqual(self.next_due_date(), date(2025, 3, 31))
+
+        # Deleting a payment reopens its period
+        partial.delete()
+        self.assertEqual(self.next_due_date(), date(2025, 1, 31))
+
+        # Bulk changes are caught up by roll_due_dates()
+        Tenant.objects.update(next_due_date=None)
+        call_command('roll_due_dates', stdout=StringIO())
+        self.assertEqual(self.next_due_date(), date(2025, 1, 31))
+        self.assertEqual(Tenant.overdue(date(2025, 2, 1)).get(), self.tenant)
+        self.assertEqual(Tenant.due_soon(date(2025, 1, 25)).get(), self.tenant)
+
+    def test_invalid_periods_do_not_count_as_paid(self):
+        self.tenant.move_in_date = date(2025, 9, 30)
+        self.tenant.save()
+        self.pay('2025-12')
+        self.pay('2025-13')
+        self.assertEqual(self.next_due_date(), date(2026, 1, 30))
+
+    def test_moving_in_later_resets_due_date(self):
+        self.tenant.move_in_date = date(2024, 11, 15)
+        self.tenant.save()
+        self.assertEqual((self.tenant.next_due_date, self.next_due_date()), (date(2025, 2, 15), date(2025, 2, 15)))
+
+    def test_rent_change_moves_due_date(self):
+        self.pay('2025-01')
+        paid_through_january = self.next_due_date()
+        self.assertGreater(paid_through_january, date(2025, 1, 31))
+
+        # A higher rent leaves January part paid
+        self.rental.monthly_rent_amount = 600000
+        self.rental.save()
+        self.assertEqual(self.next_due_date(), date(2025, 1, 31))
+
+        self.rental.monthly_rent_amount = 500000
+        self.rental.save()
+        self.assertEqual(self.next_due_date(), paid_through_january)
+
+    @skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN is SQLite syntax')
+    def test_due_date_queries_use_index(self):
+        for queryset in [Tenant.overdue(date(2025, 2, 1)), Tenant.due_soon(date(2025, 1, 25))]:
+            with connection.cursor() as cursor:
+                sql, params = queryset.query.sql_with_params()
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+                plan = ' '.join(str(row[-1]) for row in cursor.fetchall())
+            self.assertIn('USING INDEX tenant_next_due_date_idx (next_due_date', plan)
+
+
+class RecordingBackend(BaseBackend):
+    """Keeps what it sends; recipients in fail_once fail on their first attempt"""
+    sent = []
+    fail_once = set()
+    lock = threading.Lock()
+
+    def send(self, reminder):
+        with self.lock:
+            if reminder.to in self.fail_once:
+                self.fail_once.discard(reminder.to)
+                raise ConnectionError('Gateway timed out')
+            self.sent.append(reminder)
+
+
+class FlakyGatewayBackend(RecordingBackend):
+    """A RecordingBackend whose connection fails on the open_failures-th batch"""
+    opened = 0
+    open_failures = 3
+
+    def open(self):
+        with self.lock:
+            FlakyGatewayBackend.opened += 1
+            if FlakyGatewayBackend.opened == self.open_failures:
+                raise ConnectionRefusedError('Connection refused')
+
+
+@override_settings(REMINDERS={'BACKEND': 'tenants.tests.RecordingBackend', 'BATCH_SIZE': 3, 'WORKERS': 2})
+class ReminderTest(TestCase):
+    def setUp(self):
+        RecordingBackend.sent = []
+        RecordingBackend.fail_once = set()
+        self.today = date(2025, 3, 10)
+        sunrise = Property.objects.create(property_name='Sunrise Estates', address='Plot 1, Kampala Road')
+        rental = Rental.objects.create(rental_type='SHOP', property=sunrise, monthly_rent_amount=500000)
+        # Days from today to the next due date: reminders go 7 and 1 days before and 1, 7 and 14 after
+        for name, days in [('Ann', 7), ('Bob', 1), ('Cat', 2), ('Dan', -1), ('Eve', -16), ('Fay', -40), ('Gus', 50)]:
+            tenant = Tenant.objects.create(
+                name=name, email=f'{name.lower()}@example.com', phone_number=f'0700{len(name) * days:+04d}',
+                nin_number=f'NIN-{name}', emergency_contact_name='Contact', emergency_contact_phone='0700000001',
+                rental=rental, tenant_property=sunrise, move_in_date=date(2024, 1, 1), rent_amount=500000
+            )
+            Tenant.objects.filter(pk=tenant.pk).update(next_due_date=self.today + timedelta(days=days))
+
+    def test_reminder_offset(self):
+        offsets = [-7, -1, 1, 7, 14]
+        self.assertEqual(
+            [reminder_offset(days, offsets, 3) for days in [-8, -7, -5, -3, -1, 0, 3, 7, 17, 18]],
+            [None, -7, -7, None, -1, -1, 1, 7, 14, None]
+        )
+
+    def test_reminders_are_sent_once(self):
+        # Tenants, logs already sent, then one insert per batch of 3
+        with self.assertNumQueries(5):
+            run = send_reminders(self.today)
+        self.assertEqual((run.sent, run.failed, run.skipped), (8, 0, 0))
+        by_recipient = {reminder.to: reminder for reminder in RecordingBackend.sent}
+        self.assertEqual(
+            sorted((reminder.to.split('@')[0], reminder.offset_days) for reminder in RecordingBackend.sent if reminder.channel == 'EMAIL'),
+            [('ann', -7), ('bob', -1), ('dan', 1), ('eve', 14)]
+        )
+        self.assertIn('due tomorrow', by_recipient['bob@example.com'].body)
+        self.assertIn('16 days overdue', by_recipient['eve@example.com'].body)
+        self.assertTrue(by_recipient['dan@example.com'].subject.startswith('Overdue: rent for'))
+
+        # Running again the same day sends nothing
+        run = send_reminders(self.today)
+        self.assertEqual((run.sent, run.skipped, len(RecordingBackend.sent)), (0, 8, 8))
+        self.assertEqual(ReminderLog.objects.filter(status='SENT').count(), 8)
+
+    def test_failed_reminders_are_retried(self):
+        RecordingBackend.fail_once = {'dan@example.com'}
+        with self.assertLogs('tenants.reminders', 'WARNING'):
+            run = send_reminders(self.today)
+        self.assertEqual((run.sent, run.failed), (7, 1))
+        self.assertEqual(ReminderLog.objects.get(status='FAILED').error, 'Gateway timed out')
+
+        run = send_reminders(self.today)
+        self.assertEqual((run.sent, run.failed), (1, 0))
+        self.assertEqual(RecordingBackend.sent[-1].to, 'dan@example.com')
+        self.assertFalse(ReminderLog.objects.filter(status='FAILED').exists())
+
+    def test_failed_batch_does_not_lose_delivered_reminders(self):
+        FlakyGatewayBackend.opened = 0
+        with self.settings(REMINDERS={'BATCH_SIZE': 2}), self.assertLogs('tenants.reminders', 'WARNING'):
+            run = send_reminders(self.today, backend='tenants.tests.FlakyGatewayBackend')
+        self.assertEqual((run.sent, run.failed), (6, 2))
+        self.assertEqual(ReminderLog.objects.filter(status='SENT').count(), 6)
+        self.assertEqual(set(ReminderLog.objects.filter(status='FAILED').values_list('error', flat=True)), {'Connection refused'})
+
+        # Only the two reminders of the failed batch go out again
+        run = send_reminders(self.today, backend='tenants.tests.FlakyGatewayBackend')
+        self.assertEqual((run.sent, run.failed, run.skipped), (2, 0, 6))
+        self.assertEqual(len(RecordingBackend.sent), 8)
+        self.assertEqual(len({(reminder.to, reminder.offset_days) for reminder in RecordingBackend.sent}), 8)
+
+    def test_command_with_file_backend(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'reminders.log')
+            output = StringIO()
+            with self.settings(REMINDERS={'FILE_PATH': path}):
+                call_command(
+                    'send_reminders', date='2025-03-10', backend='tenants.reminders.FileBackend', stdout=output
+                )
+            with open(path, encoding='utf-8') as handle:
+                content = handle.read()
+        self.assertIn('Sent 8 reminders for 2025-03-10 (0 failed, 0 already sent)', output.getvalue())
+        self.assertIn('EMAIL to ann@example.com\nSubject: Rent for', content)
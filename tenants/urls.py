@@ -5,6 +5,7 @@ app_name = 'tenants'
 
 urlpatterns = [
     path('', views.tenant_list, name='tenant_list'),
+    path('export/', views.export_tenants, name='export_tenants'),
     path('create/', views.tenant_create, name='tenant_create'),
     path('<int:pk>/edit/', views.tenant_update, name='tenant_update'),
     path('<int:pk>/delete/', views.tenant_delete, name='tenant_delete'),
@@ -1,60 +1,95 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
-from django.db.models import Q
+from django.db.models import Count, Q
 from django.utils import timezone
 from django.http import JsonResponse
 from datetime import timedelta
-from .models import Tenant
+from .models import DUE_SOON_DAYS, Tenant
 from .forms import TenantForm, TenantSearchForm
 from rentals.models import Rental
+from home.exports import export_response
+from home.pagination import KeysetPaginator
+from home.stats import cached_stats, request_params
+from properties.models import Property
 
 # Create your views here.
 
+TENANT_EXPORT_COLUMNS = [
+    ('name', 'Name'),
+    ('email', 'Email'),
+    ('phone_number', 'Phone Number'),
+    ('nin_number', 'NIN Number'),
+    ('emergency_contact_name', 'Emergency Contact'),
+    ('emergency_contact_phone', 'Emergency Contact Phone'),
+    ('rental__rental_number', 'Rental'),
+    ('tenant_property__property_name', 'Property'),
+    ('move_in_date', 'Move-in Date'),
+    ('rent_amount', 'Rent Amount (UGX)'),
+]
+
+# The search matches rental numbers
+TENANT_STATS_MODELS = [Tenant, Rental, Property]
+
+# Columns read by tenantList.html, Rental.__str__ included
+TENANT_LIST_FIELDS = [
+    'name', 'email', 'phone_number', 'nin_number', 'move_in_date', 'rent_amount', 'next_due_date',
+    'tenant_property__property_name', 'rental__rental_number', 'rental__rental_type',
+]
+
+
+def tenants_for_export(search_form):
+    """Tenants matching the list view's search, in list order"""
+    return search_form.filter_queryset(Tenant.objects.all()).order_by('-move_in_date', '-id')
+
+def tenant_statistics(tenants, today):
+    """
+    Count tenants by how soon their rent is due, in one query: rent due before
+    today is overdue, within the next 7 days due soon, and later on track.
+    The conditions are those of Tenant.overdue() and Tenant.due_soon().
+    """
+    due_soon_until = today + timedelta(days=DUE_SOON_DAYS)
+    counts = tenants.order_by().aggregate(
+        total_tenants=Count('id'),
+        overdue_count=Count('id', filter=Q(next_due_date__lt=today)),
+        due_soon_count=Count('id', filter=Q(next_due_date__range=(today, due_soon_until))),
+    )
+    counts['on_track_count'] = counts['total_tenants'] - counts['overdue_count'] - counts['due_soon_count']
+    return counts
+
 def tenant_list(request):
     """Enhanced tenant list view with search functionality"""
     # Get search query
     search_form = TenantSearchForm(request.GET)
-    tenants = Tenant.objects.all().order_by('-move_in_date')
+    # Just the columns the table shows, with the property and rental joined in
+    tenants = Tenant.objects.select_related('tenant_property', 'rental').only(
+        *TENANT_LIST_FIELDS
+    ).order_by('-move_in_date', '-id')
     
     # Apply search filter
-    if search_form.is_valid():
-        search_query = search_form.cleaned_data.get('search')
-        if search_query:
-            tenants = tenants.filter(
-                Q(name__icontains=search_query) |
-                Q(email__icontains=search_query) |
-                Q(phone_number__icontains=search_query) |
-                Q(nin_number__icontains=search_query) |
-                Q(tenant_property__property_name__icontains=search_query) |
-                Q(rental__rental_number__icontains=search_query)
-            )
+    tenants = search_form.filter_queryset(tenants)
     
-    # Calculate statistics
+    # Headline statistics, cached until a tenant, rental or property changes
     today = timezone.now().date()
-    overdue_count = 0
-    due_soon_count = 0
-    on_track_count = 0
+    stats = cached_stats(
+        'tenant_list', TENANT_STATS_MODELS, (request_params(request), today),
+        lambda: tenant_statistics(tenants, today)
+    )
     
-    for tenant in tenants:
-        if tenant.rent_due_date:
-            if tenant.rent_due_date < today:
-                overdue_count += 1
-            elif tenant.rent_due_date <= today + timedelta(days=7):
-                due_soon_count += 1
-            else:
-                on_track_count += 1
-        else:
-            on_track_count += 1
+    # Keyset pagination on (move_in_date, id)
+    paginator = KeysetPaginator(tenants, 20, ('-move_in_date', '-id'), count=stats['total_tenants'])
     
     return render(request, 'tenantList.html', {
         'search_form': search_form,
-        'total_tenants': tenants.count(),
-        'overdue_count': overdue_count,
-        'due_soon_count': due_soon_count,
-        'on_track_count': on_track_count,
-        'tenants': tenants
+        **stats,
+        'tenants': paginator.get_page_from_request(request)
     })
 
+def export_tenants(request):
+    """Stream every tenant matching the current search as CSV or XLSX"""
+    return export_response(
+        request, 'tenants', tenants_for_export(TenantSearchForm(request.GET)), TENANT_EXPORT_COLUMNS
+    )
+
 def tenant_create(request):
     """Create a new tenant"""
     if request.method == 'POST':